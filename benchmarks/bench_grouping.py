@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015,2016 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Benchmark the duplicate grouping: compare reverse_dictionary() followed by
+remove_unique_items() with group_duplicates() (NumPy implementation) on a
+synthetic {path: md5} dictionary and on the equivalent ScanResult view.
+
+Usage:
+
+    python3 benchmarks/bench_grouping.py [--files N] [--duplicates RATIO] [--repeat N]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+# Import the pydfm package of this repository rather than an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydfm import core
+from pydfm.index import ScanResult
+
+
+def make_scan_result(num_files, duplicate_ratio, files_per_dir=100, seed=0):
+    """Return a ScanResult of num_files files (files_per_dir files per
+    directory) where about duplicate_ratio of the files are copies of another
+    one."""
+
+    rand = random.Random(seed)
+    num_contents = max(1, int(num_files * (1. - duplicate_ratio)))
+
+    scan_result = ScanResult()
+    dir_path_list = []
+    for first_index in range(0, num_files, files_per_dir):
+        dir_path = "/bench/dir{0}".format(first_index // files_per_dir)
+        file_path_list = []
+        digest_list = []
+        for file_index in range(first_index, min(first_index + files_per_dir, num_files)):
+            content_index = file_index if file_index < num_contents else rand.randrange(num_contents)
+            file_path_list.append("{0}/file{1}".format(dir_path, file_index))
+            digest_list.append(hashlib.md5(str(content_index).encode()).hexdigest())
+        scan_result.add_directory(dir_path, file_path_list, [], digest_list, core.directory_digest(digest_list))
+        dir_path_list.append(dir_path)
+    scan_result.add_directory("/bench", [], dir_path_list, [], core.directory_digest([]))
+
+    return scan_result
+
+
+def bench(function, repeat):
+    """Return the number of groups and the best run time of function()."""
+
+    num_groups = len(function())
+
+    time_list = []
+    for index in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        time_list.append(time.perf_counter() - start_time)
+
+    return num_groups, min(time_list)
+
+
+def main():
+    """Run the benchmark and print its results."""
+
+    parser = argparse.ArgumentParser(description="Benchmark the duplicate grouping.")
+    parser.add_argument("--files", type=int, default=1000000, metavar="INTEGER",
+                        help="number of files (default: %(default)s)")
+    parser.add_argument("--duplicates", type=float, default=0.1, metavar="RATIO",
+                        help="ratio of duplicated files (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, metavar="INTEGER",
+                        help="number of timed runs (default: %(default)s)")
+    args = parser.parse_args()
+
+    scan_result = make_scan_result(args.files, args.duplicates)
+    file_view = scan_result.file_view()
+    file_dict = dict(file_view.items())
+
+    bench_list = [("reverse_dictionary + remove_unique_items (dict)",
+                   lambda: core.remove_unique_items(core.reverse_dictionary(file_dict))),
+                  ("reverse_dictionary + remove_unique_items (view)",
+                   lambda: core.remove_unique_items(core.reverse_dictionary(file_view)))]
+    if core.numpy is not None:
+        bench_list += [("group_duplicates NumPy (dict)",
+                        lambda: core.group_duplicates(file_dict, use_numpy=True)),
+                       ("group_duplicates NumPy (view)",
+                        lambda: core.group_duplicates(file_view, use_numpy=True))]
+    else:
+        print("NumPy is not installed: group_duplicates() falls back on the pure Python implementation")
+
+    for name, function in bench_list:
+        num_groups, best_time = bench(function, args.repeat)
+        print("{0:50} {1} groups, {2:.3f} s".format(name, num_groups, best_time))
+
+if __name__ == '__main__':
+    main()
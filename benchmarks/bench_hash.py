@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015,2016 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Benchmark the throughput of the hash algorithms usable by pydfm (see
+pydfm.file_hash.HASH_ALGORITHMS): for each one, hash a data buffer in memory
+and a file (read from the page cache after the first run) with
+pydfm.file_hash.hashsum().
+
+Usage:
+
+    python3 benchmarks/bench_hash.py [--size MIB] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Import the pydfm package of this repository rather than an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydfm import file_hash
+
+
+def bench(function, repeat):
+    """Return the best run time of function()."""
+
+    time_list = []
+    for index in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        time_list.append(time.perf_counter() - start_time)
+
+    return min(time_list)
+
+
+def main():
+    """Run the benchmark and print its results."""
+
+    parser = argparse.ArgumentParser(description="Benchmark the hash algorithms.")
+    parser.add_argument("--size", type=int, default=64, metavar="INTEGER",
+                        help="size (in MiB) of the hashed data (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, metavar="INTEGER",
+                        help="number of timed runs (default: %(default)s)")
+    args = parser.parse_args()
+
+    data = os.urandom(args.size * 2**20)
+
+    fd, file_path = tempfile.mkstemp(prefix="pydfm_bench_")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+
+        print("{0:12} {1:>14} {2:>14}".format("algorithm", "memory (MiB/s)", "file (MiB/s)"))
+        for hash_algorithm in sorted(file_hash.HASH_ALGORITHMS):
+            def hash_memory():
+                hash_generator = file_hash.new_hash(hash_algorithm)
+                hash_generator.update(data)
+                return hash_generator.hexdigest()
+
+            memory_time = bench(hash_memory, args.repeat)
+            file_time = bench(lambda: file_hash.hashsum(file_path, hash_algorithm), args.repeat)
+            print("{0:12} {1:14.0f} {2:14.0f}".format(hash_algorithm, args.size / memory_time, args.size / file_time))
+    finally:
+        os.remove(file_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015,2016 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Benchmark each stage of the pydfm pipeline (walk, reverse_dictionary,
+remove_unique_items, group_duplicates, remove_redundant_entries,
+compute_directory_likeness and report) on synthetic trees of several scales
+(see tree_generator.py) and write the results as JSON.
+
+Results of two versions can be compared to catch performance regressions:
+
+    python3 benchmarks/bench_pipeline.py --output old.json
+    ...
+    python3 benchmarks/bench_pipeline.py --output new.json --baseline old.json
+
+Usage:
+
+    python3 benchmarks/bench_pipeline.py [--scales N,N,...] [--repeat N] [--output FILE] [--baseline FILE] [tree options]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+# Import the pydfm package of this repository rather than an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pydfm
+from pydfm import core
+
+from tree_generator import generate_tree, add_arguments, tree_parameters
+
+STAGES = ('walk',
+          'reverse_dictionary',
+          'remove_unique_items',
+          'group_duplicates',
+          'remove_redundant_entries',
+          'compute_directory_likeness',
+          'report')
+
+
+def run_pipeline(root_path):
+    """Run the pipeline once on root_path and return the {stage: seconds,
+    ...} dictionary and the number of duplicated files groups."""
+
+    stage_time_dict = {}
+
+    def timed(stage, function, *args):
+        start_time = time.perf_counter()
+        result = function(*args)
+        stage_time_dict[stage] = stage_time_dict.get(stage, 0.) + time.perf_counter() - start_time
+        return result
+
+    file_dict, dir_dict = timed('walk', core.build_path_dictionary, [root_path])
+
+    reversed_file_dict = timed('reverse_dictionary', core.reverse_dictionary, file_dict)
+    reversed_dir_dict = timed('reverse_dictionary', core.reverse_dictionary, dir_dict)
+
+    reversed_file_dict = timed('remove_unique_items', core.remove_unique_items, reversed_file_dict)
+    reversed_dir_dict = timed('remove_unique_items', core.remove_unique_items, reversed_dir_dict)
+
+    timed('group_duplicates', core.group_duplicates, file_dict)
+    timed('group_duplicates', core.group_duplicates, dir_dict)
+
+    timed('remove_redundant_entries', core.remove_redundant_entries, reversed_file_dict, dir_dict)
+    timed('remove_redundant_entries', core.remove_redundant_entries, reversed_dir_dict, dir_dict)
+
+    directory_likeness_dict = timed('compute_directory_likeness',
+                                    core.compute_directory_likeness,
+                                    reversed_file_dict,
+                                    file_dict,
+                                    dir_dict)
+
+    timed('report', core.report, reversed_file_dict, reversed_dir_dict, directory_likeness_dict)
+
+    return stage_time_dict, len(reversed_file_dict)
+
+
+def bench_scale(num_files, parameter_dict, repeat):
+    """Return the results of the pipeline (best time of each stage over
+    repeat runs) on a tree of num_files files."""
+
+    root_path = tempfile.mkdtemp(prefix="pydfm_bench_")
+    try:
+        tree_summary = generate_tree(os.path.join(root_path, "root"), num_files, **parameter_dict)
+
+        best_time_dict = {}
+        for index in range(repeat):
+            stage_time_dict, num_groups = run_pipeline(os.path.join(root_path, "root"))
+            for stage, stage_time in stage_time_dict.items():
+                best_time_dict[stage] = min(stage_time, best_time_dict.get(stage, stage_time))
+    finally:
+        shutil.rmtree(root_path)
+
+    return {"scale": num_files,
+            "tree": tree_summary,
+            "duplicated_file_groups": num_groups,
+            "stages": {stage: best_time_dict[stage] for stage in STAGES}}
+
+
+def compare(result_dict, baseline_dict, tolerance):
+    """Print the time ratio of each stage against the baseline results and
+    return the number of stages slower than the baseline by more than
+    tolerance (a ratio)."""
+
+    num_regressions = 0
+    baseline_result_dict = {result["scale"]: result for result in baseline_dict["results"]}
+
+    for result in result_dict["results"]:
+        baseline_result = baseline_result_dict.get(result["scale"])
+        if baseline_result is None:
+            continue
+        for stage in STAGES:
+            baseline_time = baseline_result["stages"].get(stage)
+            if not baseline_time:
+                continue
+            ratio = result["stages"][stage] / baseline_time
+            is_regression = ratio > 1. + tolerance
+            num_regressions += is_regression
+            print("{0:>10} {1:28} {2:6.2f}x{3}".format(result["scale"],
+                                                       stage,
+                                                       ratio,
+                                                       "  REGRESSION" if is_regression else ""),
+                  file=sys.stderr)
+
+    return num_regressions
+
+
+def main():
+    """Run the benchmark and write its results."""
+
+    parser = argparse.ArgumentParser(description="Benchmark the pydfm pipeline stages.")
+    parser.add_argument("--scales", default="1000,10000", metavar="N,N,...",
+                        help="comma separated numbers of files (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, metavar="INTEGER",
+                        help="number of timed runs (default: %(default)s)")
+    parser.add_argument("--output", default="-", metavar="FILE",
+                        help="JSON output file (default: standard output)")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="JSON results to compare with (exit with status 1 in case of regression)")
+    parser.add_argument("--tolerance", type=float, default=0.2, metavar="RATIO",
+                        help="slowdown tolerated before reporting a regression (default: %(default)s)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    parameter_dict = tree_parameters(args)
+
+    result_dict = {"pydfm_version": pydfm.__version__,
+                   "python_version": platform.python_version(),
+                   "platform": platform.platform(),
+                   "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "repeat": args.repeat,
+                   "tree_parameters": parameter_dict,
+                   "results": []}
+
+    for scale in args.scales.split(","):
+        result_dict["results"].append(bench_scale(int(scale), parameter_dict, args.repeat))
+
+    if args.output == "-":
+        json.dump(result_dict, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as fd:
+            json.dump(result_dict, fd, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as fd:
+            baseline_dict = json.load(fd)
+        if compare(result_dict, baseline_dict, args.tolerance) > 0:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
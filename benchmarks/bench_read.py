@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015,2016 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Benchmark the ways of reading files in pydfm.file_hash.compute_files_hash()
+(see pydfm.file_hash.READ_METHODS) for several file sizes and chunk sizes.
+Files are read from the page cache (after the first run): this measures the
+overhead of each method, not the speed of the disk.
+
+These results justify DEFAULT_CHUNK_SIZE and DEFAULT_READ_METHOD.
+
+Usage:
+
+    python3 benchmarks/bench_read.py [--hash ALGORITHM] [--total MIB] [--repeat N]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Import the pydfm package of this repository rather than an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydfm import file_hash
+
+FILE_SIZES = (2**10, 2**14, 2**18, 2**22, 2**26)
+CHUNK_SIZES = (2**12, 2**16, 2**18, 2**20)
+
+
+def make_files(dir_path, file_size, total_size):
+    """Create files of file_size random bytes (about total_size bytes in
+    total, at least 3 files and at most 2000 files) and return their
+    paths."""
+
+    num_files = min(2000, max(3, total_size // file_size))
+    path_list = []
+    for file_index in range(num_files):
+        file_path = os.path.join(dir_path, "{0}_{1}".format(file_size, file_index))
+        with open(file_path, "wb") as fd:
+            fd.write(os.urandom(file_size))
+        path_list.append(file_path)
+    return path_list
+
+
+def bench(path_list, hash_algorithm, chunk_size, method, repeat):
+    """Return the best throughput (in MiB/s) of compute_files_hash() over
+    the files of path_list."""
+
+    total_size = sum(os.path.getsize(file_path) for file_path in path_list)
+
+    time_list = []
+    for index in range(repeat + 1):
+        start_time = time.perf_counter()
+        for file_path in path_list:
+            file_hash.compute_files_hash(file_hash.new_hash(hash_algorithm), file_path, chunk_size, method)
+        time_list.append(time.perf_counter() - start_time)
+
+    # The first run fills the page cache
+    return total_size / min(time_list[1:]) / 2**20
+
+
+def main():
+    """Run the benchmark and print its results."""
+
+    parser = argparse.ArgumentParser(description="Benchmark the ways of reading files to hash them.")
+    parser.add_argument("--hash", default="md5", choices=sorted(file_hash.HASH_ALGORITHMS),
+                        help="hash algorithm (default: %(default)s)")
+    parser.add_argument("--total", type=int, default=16, metavar="INTEGER",
+                        help="approximate size (in MiB) of the files of each size (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, metavar="INTEGER",
+                        help="number of timed runs (default: %(default)s)")
+    args = parser.parse_args()
+
+    config_list = [("read", chunk_size) for chunk_size in CHUNK_SIZES]
+    config_list += [("readinto", chunk_size) for chunk_size in CHUNK_SIZES]
+    config_list += [(method, file_hash.DEFAULT_CHUNK_SIZE) for method in file_hash.READ_METHODS if method not in ("read", "readinto")]
+    config_list += [(None, file_hash.DEFAULT_CHUNK_SIZE)]
+
+    dir_path = tempfile.mkdtemp(prefix="pydfm_bench_")
+    try:
+        print("{0:22}".format("method (chunk size)") + "".join("{0:>10}".format(file_size) for file_size in FILE_SIZES))
+        path_list_list = [make_files(dir_path, file_size, args.total * 2**20) for file_size in FILE_SIZES]
+        for method, chunk_size in config_list:
+            name = "{0} ({1})".format("default" if method is None else method, chunk_size)
+            throughput_list = [bench(path_list, args.hash, chunk_size, method, args.repeat) for path_list in path_list_list]
+            print("{0:22}".format(name) + "".join("{0:10.0f}".format(throughput) for throughput in throughput_list))
+        print("(throughput in MiB/s per file size in bytes)")
+    finally:
+        shutil.rmtree(dir_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015,2016 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Benchmark the tree walkers: compare the number of stat system calls and the
+time needed to collect the type, size and modification time of every file
+with os.walk() (plus os.path.islink(), os.path.getmtime() and
+os.path.getsize() calls for each file, as pydfm used to do) and with
+pydfm.core.scan_tree() (based on os.scandir()).
+
+Usage:
+
+    python3 benchmarks/bench_walk.py [--dirs N] [--files N] [--repeat N]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Import the pydfm package of this repository rather than an installed one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydfm.core import scan_tree
+
+
+class StatCounter:
+    """Count the calls to os.stat(), os.lstat() and os.DirEntry.stat() (each
+    one is at most one system call) while it is used as a context manager.
+
+    os.DirEntry can't be patched: os.scandir() is replaced by a function
+    whose entries count their stat() calls."""
+
+    def __init__(self):
+        self.count = 0
+
+    def _wrap(self, function):
+        def wrapper(*args, **kwargs):
+            self.count += 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    def _scandir(self, *args, **kwargs):
+        return _CountingScandirIterator(self._os_scandir(*args, **kwargs), self)
+
+    def __enter__(self):
+        self._stat, self._lstat, self._os_scandir = os.stat, os.lstat, os.scandir
+        os.stat, os.lstat = self._wrap(os.stat), self._wrap(os.lstat)
+        os.scandir = self._scandir
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        os.stat, os.lstat, os.scandir = self._stat, self._lstat, self._os_scandir
+
+
+class _CountingScandirIterator:
+    """An os.scandir() iterator yielding _CountingDirEntry objects."""
+
+    def __init__(self, scandir_iterator, counter):
+        self.scandir_iterator = scandir_iterator
+        self.counter = counter
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return _CountingDirEntry(next(self.scandir_iterator), self.counter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.scandir_iterator.close()
+
+
+class _CountingDirEntry:
+    """An os.DirEntry whose stat() calls are counted by counter."""
+
+    def __init__(self, dir_entry, counter):
+        self.dir_entry = dir_entry
+        self.counter = counter
+
+    def __getattr__(self, name):
+        return getattr(self.dir_entry, name)
+
+    def __fspath__(self):
+        return self.dir_entry.path
+
+    def stat(self, *args, **kwargs):
+        self.counter.count += 1
+        return self.dir_entry.stat(*args, **kwargs)
+
+
+def make_tree(root_path, num_dirs, num_files):
+    """Create num_dirs directories containing num_files small files each."""
+
+    for dir_index in range(num_dirs):
+        dir_path = os.path.join(root_path, "dir{0}".format(dir_index))
+        os.makedirs(dir_path)
+        for file_index in range(num_files):
+            with open(os.path.join(dir_path, "file{0}".format(file_index)), "w") as fd:
+                fd.write(str(file_index))
+
+
+def legacy_walk(root_path):
+    """Collect files attributes as the os.walk() based walker did."""
+
+    attribute_list = []
+    for current_dir_path, dir_names, file_names in os.walk(root_path, topdown=False):
+        for file_name in file_names:
+            file_path = os.path.join(current_dir_path, file_name)
+            if not os.path.islink(file_path):
+                attribute_list.append((file_path, os.path.getmtime(file_path), os.path.getsize(file_path)))
+    return attribute_list
+
+
+def scandir_walk(root_path):
+    """Collect files attributes with scan_tree()."""
+
+    attribute_list = []
+    for current_dir_path, dir_path_list, file_list in scan_tree(root_path):
+        for file_path, file_stat in file_list:
+            attribute_list.append((file_path, file_stat.st_mtime, file_stat.st_size))
+    return attribute_list
+
+
+def bench(function, root_path, repeat):
+    """Return the number of files, the number of stat calls (see
+    StatCounter) and the best run time of function(root_path)."""
+
+    with StatCounter() as counter:
+        num_files = len(function(root_path))
+
+    time_list = []
+    for index in range(repeat):
+        start_time = time.perf_counter()
+        function(root_path)
+        time_list.append(time.perf_counter() - start_time)
+
+    return num_files, counter.count, min(time_list)
+
+
+def main():
+    """Run the benchmark and print its results."""
+
+    parser = argparse.ArgumentParser(description="Benchmark the tree walkers.")
+    parser.add_argument("--dirs", type=int, default=100, metavar="INTEGER",
+                        help="number of directories (default: %(default)s)")
+    parser.add_argument("--files", type=int, default=100, metavar="INTEGER",
+                        help="number of files per directory (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, metavar="INTEGER",
+                        help="number of timed runs (default: %(default)s)")
+    args = parser.parse_args()
+
+    root_path = tempfile.mkdtemp(prefix="pydfm_bench_")
+    try:
+        make_tree(root_path, args.dirs, args.files)
+
+        for name, function in (("os.walk", legacy_walk), ("scan_tree", scandir_walk)):
+            num_files, num_stat_calls, best_time = bench(function, root_path, args.repeat)
+            print("{0:10} {1} files, {2:.2f} stat calls per file, {3:.3f} s".format(name,
+                                                                                   num_files,
+                                                                                   num_stat_calls / num_files,
+                                                                                   best_time))
+    finally:
+        shutil.rmtree(root_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015,2016 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+A deterministic generator of synthetic trees containing duplicated files and
+cloned (or almost cloned) subtrees, used by the benchmarks.
+
+The same parameters (and seed) always produce the same tree.
+
+Usage:
+
+    python3 benchmarks/tree_generator.py [options] DIRECTORY
+"""
+
+import argparse
+import math
+import os
+import random
+import shutil
+
+SIZE_DISTRIBUTIONS = ('fixed', 'uniform', 'loguniform')
+
+
+def file_size(rand, size_distribution, min_size, max_size):
+    """Return a random file size drawn from the given distribution."""
+
+    if size_distribution == 'fixed':
+        return max_size
+    elif size_distribution == 'uniform':
+        return rand.randint(min_size, max_size)
+    elif size_distribution == 'loguniform':
+        # Many small files and a few big ones, as in most real trees
+        return int(math.exp(rand.uniform(math.log(max(1, min_size)), math.log(max_size))))
+    else:
+        raise ValueError("unknown size distribution: {0}".format(size_distribution))
+
+
+def generate_tree(root_path,
+                  num_files=1000,
+                  files_per_dir=10,
+                  fan_out=4,
+                  size_distribution='loguniform',
+                  min_size=1,
+                  max_size=2**16,
+                  duplicate_ratio=0.1,
+                  num_clones=2,
+                  seed=0):
+    """Generate a synthetic tree in root_path (which must not exist) and
+    return a {"files": ..., "dirs": ..., "bytes": ...} summary.
+
+    num_files files are spread over directories holding files_per_dir files
+    each, every directory having at most fan_out subdirectories. About
+    duplicate_ratio of these files are copies of another one. Then
+    num_clones subtrees are copied in root_path/clones; every other clone has
+    one of its files modified (so that it is only similar to its
+    original)."""
+
+    rand = random.Random(seed)
+
+    # DIRECTORIES (BREADTH FIRST)
+    num_dirs = max(1, math.ceil(num_files / files_per_dir))
+    dir_path_list = [os.path.join(root_path, "tree")]
+    parent_index = 0
+    while len(dir_path_list) < num_dirs:
+        dir_path = os.path.join(dir_path_list[parent_index], "d{0}".format(len(dir_path_list)))
+        dir_path_list.append(dir_path)
+        if (len(dir_path_list) - 1) % fan_out == 0:
+            parent_index += 1
+    for dir_path in dir_path_list:
+        os.makedirs(dir_path)
+
+    # FILES
+    content_list = []    # contents that can be duplicated
+    num_bytes = 0
+    for file_index in range(num_files):
+        if len(content_list) > 0 and rand.random() < duplicate_ratio:
+            content = rand.choice(content_list)
+        else:
+            content = rand.randbytes(file_size(rand, size_distribution, min_size, max_size))
+            # Keep a bounded sample of contents to copy
+            if len(content_list) < 1000:
+                content_list.append(content)
+            else:
+                content_list[rand.randrange(len(content_list))] = content
+
+        file_path = os.path.join(dir_path_list[file_index % num_dirs], "f{0}".format(file_index))
+        with open(file_path, "wb") as fd:
+            fd.write(content)
+        num_bytes += len(content)
+
+    # CLONED SUBTREES
+    for clone_index in range(num_clones):
+        source_path = rand.choice(dir_path_list)
+        clone_path = os.path.join(root_path, "clones", "c{0}".format(clone_index))
+        shutil.copytree(source_path, clone_path)
+
+        clone_file_path_list = sorted(os.path.join(dir_path, file_name)
+                                      for dir_path, dir_names, file_names in os.walk(clone_path)
+                                      for file_name in file_names)
+        for file_path in clone_file_path_list:
+            num_bytes += os.path.getsize(file_path)
+        num_files += len(clone_file_path_list)
+        num_dirs += sum(1 for item in os.walk(clone_path))
+
+        if clone_index % 2 == 1 and len(clone_file_path_list) > 0:
+            with open(rand.choice(clone_file_path_list), "ab") as fd:
+                fd.write(b"modified")
+            num_bytes += len(b"modified")
+
+    return {"files": num_files, "dirs": num_dirs, "bytes": num_bytes}
+
+
+def add_arguments(parser):
+    """Add the generate_tree() parameters to the argparse parser."""
+
+    parser.add_argument("--files-per-dir", type=int, default=10, metavar="INTEGER",
+                        help="number of files per directory (default: %(default)s)")
+    parser.add_argument("--fan-out", type=int, default=4, metavar="INTEGER",
+                        help="maximum number of subdirectories per directory (default: %(default)s)")
+    parser.add_argument("--size-distribution", choices=SIZE_DISTRIBUTIONS, default="loguniform",
+                        help="distribution of the file sizes (default: %(default)s)")
+    parser.add_argument("--min-size", type=int, default=1, metavar="INTEGER",
+                        help="minimum file size in bytes (default: %(default)s)")
+    parser.add_argument("--max-size", type=int, default=2**16, metavar="INTEGER",
+                        help="maximum file size in bytes (default: %(default)s)")
+    parser.add_argument("--duplicates", type=float, default=0.1, metavar="RATIO",
+                        help="ratio of duplicated files (default: %(default)s)")
+    parser.add_argument("--clones", type=int, default=2, metavar="INTEGER",
+                        help="number of cloned subtrees (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, metavar="INTEGER",
+                        help="random seed (default: %(default)s)")
+
+
+def tree_parameters(args):
+    """Return the generate_tree() keyword arguments given on the command
+    line (see add_arguments())."""
+
+    return {"files_per_dir": args.files_per_dir,
+            "fan_out": args.fan_out,
+            "size_distribution": args.size_distribution,
+            "min_size": args.min_size,
+            "max_size": args.max_size,
+            "duplicate_ratio": args.duplicates,
+            "num_clones": args.clones,
+            "seed": args.seed}
+
+
+def main():
+    """Generate a tree."""
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic tree with duplicates.")
+    parser.add_argument("--files", type=int, default=1000, metavar="INTEGER",
+                        help="number of files, not counting clones (default: %(default)s)")
+    add_arguments(parser)
+    parser.add_argument("root_path", metavar="DIRECTORY",
+                        help="directory to create")
+    args = parser.parse_args()
+
+    summary = generate_tree(args.root_path, args.files, **tree_parameters(args))
+    print("{files} files, {dirs} directories, {bytes} bytes".format(**summary))
+
+if __name__ == '__main__':
+    main()
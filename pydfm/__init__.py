@@ -42,4 +42,8 @@ __version__ = '3.0.dev3'
 
 __all__ = ['core', 
            'database',
-           'file_hash']
+           'file_hash',
+           'index',
+           'profiling',
+           'server',
+           'watch']
@@ -60,30 +60,316 @@ Here is an example of pydfm.core usage:
 
     # DISPLAY DUPLICATED FILES AND DIRECTORIES ################################
 
-    print(report(reversed_file_dict, reversed_dir_dict, directory_likeness_dict))
+    write_report(sys.stdout, reversed_file_dict, reversed_dir_dict, directory_likeness_dict)
 """
 
-__all__ = ['number_of_files',
+__all__ = ['ScanProgress',
+           'ProgressPrinter',
+           'ScanStats',
+           'number_of_files',
+           'file_sizes',
+           'placeholder_digest',
+           'prefilter_files',
            'build_path_dictionary',
+           'build_path_dictionary_async',
            'reverse_dictionary',
            'remove_unique_items',
+           'group_duplicates',
            'remove_redundant_entries',
            'compute_directory_likeness',
+           'iter_report',
+           'write_report',
            'report',
-           'walk']
-
+           'iter_records',
+           'write_records',
+           'directory_digest',
+           'list_directory',
+           'scan_tree',
+           'walk',
+           'walk_async']
+
+import asyncio
 import collections
-import dbm.dumb      # TODO
+import concurrent.futures
+import contextlib
+import csv
+import functools
 import hashlib       # TODO
 import itertools
+import json
 import os
+import sys
+import threading
+import time
 import warnings
 
-from pydfm.file_hash import md5sum
-from pydfm.database import get_default_db_path, print_db, clear_db
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from pydfm.file_hash import hashsum, partial_hashsum, compare_files, hash_digest_size, new_hash, DEFAULT_PARTIAL_BLOCK_SIZE, DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS
+from pydfm.index import TreeIndex, ScanResult, DigestView
+from pydfm.database import HashDatabase, get_default_db_path, print_db, clear_db, prune_db
 
 LIKENESS_THRESHOLD = 0
 
+# Maximum number of files submitted to the hashing workers and not yet
+# collected by walk()
+MAX_PENDING_FILES = 1024
+
+# Candidate filtering stages that can be applied before hashing file contents
+# (see prefilter_files())
+PREFILTER_STAGES = ('size', 'partial', 'compare')
+
+# Largest groups of candidates compared byte by byte by the 'compare'
+# prefilter stage (larger groups are left to the full hashing: each file is
+# then read once instead of being compared with all the others)
+COMPARE_MAX_GROUP_SIZE = 3
+
+# Machine-readable output formats (see write_records())
+RECORD_FORMATS = ('jsonl', 'csv', 'null')
+
+# Directories modified less than SNAPSHOT_MIN_AGE seconds before being
+# scanned are not recorded in the snapshot: a later modification within the
+# timestamps granularity wouldn't change their stat data (see walk())
+SNAPSHOT_MIN_AGE = 2.
+
+# Maximum number of items waiting in each queue of walk_async()
+ASYNC_QUEUE_SIZE = 256
+
+# Number of files hashed concurrently by walk_async() (the default number of
+# workers of concurrent.futures.ThreadPoolExecutor)
+ASYNC_HASH_TASKS = min(32, (os.cpu_count() or 1) + 4)
+
+# Minimum number of seconds between two progress updates (see
+# ProgressPrinter)
+PROGRESS_INTERVAL = 0.5
+
+# Stages of the analysis run by the pydfm scripts (see ScanStats.stage() and
+# pydfm.profiling.Profiler.stage())
+PIPELINE_STAGES = ('walk', 'reverse', 'redundant', 'likeness', 'report')
+
+# PROGRESS ####################################################################
+
+class ScanProgress:
+    """Counters describing the progress of a scan (see
+    build_path_dictionary()).
+
+    The total number of files (and bytes) is estimated incrementally from the
+    number of directories discovered but not listed yet.
+
+    If callback is not None, it is called with this object as argument each
+    time the counters are updated (i.e. after each directory)."""
+
+    def __init__(self, callback=None):
+        self.callback = callback
+
+        self.dirs_found = 0       # Directories discovered
+        self.dirs_listed = 0      # Directories whose content has been listed
+        self.files_found = 0      # Files discovered
+        self.bytes_found = 0
+        self.files_hashed = 0     # Files whose content has been hashed
+        self.bytes_hashed = 0
+        self.files_cached = 0     # Files whose hash was served by the database
+        self.bytes_cached = 0
+        self.files_skipped = 0    # Files eliminated by a prefilter
+        self.bytes_skipped = 0
+
+    def __str__(self):
+        return "{0} files found (~{1} expected), {2} hashed ({3:.1f} MiB), {4} from cache, {5} skipped".format(
+                   self.files_found,
+                   self.estimated_files,
+                   self.files_hashed,
+                   self.bytes_hashed / 2**20,
+                   self.files_cached,
+                   self.files_skipped)
+
+    @property
+    def estimated_files(self):
+        """The estimated total number of files."""
+
+        if self.dirs_listed == 0:
+            return self.files_found
+
+        num_unlisted_dirs = max(self.dirs_found - self.dirs_listed, 0)
+        return self.files_found + int(num_unlisted_dirs * self.files_found / self.dirs_listed)
+
+    @property
+    def estimated_bytes(self):
+        """The estimated total number of bytes."""
+
+        if self.files_found == 0:
+            return self.bytes_found
+
+        return int(self.estimated_files * self.bytes_found / self.files_found)
+
+    def merge(self, other):
+        """Add the counters of the ScanProgress other to this one."""
+
+        for name, value in vars(other).items():
+            if name != 'callback':
+                setattr(self, name, getattr(self, name) + value)
+
+    def notify(self):
+        """Call the callback (if any)."""
+
+        if self.callback is not None:
+            self.callback(self)
+
+class ProgressPrinter:
+    """A ScanProgress callback printing the progress of the scan on file (the
+    standard error output by default), at most every interval seconds."""
+
+    def __init__(self, file=None, interval=PROGRESS_INTERVAL):
+        self.file = file
+        self.interval = interval
+        self.last_print_time = 0.
+        self.line_length = 0
+        self.progress = None
+
+    def __call__(self, progress):
+        self.progress = progress
+        current_time = time.time()
+        if current_time - self.last_print_time >= self.interval:
+            self.last_print_time = current_time
+            self.print_line(str(progress), end="")
+
+    def close(self):
+        """Print the final state of the scan."""
+
+        if self.progress is not None:
+            self.print_line(str(self.progress))
+
+    def print_line(self, line, end="\n"):
+        """Overwrite the last printed line."""
+
+        file = sys.stderr if self.file is None else self.file
+        print("\r" + line.ljust(self.line_length), end=end, file=file, flush=True)
+        self.line_length = len(line)
+
+# STATISTICS ##################################################################
+
+class ScanStats:
+    """Statistics of a scan and of the following stages: wall and CPU time
+    spent in each stage, number of files, bytes read, cache hits and misses
+    and peak memory usage.
+
+    Stages are timed with the stage() context manager. The 'hash' and
+    'cache' stages measured by build_path_dictionary() are sums over all
+    the hashing threads (and processes), so they can be longer than the
+    'walk' stage that contains them; the CPU time of the other stages is the
+    CPU time of the whole current process (worker processes excluded)."""
+
+    def __init__(self):
+        self.stage_dict = {}      # {stage: [wall_time, cpu_time], ...}
+        self.files = 0            # Files scanned
+        self.bytes_read = 0       # Bytes read to compute (partial) hashes
+        self.cache_hits = 0       # Files whose hash was served by the database
+        self.cache_misses = 0     # Files looked up in the database but hashed
+
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        line_list = ["{0:12} {1:>10} {2:>10}".format("stage", "wall (s)", "CPU (s)")]
+        for stage, (wall_time, cpu_time) in self.stage_dict.items():
+            line_list.append("{0:12} {1:10.3f} {2:10.3f}".format(stage, wall_time, cpu_time))
+        line_list.append("{0} files, {1:.1f} MiB read, {2} cache hits, {3} cache misses".format(self.files,
+                                                                                               self.bytes_read / 2**20,
+                                                                                               self.cache_hits,
+                                                                                               self.cache_misses))
+        if self.peak_memory is not None:
+            line_list.append("Peak memory: {0:.1f} MiB".format(self.peak_memory / 2**20))
+        return "\n".join(line_list)
+
+    @property
+    def peak_memory(self):
+        """The peak resident memory (in bytes) of the current process or of
+        its largest terminated child process (e.g. the worker processes of
+        build_path_dictionary()), or None if it can't be measured."""
+
+        if resource is None:
+            return None
+
+        max_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+        # ru_maxrss is in bytes on macOS and in KiB elsewhere
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+    def add_time(self, stage, wall_time, cpu_time):
+        """Add wall_time and cpu_time (in seconds) to the given stage (this
+        method is thread-safe)."""
+
+        with self._lock:
+            stage_times = self.stage_dict.setdefault(stage, [0., 0.])
+            stage_times[0] += wall_time
+            stage_times[1] += cpu_time
+
+    @contextlib.contextmanager
+    def stage(self, stage, per_thread=False):
+        """Context manager timing its block as (a part of) the given stage.
+
+        If per_thread is True, only the CPU time of the current thread is
+        counted (otherwise the CPU time of the whole process is)."""
+
+        cpu_clock = time.thread_time if per_thread else time.process_time
+
+        # Stages are listed in the order they start
+        self.add_time(stage, 0., 0.)
+
+        start_time = time.perf_counter()
+        start_cpu_time = cpu_clock()
+        try:
+            yield self
+        finally:
+            self.add_time(stage, time.perf_counter() - start_time, cpu_clock() - start_cpu_time)
+
+    def merge(self, other):
+        """Add the statistics of the ScanStats other to this one."""
+
+        for stage, (wall_time, cpu_time) in other.stage_dict.items():
+            self.add_time(stage, wall_time, cpu_time)
+        self.files += other.files
+        self.bytes_read += other.bytes_read
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+
+    def as_dict(self):
+        """Return the statistics as a dictionary (e.g. to export them as
+        JSON)."""
+
+        return {"stages": {stage: {"wall_time": wall_time, "cpu_time": cpu_time}
+                           for stage, (wall_time, cpu_time) in self.stage_dict.items()},
+                "files": self.files,
+                "bytes_read": self.bytes_read,
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "peak_memory": self.peak_memory}
+
+
+def _stage(stats, stage, per_thread=False):
+    """Return stats.stage(stage, per_thread) or a context manager doing
+    nothing if stats is None."""
+
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.stage(stage, per_thread)
+
 # TOOLS #######################################################################
 
 def number_of_files(root_paths):
@@ -98,31 +384,576 @@ def number_of_files(root_paths):
 
     return number_of_files
 
-def build_path_dictionary(root_paths, db_path=None):
+def file_sizes(root_paths):
+    """Return the {path: size, ...} dictionary of all regular files
+    recursively found in root_paths (symbolic links are ignored)."""
+
+    size_dict = {}
+
+    # For each root path specified in command line argmuents
+    for path in root_paths:
+        for current_dir_path, dir_path_list, file_list in scan_tree(path):
+            for file_path, file_stat in file_list:
+                size_dict[file_path] = file_stat.st_size
+
+    return size_dict
+
+def _list_trees(root_paths):
+    """Return the {dir_path: (dir_path_list, file_list), ...} content of all
+    directories recursively found in root_paths (see list_directory()), to
+    be given to walk() once prefilter_files() has grouped their files."""
+
+    listing_dict = {}
+
+    for path in root_paths:
+        for current_dir_path, dir_path_list, file_list in scan_tree(path):
+            listing_dict[current_dir_path] = (dir_path_list, file_list)
+
+    return listing_dict
+
+def placeholder_digest(*keys, digest_size=16):
+    """Return a name-independent digest standing for a file whose content
+    has never been read.
+
+    The digest only depends on keys (e.g. the file size) and is digest_size
+    bytes long (the size of a MD5 digest by default, see
+    pydfm.file_hash.hash_digest_size()). It is computed with a personalized
+    BLAKE2 hash so that it cannot match the hash of an actual file
+    content."""
+
+    hash_generator = hashlib.blake2b(digest_size=digest_size, person=b'pydfm')
+    hash_generator.update(repr(keys).encode('utf-8'))
+
+    return hash_generator.hexdigest()
+
+def prefilter_files(size_dict,
+                    stages=PREFILTER_STAGES,
+                    counters=None,
+                    partial_block_size=DEFAULT_PARTIAL_BLOCK_SIZE,
+                    executor=None,
+                    hash_algorithm=DEFAULT_HASH_ALGORITHM,
+                    stats=None,
+                    cached_paths=None):
+    """Return the {path: digest, ...} dictionary of files whose content
+    doesn't need to be hashed, according to the given filtering stages.
+
+    size_dict = {path: size, ...}
+
+    Stages are applied in the given order, each one splitting the groups of
+    candidates left by the previous ones. Available stages are:
+
+    - 'size': a file whose size is unique can't be a duplicate;
+    - 'partial': a file whose first and last partial_block_size bytes are
+      unique can't be a duplicate (files no larger than two blocks are left
+      to the full hashing);
+    - 'compare': the files of groups of at most COMPARE_MAX_GROUP_SIZE
+      candidates are compared byte by byte (see
+      pydfm.file_hash.compare_files()): files whose content is unique can't
+      be a duplicate and identical files get the hash of their content,
+      computed once while they are compared (larger groups are left to the
+      full hashing). This stage should follow the 'size' stage.
+
+    Files that can't have any duplicate get a placeholder digest: as they
+    have no duplicate, these digests never appear in duplicated groups.
+
+    cached_paths is an optional set of the paths of files whose hash is
+    already known (e.g. cached in a database): their content is never read
+    by the 'partial' and 'compare' stages, so the candidates which can't be
+    told apart from them without reading them are left to the full hashing
+    (as well as the cached files, whose hash is then read from the cache).
+
+    If counters is a dictionary, it is updated with the number of files
+    eliminated by each stage and with the number of files left to the full
+    hashing or to the cache (under the 'full' key).
+
+    If executor is a concurrent.futures.Executor, partial hashes and
+    comparisons are computed concurrently with it (at most MAX_PENDING_FILES
+    at a time).
+
+    Partial hashes are computed with hash_algorithm and placeholder digests
+    have the size of its digests.
+
+    If stats is a ScanStats object, the number of bytes read by the partial
+    and compare stages is added to it."""
+
+    for stage in stages:
+        if stage not in PREFILTER_STAGES:
+            raise ValueError("unknown prefilter stage: {0}".format(stage))
+
+    digest_size = hash_digest_size(hash_algorithm)
+
+    placeholder_dict = {}
+
+    # key_dict = {path: key, ...} where key is the tuple of the properties
+    # computed by the stages applied so far
+    key_dict = {file_path: () for file_path in size_dict}
+
+    num_left_files = 0
+
+    for stage in stages:
+        num_verified_files = 0
+
+        # Groups of candidates containing a cached file are left to the full
+        # hashing rather than reading the cached file
+        if stage != 'size' and cached_paths:
+            cached_key_set = {key for file_path, key in key_dict.items() if file_path in cached_paths}
+            left_files = [file_path for file_path, key in key_dict.items() if key in cached_key_set]
+            for file_path in left_files:
+                del key_dict[file_path]
+            num_left_files += len(left_files)
+
+        if stage == 'size':
+            for file_path, key in key_dict.items():
+                key_dict[file_path] = key + (size_dict[file_path],)
+        elif stage == 'partial':
+            path_list = [file_path for file_path in key_dict if size_dict[file_path] > 2 * partial_block_size]
+            hash_algorithm_list = [hash_algorithm] * len(path_list)
+            block_size_list = [partial_block_size] * len(path_list)
+            if executor is None:
+                partial_md5_iterator = map(_partial_hashsum, path_list, hash_algorithm_list, block_size_list)
+            else:
+                partial_md5_iterator = _bounded_map(executor, _partial_hashsum, path_list, hash_algorithm_list, block_size_list)
+            for file_path, partial_md5 in zip(path_list, partial_md5_iterator):
+                if partial_md5 is None:
+                    # Unreadable files are left to the full hashing
+                    del key_dict[file_path]
+                    num_left_files += 1
+                else:
+                    key_dict[file_path] = key_dict[file_path] + (partial_md5,)
+            if stats is not None:
+                stats.bytes_read += 2 * partial_block_size * len(path_list)
+        elif stage == 'compare':
+            group_dict = collections.defaultdict(list)
+            for file_path, key in key_dict.items():
+                group_dict[key].append(file_path)
+            group_list = [path_list for path_list in group_dict.values() if len(path_list) <= COMPARE_MAX_GROUP_SIZE]
+            hash_algorithm_list = [hash_algorithm] * len(group_list)
+            if executor is None:
+                comparison_iterator = map(_compare_files, group_list, hash_algorithm_list)
+            else:
+                comparison_iterator = _bounded_map(executor, _compare_files, group_list, hash_algorithm_list)
+            for comparison in comparison_iterator:
+                if comparison is None:
+                    continue
+                class_list, class_digest_list, num_bytes_read = comparison
+                for class_index, (class_path_list, class_digest) in enumerate(zip(class_list, class_digest_list)):
+                    for file_path in class_path_list:
+                        key_dict[file_path] = key_dict[file_path] + ('compare', class_index)
+                    # Identical files don't need to be hashed again
+                    if len(class_path_list) > 1:
+                        for file_path in class_path_list:
+                            del key_dict[file_path]
+                            placeholder_dict[file_path] = class_digest
+                        num_verified_files += len(class_path_list)
+                if stats is not None:
+                    stats.bytes_read += num_bytes_read
+
+        # Files with a unique key are eliminated from the candidates
+        key_counter = collections.Counter(key_dict.values())
+        eliminated_files = [file_path for file_path, key in key_dict.items() if key_counter[key] == 1]
+        for file_path in eliminated_files:
+            placeholder_dict[file_path] = placeholder_digest(*key_dict.pop(file_path), digest_size=digest_size)
+
+        if counters is not None:
+            counters[stage] = counters.get(stage, 0) + len(eliminated_files) + num_verified_files
+
+    if counters is not None:
+        counters['full'] = counters.get('full', 0) + len(key_dict) + num_left_files
+
+    return placeholder_dict
+
+def _bounded_map(executor, function, *iterables):
+    """Like executor.map() but calls are submitted lazily: at most
+    MAX_PENDING_FILES of them are submitted and not yet yielded."""
+
+    future_deque = collections.deque()
+    for args in zip(*iterables):
+        if len(future_deque) >= MAX_PENDING_FILES:
+            yield future_deque.popleft().result()
+        future_deque.append(executor.submit(function, *args))
+
+    while len(future_deque) > 0:
+        yield future_deque.popleft().result()
+
+def _partial_hashsum(file_path, hash_algorithm, block_size):
+    """Return partial_hashsum(file_path, hash_algorithm, block_size) or None
+    if the file can't be read."""
+
+    try:
+        return partial_hashsum(file_path, hash_algorithm, block_size)
+    except OSError:
+        return None
+
+def _compare_files(file_path_list, hash_algorithm):
+    """Return compare_files(file_path_list, hash_algorithm=hash_algorithm)
+    or None if a file can't be read (it is then left to the full
+    hashing)."""
+
+    try:
+        return compare_files(file_path_list, hash_algorithm=hash_algorithm)
+    except OSError:
+        return None
+
+def build_path_dictionary(root_paths,
+                          db_path=None,
+                          prefilter=None,
+                          prefilter_counters=None,
+                          partial_block_size=DEFAULT_PARTIAL_BLOCK_SIZE,
+                          workers=None,
+                          processes=None,
+                          progress_callback=None,
+                          index=None,
+                          hash_algorithm=DEFAULT_HASH_ALGORITHM,
+                          stats=None,
+                          snapshot=False):
     """Return dictionaries of all files and directories recursively found
     in root_paths, using path of files (or directories) as key and their
     hashs (MD5, SHA, ...) as value.
+
+    Files and directories are hashed with hash_algorithm (see
+    pydfm.file_hash.HASH_ALGORITHMS); the database only reuses hashes
+    computed with the same algorithm.
+
+    Repeated root_paths and root_paths nested in another one are ignored
+    (their content is scanned once).
     
     Build two dictionaries are returned: one for files and the other for
-    directories."""
+    directories.
+
+    If prefilter is a sequence of stages (see prefilter_files()), files are
+    first grouped across all root_paths (by size, by partial content, ...)
+    and only the content of files that may have a duplicate is entirely
+    hashed; other files get a placeholder digest (which is enough to compute
+    directories digests). The number of files eliminated by each stage is
+    added to the prefilter_counters dictionary if given.
+
+    If workers is an integer, files are hashed concurrently by a pool of
+    workers threads (results are identical to the serial scan).
+
+    If processes is an integer, root_paths are split into their top level
+    subtrees which are walked in parallel by a pool of processes processes
+    (each one using workers threads); the digests of root_paths are then
+    computed from the digests of their children.
+
+    If progress_callback is not None, it is regularly called with a
+    ScanProgress object as argument (with processes, it is called each time
+    a subtree has been walked).
+
+    If index is a TreeIndex, it is filled with the parent -> children
+    relations of the scanned files and directories (so that later stages
+    don't have to read directories again, see compute_directory_likeness()).
+    If index is a ScanResult, digests are stored in it (in a compact form)
+    instead of dictionaries and the returned dictionaries are read-only views
+    of index (see ScanResult.file_view()); its digest_size must be the size
+    of the hash_algorithm digests.
+
+    If stats is a ScanStats object, the time spent in the 'prefilter',
+    'walk', 'hash' and 'cache' (database accesses) stages is added to it,
+    as well as the files, bytes read and cache hits and misses counters.
+
+    If snapshot is True, the digest tree of the scanned directories is
+    recorded in the database and directories whose stat data haven't changed
+    since the previous scan are not listed again: the recorded digests of
+    their files are reused (see walk()). This requires db_path and can't be
+    combined with prefilter (placeholder digests depend on the other scanned
+    files)."""
+
+    root_paths = _normalize_root_paths(root_paths)
+
+    if snapshot and db_path is None:
+        raise ValueError("a snapshot requires a database")
+    if snapshot and prefilter:
+        raise ValueError("a snapshot can't be combined with a prefilter")
+
+    with _stage(stats, 'walk'):
+        file_dict, dir_dict = _build_path_dictionary(root_paths,
+                                                     db_path,
+                                                     prefilter,
+                                                     prefilter_counters,
+                                                     partial_block_size,
+                                                     workers,
+                                                     processes,
+                                                     progress_callback,
+                                                     index,
+                                                     hash_algorithm,
+                                                     stats,
+                                                     snapshot)
+    return file_dict, dir_dict
 
-    file_dict = {}   # dict = {path: md5, ...}
-    dir_dict = {}    # dict = {path: md5, ...}
+def _normalize_root_paths(root_paths):
+    """Return the absolute paths of root_paths without repeated paths and
+    paths nested in another one (in the order of root_paths)."""
+
+    abs_root_path_list = []
+    for root_path in root_paths:
+        root_path = os.path.abspath(root_path)
+        if root_path not in abs_root_path_list:
+            abs_root_path_list.append(root_path)
+
+    return [root_path for root_path in abs_root_path_list
+            if not any(root_path.startswith(os.path.join(other_path, "")) for other_path in abs_root_path_list)]
+
+def _build_path_dictionary(root_paths,
+                           db_path,
+                           prefilter,
+                           prefilter_counters,
+                           partial_block_size,
+                           workers,
+                           processes,
+                           progress_callback,
+                           index,
+                           hash_algorithm,
+                           stats,
+                           snapshot):
+    """See build_path_dictionary()."""
+
+    is_compact = isinstance(index, ScanResult)
+
+    digest_size = hash_digest_size(hash_algorithm)
+    if is_compact and index.digest_size != digest_size:
+        raise ValueError("the digest size of index ({0}) doesn't match the {1} digest size ({2})".format(index.digest_size,
+                                                                                                          hash_algorithm,
+                                                                                                          digest_size))
+
+    if is_compact:
+        file_dict = index.file_view()
+        dir_dict = index.dir_view()
+    else:
+        file_dict = {}   # dict = {path: md5, ...}
+        dir_dict = {}    # dict = {path: md5, ...}
 
+    progress = ScanProgress(progress_callback)
+
+    executor = None
     db = None
-    if db_path is not None:
-        db = dbm.dumb.open(db_path, 'c')
+    try:
+        if workers is not None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+        placeholder_dict = None
+        listing_dict = None
+        if prefilter:
+            with _stage(stats, 'prefilter'):
+                # The listing is kept so that the tree is not listed again by walk()
+                listing_dict = _list_trees(root_paths)
+
+                size_dict = {}
+                for dir_path_list, file_list in listing_dict.values():
+                    for file_path, file_stat in file_list:
+                        size_dict[file_path] = file_stat.st_size
+
+                # Candidates whose hash is cached in the database don't have
+                # to be read (the database is closed before worker processes
+                # are forked)
+                cached_paths = None
+                if db_path is not None:
+                    size_counter = collections.Counter(size_dict.values())
+                    with HashDatabase(db_path, hash_algorithm=hash_algorithm) as prefilter_db:
+                        cached_paths = {file_path
+                                        for dir_path_list, file_list in listing_dict.values()
+                                        for file_path, file_stat in file_list
+                                        if size_counter[file_stat.st_size] > 1 and prefilter_db.get(file_path, file_stat) is not None}
+
+                placeholder_dict = prefilter_files(size_dict,
+                                                   prefilter,
+                                                   prefilter_counters,
+                                                   partial_block_size,
+                                                   executor,
+                                                   hash_algorithm,
+                                                   stats,
+                                                   cached_paths)
+
+        if processes is None:
+            if db_path is not None:
+                db = HashDatabase(db_path, hash_algorithm=hash_algorithm)
+
+            # For each root path specified in command line argmuents
+            for path in root_paths:
+                local_file_dict, local_dir_dict = walk(path,
+                                                       db,
+                                                       placeholder_dict,
+                                                       executor,
+                                                       progress=progress,
+                                                       index=index,
+                                                       hash_algorithm=hash_algorithm,
+                                                       stats=stats,
+                                                       snapshot=snapshot,
+                                                       listing_dict=listing_dict)
+                if not is_compact:
+                    file_dict.update(local_file_dict)
+                    dir_dict.update(local_dir_dict)
+        else:
+            # SPLIT ROOT PATHS INTO THEIR TOP LEVEL SUBTREES
+            root_walk_list = []    # [(root_path, dir_path_list, file_list), ...]
+            subtree_path_list = []
+            for path in root_paths:
+                path = os.path.abspath(path)
+                if listing_dict is not None and path in listing_dict:
+                    dir_path_list, file_list = listing_dict.pop(path)
+                else:
+                    try:
+                        dir_path_list, file_list = list_directory(path)
+                    except OSError:
+                        continue
+                root_walk_list.append((path, dir_path_list, file_list))
+                subtree_path_list.extend(dir_path_list)
+                progress.dirs_found += 1 + len(dir_path_list)
+                progress.dirs_listed += 1
+
+            # Each worker process only gets the entries of its own subtree
+            subtree_placeholder_list = _split_subtrees(placeholder_dict, subtree_path_list)
+            subtree_listing_list = _split_subtrees(listing_dict, subtree_path_list)
+
+            # WALK SUBTREES IN WORKER PROCESSES
+            if index is None:
+                index_factory = None
+            elif is_compact:
+                index_factory = functools.partial(type(index), index.digest_size)
+            else:
+                index_factory = type(index)
+
+            # Create (or upgrade) the database schema before the worker
+            # processes open it
+            if db_path is not None:
+                HashDatabase(db_path, hash_algorithm=hash_algorithm).close()
+
+            with concurrent.futures.ProcessPoolExecutor(max_workers=processes,
+                                                        initializer=_init_walk_process,
+                                                        initargs=(db_path,
+                                                                  workers,
+                                                                  index_factory,
+                                                                  hash_algorithm,
+                                                                  stats is not None,
+                                                                  snapshot)) as process_executor:
+                for local_file_dict, local_dir_dict, local_progress, local_index, local_stats in process_executor.map(_walk_subtree,
+                                                                                                                      subtree_path_list,
+                                                                                                                      subtree_placeholder_list,
+                                                                                                                      subtree_listing_list):
+                    if not is_compact:
+                        file_dict.update(local_file_dict)
+                        dir_dict.update(local_dir_dict)
+
+                    if index is not None:
+                        index.merge(local_index)
+
+                    if stats is not None:
+                        stats.merge(local_stats)
+
+                    # The root of the subtree has already been counted
+                    local_progress.dirs_found -= 1
+                    progress.merge(local_progress)
+                    progress.notify()
+
+            # COMPUTE THE DIGEST OF ROOT PATHS FROM THEIR CHILDREN
+            # (the database is only opened once the worker processes are done)
+            if db_path is not None:
+                db = HashDatabase(db_path, hash_algorithm=hash_algorithm)
+
+            for current_dir_path, dir_path_list, file_list in root_walk_list:
+                pending_dir, num_submitted_files = _scan_directory(current_dir_path,
+                                                                   dir_path_list,
+                                                                   file_list,
+                                                                   db,
+                                                                   placeholder_dict,
+                                                                   executor,
+                                                                   progress,
+                                                                   hash_algorithm,
+                                                                   stats)
+                _resolve_directory(pending_dir + (None,), file_dict, dir_dict, db, progress, index, hash_algorithm, stats)
+                progress.notify()
+    finally:
+        if db is not None:
+            db.close()
+
+        if executor is not None:
+            executor.shutdown()
+
+    if stats is not None:
+        stats.files += progress.files_found
+        stats.bytes_read += progress.bytes_hashed
+        stats.cache_hits += progress.files_cached
+        if db_path is not None:
+            stats.cache_misses += progress.files_hashed
 
-    # For each root path specified in command line argmuents
-    for path in root_paths:
-        local_file_dict, local_dir_dict = walk(path, db)
-        file_dict.update(local_file_dict)
-        dir_dict.update(local_dir_dict)
+    return file_dict, dir_dict
+
+def _split_subtrees(path_dict, subtree_path_list):
+    """Return the list of the {path: value, ...} dictionaries of the items of
+    path_dict contained in each subtree of subtree_path_list (a list of
+    Nones if path_dict is None). Items outside the subtrees are ignored."""
+
+    if path_dict is None:
+        return [None] * len(subtree_path_list)
+
+    subtree_dict = {subtree_path: {} for subtree_path in subtree_path_list}
+    for path, value in path_dict.items():
+        # Look for the subtree among the ancestors of path
+        ancestor_path = path
+        while ancestor_path not in subtree_dict:
+            parent_path = os.path.dirname(ancestor_path)
+            if parent_path == ancestor_path:
+                break
+            ancestor_path = parent_path
+        else:
+            subtree_dict[ancestor_path][path] = value
+
+    return [subtree_dict[subtree_path] for subtree_path in subtree_path_list]
+
+# State of the worker processes of build_path_dictionary()
+_process_db = None
+_process_workers = None
+_process_index_factory = None
+_process_hash_algorithm = DEFAULT_HASH_ALGORITHM
+_process_use_stats = False
+_process_snapshot = False
+
+def _init_walk_process(db_path, workers, index_factory, hash_algorithm, use_stats, snapshot):
+    """Initialize a worker process of build_path_dictionary()."""
+
+    global _process_db, _process_workers, _process_index_factory, _process_hash_algorithm, _process_use_stats, _process_snapshot
+
+    _process_workers = workers
+    _process_index_factory = index_factory
+    _process_hash_algorithm = hash_algorithm
+    _process_use_stats = use_stats
+    _process_snapshot = snapshot
 
     if db_path is not None:
-        db.close()
+        _process_db = HashDatabase(db_path, hash_algorithm=hash_algorithm)
 
-    return file_dict, dir_dict
+def _walk_subtree(root_path, placeholder_dict=None, listing_dict=None):
+    """Walk root_path in a worker process of build_path_dictionary(), given
+    the placeholder_dict and listing_dict entries of this subtree only (see
+    _split_subtrees()).
+
+    Return a (file_dict, dir_dict, progress, index, stats) tuple."""
+
+    progress = ScanProgress()
+    stats = ScanStats() if _process_use_stats else None
+    index = None if _process_index_factory is None else _process_index_factory()
+
+    executor = None
+    if _process_workers is not None:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=_process_workers)
+
+    local_file_dict, local_dir_dict = walk(root_path,
+                                           _process_db,
+                                           placeholder_dict,
+                                           executor,
+                                           progress=progress,
+                                           index=index,
+                                           hash_algorithm=_process_hash_algorithm,
+                                           stats=stats,
+                                           snapshot=_process_snapshot,
+                                           listing_dict=listing_dict)
+
+    if executor is not None:
+        executor.shutdown()
+
+    if _process_db is not None:
+        _process_db.commit()
+
+    return local_file_dict, local_dir_dict, progress, index, stats
 
 def reverse_dictionary(dictionary):
     """Build a reversed dictionary of the one given in argument
@@ -150,6 +981,71 @@ def remove_unique_items(reversed_dict):
     return duplicate_reversed_dict
 
 
+def group_duplicates(dictionary, use_numpy=None):
+    """Build the reversed dictionary of the one given in argument, keeping
+    duplicated items only.
+
+    group_duplicates(dictionary) is equivalent to
+    remove_unique_items(reverse_dictionary(dictionary)) but, if NumPy is
+    available, digests are stored in a fixed-width bytes array which is
+    sorted (argsort) and only the runs of more than one equal digest are
+    turned into lists of paths. If dictionary is a view of a ScanResult, its
+    binary digest buffer is used directly.
+
+    use_numpy can be set to False (or True) to force the pure Python (or
+    NumPy) implementation; NumPy is used by default when it is installed."""
+
+    if use_numpy is None:
+        use_numpy = numpy is not None
+
+    if not use_numpy:
+        return remove_unique_items(reverse_dictionary(dictionary))
+
+    if numpy is None:
+        raise ImportError("NumPy is required to group duplicates with use_numpy=True")
+
+    if isinstance(dictionary, DigestView):
+        scan_result = dictionary.scan_result
+        is_dir_array = numpy.frombuffer(scan_result.is_dir_array, dtype=numpy.uint8)
+        key_array = numpy.flatnonzero(is_dir_array == int(dictionary.is_dir))    # node IDs
+        digest_array = numpy.frombuffer(scan_result.digest_buffer,
+                                        dtype="V{0}".format(scan_result.digest_size))
+        # Sort the raw bytes (copy the selected digests, not the whole buffer)
+        digest_array = digest_array[key_array].view("S{0}".format(scan_result.digest_size))
+        get_key = lambda node_id: scan_result.path(int(node_id))
+        get_digest = lambda index: scan_result.digest(int(key_array[index]))
+    else:
+        key_list = list(dictionary)
+        digest_array = numpy.array([dictionary[key].encode("ascii") for key in key_list], dtype=numpy.bytes_)
+        key_array = key_list
+        get_key = lambda key: key
+        get_digest = lambda index: dictionary[key_list[index]]
+
+    num_items = len(digest_array)
+    if num_items == 0:
+        return {}
+
+    # A stable sort keeps the paths of each group in the iteration order
+    # of dictionary (as reverse_dictionary() does)
+    order = numpy.argsort(digest_array, kind="stable")
+    sorted_digest_array = digest_array[order]
+
+    # Run-length boundaries of equal digests
+    is_run_start = numpy.empty(num_items, dtype=bool)
+    is_run_start[0] = True
+    numpy.not_equal(sorted_digest_array[1:], sorted_digest_array[:-1], out=is_run_start[1:])
+    run_start_array = numpy.flatnonzero(is_run_start)
+    run_end_array = numpy.append(run_start_array[1:], num_items)
+    is_duplicate = (run_end_array - run_start_array) > 1
+
+    duplicate_reversed_dict = {}
+    for run_start, run_end in zip(run_start_array[is_duplicate].tolist(), run_end_array[is_duplicate].tolist()):
+        index_list = order[run_start:run_end].tolist()
+        duplicate_reversed_dict[get_digest(index_list[0])] = [get_key(key_array[index]) for index in index_list]
+
+    return duplicate_reversed_dict
+
+
 def remove_redundant_entries(reversed_dict, dir_dict):
     r"""Supprime les fichiers redondants avec les répertoires affichés comme
     clonés...
@@ -256,7 +1152,11 @@ def remove_redundant_entries(reversed_dict, dir_dict):
         del reversed_dict[key]
 
 
-def compute_directory_likeness(reversed_file_dict, file_dict, dir_dict):
+def compute_directory_likeness(reversed_file_dict,
+                               file_dict,
+                               dir_dict,
+                               threshold=LIKENESS_THRESHOLD,
+                               index=None):
     """Compute directories similarity
 
     reverse_file_dict = {md5: [path1, path2, ...], ...}
@@ -264,26 +1164,34 @@ def compute_directory_likeness(reversed_file_dict, file_dict, dir_dict):
     dir_dict = {path: md5, ...}
 
     1. construit l'ensemble des répertoires contenant des fichiers clonés
+       et, pour chacun d'eux, le multiset des MD5 de son contenu (le contenu
+       des répertoires est donné par index, un TreeIndex construit par
+       build_path_dictionary(), ou à défaut déduit des clés de file_dict et
+       dir_dict : le système de fichiers n'est jamais relu)
 
-    2. construit la liste des combinaisons possibles de ces répertoires avec
-       itertools.combinations():
+    2. construit un index inversé {MD5: [(DIR, NB), ...], ...} donnant les
+       répertoires contenant chaque MD5 (et le nombre d'occurrences)
 
-          [DIR1, DIR2, DIR3] -> ((DIR1,DIR2), (DIR1,DIR3), (DIR2,DIR3))
+    3. parcourt cet index pour accumuler, pour chaque couple de répertoires
+       ayant au moins un MD5 en commun, la taille de l'intersection de leurs
+       multisets (les couples n'ayant aucun MD5 en commun ne sont jamais
+       construits, contrairement à itertools.combinations() sur l'ensemble
+       des répertoires)
 
-                                      1 2 3
-                                    1 . x x
-                                    2 . . x
-                                    3 . . .
-
-    3. crée un dictionnaire ayant comme clé les couples construits dans 2.
-       et comme valeur le pourcentage de fichiers clonnées dans le couple
-       (par rapport à l'union de tous les fichiers du couple):
+    4. crée un dictionnaire ayant comme clé ces couples et comme valeur le
+       pourcentage de fichiers clonnées dans le couple (par rapport à l'union
+       de tous les fichiers du couple):
 
           {(DIR1, DIR2): PERCENT, ...}
 
-       avec PERCENT = #(DIR1 ∩ DIR2) / #(DIR1 ∪ DIR2) * 100.
+       avec PERCENT = #(DIR1 ∩ DIR2) / #(DIR1 ∪ DIR2) * 100
+       et #(DIR1 ∪ DIR2) = #DIR1 + #DIR2 - #(DIR1 ∩ DIR2).
+
+       Seuls les couples dont PERCENT est strictement supérieur à threshold
+       sont retenus ; les couples dont la taille des répertoires rend ce seuil
+       inatteignable sont ignorés dès l'étape 3.
 
-    4. retourne ce dictionnaire
+    5. retourne ce dictionnaire (dans chaque couple, DIR1 < DIR2)
     """
 
     # Construit l'ensemble des répertoires contenant des fichiers clonés
@@ -292,162 +1200,883 @@ def compute_directory_likeness(reversed_file_dict, file_dict, dir_dict):
         for path in paths:
             dir_set.add(os.path.dirname(path))
 
-    # Make file_dir_dict the "union" of file_dict and dir_dict
-    file_dir_dict = file_dict.copy()
-    file_dir_dict.update(dir_dict)
-    assert len(file_dir_dict) == len(file_dict) + len(dir_dict)
-
-    # Construit la liste des combinaisons possibles de ces répertoires
-    # et le dictionnaire {(DIR1, DIR2): PERCENT, ...}
-    directory_likeness_dict = {}
-    for path_pair in itertools.combinations(dir_set, 2):
-
-        file_path_list_1 = [os.path.join(path_pair[0], file_name) for file_name in os.listdir(path_pair[0])]
-        file_path_list_2 = [os.path.join(path_pair[1], file_name) for file_name in os.listdir(path_pair[1])]
-
-        file_md5_list_1 = [file_dir_dict[file_path] for file_path in file_path_list_1]
-        file_md5_list_2 = [file_dir_dict[file_path] for file_path in file_path_list_2]
+    dir_list = sorted(dir_set)
 
+    # Construit le contenu de chaque répertoire {DIR: [PATH1, PATH2, ...], ...}
+    if index is not None:
+        children_dict = {dir_path: index.children(dir_path) for dir_path in dir_list}
+    else:
+        children_dict = {dir_path: [] for dir_path in dir_list}
+        for path in itertools.chain(file_dict, dir_dict):
+            parent_path = os.path.dirname(path)
+            if parent_path in children_dict:
+                children_dict[parent_path].append(path)
+
+    # Construit le multiset des MD5 du contenu de chaque répertoire et l'index
+    # inversé {MD5: [(dir_index, count), ...], ...}
+    dir_size_list = []
+    inverted_index = {}
+    for dir_index, dir_path in enumerate(dir_list):
         # On utilise des multisets (collections.Counter en Python) plutot que
         # des sets ou des frozensets car il se peut qu'un meme MD5 soit present
         # plusieurs fois dans le meme repertoire.
-        file_md5_multiset_1 = collections.Counter(file_md5_list_1)
-        file_md5_multiset_2 = collections.Counter(file_md5_list_2)
+        md5_multiset = collections.Counter()
+        for file_path in children_dict[dir_path]:
+            if file_path in file_dict:
+                md5_multiset[file_dict[file_path]] += 1
+            else:
+                md5_multiset[dir_dict[file_path]] += 1
 
-        inter_file_multiset = file_md5_multiset_1 & file_md5_multiset_2
-        union_file_multiset = file_md5_multiset_1 | file_md5_multiset_2
+        dir_size_list.append(sum(md5_multiset.values()))
+        for md5, count in md5_multiset.items():
+            inverted_index.setdefault(md5, []).append((dir_index, count))
 
-        likeness = 100. * sum(inter_file_multiset.values()) / sum(union_file_multiset.values())
+    # Accumule la taille des intersections des couples de répertoires ayant
+    # au moins un MD5 en commun
+    intersection_counter = collections.Counter()
+    for md5, posting_list in inverted_index.items():
+        for (dir_index_1, count_1), (dir_index_2, count_2) in itertools.combinations(posting_list, 2):
+            size_1 = dir_size_list[dir_index_1]
+            size_2 = dir_size_list[dir_index_2]
 
-        directory_likeness_dict[path_pair] = likeness
+            # The likeness can't exceed 100 * min(size_1, size_2) / max(size_1, size_2)
+            if 100. * min(size_1, size_2) / max(size_1, size_2) > threshold:
+                intersection_counter[(dir_index_1, dir_index_2)] += min(count_1, count_2)
+
+    # Construit le dictionnaire {(DIR1, DIR2): PERCENT, ...}
+    directory_likeness_dict = {}
+    for (dir_index_1, dir_index_2), intersection_size in intersection_counter.items():
+        union_size = dir_size_list[dir_index_1] + dir_size_list[dir_index_2] - intersection_size
+        likeness = 100. * intersection_size / union_size
+
+        if likeness > threshold:
+            directory_likeness_dict[(dir_list[dir_index_1], dir_list[dir_index_2])] = likeness
 
     return directory_likeness_dict
 
 
-def report(reversed_file_dict, reversed_dir_dict, directory_likeness_dict):
-    """Return a human readable report text."""
+def iter_report(reversed_file_dict, reversed_dir_dict, directory_likeness_dict):
+    """Generate the lines (ending with a newline character) of a human
+    readable report.
 
-    report_str = ""
+    Lines are generated one group at a time, so that the report can be
+    written as it is produced (see write_report())."""
 
     # DIRECTORIES
     num_duplicated_dirs = len(reversed_dir_dict)
     if num_duplicated_dirs > 0:
         suffix = "Y" if num_duplicated_dirs == 1 else "IES"
-        report_str += "*** {0} DUPLICATED DIRECTOR{1} ***\n\n".format(num_duplicated_dirs, suffix)
-        for md5, paths in list(reversed_dir_dict.items()):
+        yield "*** {0} DUPLICATED DIRECTOR{1} ***\n".format(num_duplicated_dirs, suffix)
+        yield "\n"
+        for md5, paths in reversed_dir_dict.items():
             for path in paths:
-                report_str += path + "\n"
-            report_str += "\n"
+                yield path + "\n"
+            yield "\n"
     else:
-        report_str += "*** NO DUPLICATED DIRECTORY ***\n\n"
+        yield "*** NO DUPLICATED DIRECTORY ***\n"
+        yield "\n"
 
     # DIRECTORIES LIKENESS
-    directory_likeness_list = [item for item in list(directory_likeness_dict.items()) if LIKENESS_THRESHOLD < item[1] < 100]
+    directory_likeness_list = [item for item in directory_likeness_dict.items() if LIKENESS_THRESHOLD < item[1] < 100]
     directory_likeness_list.sort(key=lambda x: x[1], reverse=True)
     if len(directory_likeness_list) > 0:
-        report_str += "*** DIRECTORIES LIKENESS ***\n"
-        report_str += "\n"
+        yield "*** DIRECTORIES LIKENESS ***\n"
+        yield "\n"
         for path_pair, likeness in directory_likeness_list:
             assert len(path_pair) == 2
-            report_str += "{0}%\n".format(likeness)
-            report_str += path_pair[0] + "\n"
-            report_str += path_pair[1] + "\n"
-            report_str += "\n"
+            yield "{0}%\n".format(likeness)
+            yield path_pair[0] + "\n"
+            yield path_pair[1] + "\n"
+            yield "\n"
 
     # FILES
     num_duplicated_files = len(reversed_file_dict)
     if num_duplicated_files > 0:
         suffix = "" if num_duplicated_files == 1 else "S"
-        report_str += "*** {0} DUPLICATED FILE{1} ***\n\n".format(num_duplicated_files, suffix)
-        for md5, paths in list(reversed_file_dict.items()):
+        yield "*** {0} DUPLICATED FILE{1} ***\n".format(num_duplicated_files, suffix)
+        yield "\n"
+        for md5, paths in reversed_file_dict.items():
             for path in paths:
-                report_str += path + "\n"
-            report_str += "\n"
+                yield path + "\n"
+            yield "\n"
     else:
-        report_str += "*** NO DUPLICATED FILE ***\n\n"
+        yield "*** NO DUPLICATED FILE ***\n"
+        yield "\n"
+
 
-    return report_str
+def write_report(file, reversed_file_dict, reversed_dir_dict, directory_likeness_dict):
+    """Write a human readable report to the file object file, line by line
+    (see iter_report())."""
+
+    file.writelines(iter_report(reversed_file_dict, reversed_dir_dict, directory_likeness_dict))
+
+
+def report(reversed_file_dict, reversed_dir_dict, directory_likeness_dict):
+    """Return a human readable report text."""
+
+    return "".join(iter_report(reversed_file_dict, reversed_dir_dict, directory_likeness_dict))
+
+
+def iter_records(reversed_file_dict, reversed_dir_dict, directory_likeness_dict, index=None):
+    """Generate one record per duplicated directories group, directories
+    likeness pair and duplicated files group (in the order of the report).
+
+    Records are dictionaries:
+
+        {"type": "directory" | "likeness" | "file",
+         "digest": md5,             # None for likeness pairs
+         "size": size_in_bytes,     # None for likeness pairs
+         "likeness": percentage,    # None for duplicates groups
+         "paths": [path1, path2, ...]}
+
+    The size of a group is the size of its first path (the total size of
+    its files for directories). If index is the TreeIndex filled by the scan
+    (see build_path_dictionary()), sizes are read from it; otherwise files
+    are stat'ed and directories walked again. The size is None if it can't
+    be known."""
+
+    # DIRECTORIES
+    for md5, paths in reversed_dir_dict.items():
+        if index is not None:
+            size = _indexed_size(index, paths[0])
+        elif os.path.isdir(paths[0]):
+            size = sum(file_sizes(paths[:1]).values())
+        else:
+            size = None
+        yield {"type": "directory", "digest": md5, "size": size, "likeness": None, "paths": paths}
+
+    # DIRECTORIES LIKENESS
+    directory_likeness_list = [item for item in directory_likeness_dict.items() if LIKENESS_THRESHOLD < item[1] < 100]
+    directory_likeness_list.sort(key=lambda x: x[1], reverse=True)
+    for path_pair, likeness in directory_likeness_list:
+        yield {"type": "likeness", "digest": None, "size": None, "likeness": likeness, "paths": list(path_pair)}
+
+    # FILES
+    for md5, paths in reversed_file_dict.items():
+        if index is not None:
+            size = _indexed_size(index, paths[0])
+        else:
+            try:
+                size = os.stat(paths[0]).st_size
+            except OSError:
+                size = None
+        yield {"type": "file", "digest": md5, "size": size, "likeness": None, "paths": paths}
+
+
+def _indexed_size(index, path):
+    """Return the size of path recorded in index (None if unknown)."""
+
+    try:
+        return index.size(index.node_id(path))
+    except KeyError:
+        return None
+
+
+def write_records(file, records, record_format):
+    """Write records (see iter_records()) to file, one by one, in the
+    record_format format (one of RECORD_FORMATS):
+
+    - 'jsonl': one JSON object per line;
+    - 'csv': one row per record: type, digest, size, likeness, path1,
+      path2, ... (file should be opened with newline='');
+    - 'null': the same fields, each one terminated by a NUL character, and
+      an additional NUL character at the end of each record (file has to be
+      a binary file; paths are written with os.fsencode()).
+
+    None values are written as null in JSON and as empty fields otherwise."""
+
+    if record_format == 'jsonl':
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+    elif record_format == 'csv':
+        csv_writer = csv.writer(file)
+        for record in records:
+            csv_writer.writerow(_record_fields(record))
+    elif record_format == 'null':
+        for record in records:
+            file.write(b"".join(os.fsencode(field) + b"\0" for field in _record_fields(record)) + b"\0")
+    else:
+        raise ValueError("unknown record format: {0}".format(record_format))
+
+
+def _record_fields(record):
+    """Return the list of the (string) fields of a record."""
+
+    field_list = ["" if record[key] is None else str(record[key]) for key in ("type", "digest", "size", "likeness")]
+    return field_list + list(record["paths"])
 
 
 # BUILD {PATH:MD5,...} DICTIONARY (WALK THE TREE) #############################
 
-def walk(root_path, db):
-    """Walk the tree starting from "root_path" and build the {path:md5,...}
-    dictionary"""
-
-    local_file_dict = {}   # dict = {path: md5, ...}
-    local_dir_dict = {}    # dict = {path: md5, ...}
-
-    # current_dir_path = a string, the path to the directory.
-    # dir_names        = a list of the names (strings) of the subdirectories in
-    #                    current_dir_path (excluding '.' and '..').
-    # file_names       = a list of the names (strings) of the non-directory files
-    #                    in current_dir_path.
-    for current_dir_path, dir_names, file_names in os.walk(root_path, topdown=False, followlinks=False):
-
-        # ABSOLUTE PATH OF current_dir_path
-        current_dir_path = os.path.abspath(current_dir_path)
-
-        # MAKE THE MD5 LIST OF CURRENT_DIR'S CONTENT (REQUIRED TO COMPUTE
-        # CURRENT_DIR'S MD5)
-        current_dir_md5_list = []
-
-        # CHILD FILES
-        for file_name in file_names:
-            file_path = os.path.join(current_dir_path, file_name)
-
-            if not os.path.islink(file_path):
-                file_mtime = os.path.getmtime(file_path)
-                file_size = os.path.getsize(file_path)
-                file_md5 = None
-
-                if db is not None:
-                    if file_path in db:
-                        db_file_mtime, db_file_size, db_file_md5 = db[file_path].split()
-                        if file_mtime == db_file_mtime and file_size == db_file_size:
-                            # The file is known and hasn't changed since the
-                            # last walk => don't compute the MD5, use the one
-                            # in db.
-                            file_md5 = db_file_md5
+def directory_digest(md5_list, hash_algorithm=DEFAULT_HASH_ALGORITHM):
+    """Return the digest of a directory given the digests of its children
+    (files and sub directories), computed with hash_algorithm."""
 
-                if file_md5 is None:
-                    file_md5 = md5sum(file_path)
-                    if db is not None:
-                        db[file_path] = "{0} {1} {2}".format(file_mtime, file_size, file_md5)
+    current_dir_md5_generator = new_hash(hash_algorithm)
+
+    # md5_list have to be sorted because even for an identical set of items,
+    # different order implies different MD5
+    for item in sorted(md5_list):
+        current_dir_md5_generator.update(bytes(item, 'utf-8'))  # TODO
+
+    return current_dir_md5_generator.hexdigest()
+
+def list_directory(dir_path):
+    """Return the (dir_path_list, file_list) content of the directory
+    dir_path, where dir_path_list is the list of the paths of its
+    subdirectories and file_list the list of (path, os.stat_result) tuples of
+    its other files. Symbolic links are ignored.
+
+    Entries are listed with os.scandir() so that the type of each entry is
+    known without any additional system call and the (cached) stat result of
+    files is obtained with (at most) one lstat call."""
 
-                local_file_dict[file_path] = file_md5
+    dir_path_list = []
+    file_list = []
 
-                current_dir_md5_list.append(file_md5)
-#            else:
-#                warnings.warn("ignore link " + file_path, UserWarning)
+    with os.scandir(dir_path) as dir_entry_iterator:
+        for dir_entry in dir_entry_iterator:
+            try:
+                if dir_entry.is_dir(follow_symlinks=False):
+                    dir_path_list.append(dir_entry.path)
+                elif not dir_entry.is_symlink():
+                    file_list.append((dir_entry.path, dir_entry.stat(follow_symlinks=False)))
+#                else:
+#                    warnings.warn("ignore link " + dir_entry.path, UserWarning)
+            except OSError:
+                # The entry has been removed since the directory was listed
+                pass
 
-        # CHILD DIRECTORIES
-        for dir_name in dir_names:
-            dir_path = os.path.join(current_dir_path, dir_name)
+    return dir_path_list, file_list
 
-            if not os.path.islink(dir_path):
+def scan_tree(root_path, progress=None, listing_dict=None):
+    """Walk the tree starting from root_path and yield a
+    (dir_path, dir_path_list, file_list) tuple for each directory (see
+    list_directory()), with absolute paths.
+
+    Like os.walk(topdown=False), directories are yielded bottom-up (i.e.
+    after all their subdirectories) and unreadable directories are skipped.
+
+    Directories found in the optional listing_dict (see _list_trees()) are
+    not listed again: their content is popped from it."""
+
+    # Stack of (dir_path, content) tuples where content is None if dir_path
+    # hasn't been listed yet
+    stack = [(os.path.abspath(root_path), None)]
+
+    if progress is not None:
+        progress.dirs_found += 1
+
+    while len(stack) > 0:
+        dir_path, content = stack.pop()
+
+        if content is None:
+            if listing_dict is not None and dir_path in listing_dict:
+                content = listing_dict.pop(dir_path)
+            else:
                 try:
-                    dir_md5 = local_dir_dict[dir_path]
-                    current_dir_md5_list.append(dir_md5)
-                except KeyError:
-                    ## "local_dir_dict[dir_path]" should exists as we are doing a bottom-up tree walk
-                    #print 'Internal error. Check whether or not "topdown" argument is set to "False" in os.walk function call.'
-                    #print dir_path, "key doesn't exist in \"local_dir_dict\" dictionary."
-                    #sys.exit(4)
-                    warnings.warn("can't access " + dir_path, UserWarning)
-#            else:
-#                warnings.warn("ignore link " + dir_path, UserWarning)
-
-        # CURRENT_DIRECTORY'S MD5
-        current_dir_md5_generator = hashlib.md5()
-
-        # current_dir_md5_list have to be sorted because even for an identical
-        # set of items, different order implies different MD5
-        current_dir_md5_list.sort()
-
-        for item in current_dir_md5_list:
-            current_dir_md5_generator.update(bytes(item, 'utf-8'))  # TODO
-        local_dir_dict[current_dir_path] = current_dir_md5_generator.hexdigest()
+                    content = list_directory(dir_path)
+                except OSError:
+                    continue
+
+            if progress is not None:
+                progress.dirs_found += len(content[0])
+                progress.dirs_listed += 1
+
+            # dir_path is yielded once its subdirectories have been yielded
+            stack.append((dir_path, content))
+            stack.extend((sub_dir_path, None) for sub_dir_path in reversed(content[0]))
+        else:
+            yield dir_path, content[0], content[1]
+
+def _scan_tree_snapshot(root_path, db, progress=None):
+    """Like scan_tree() but directories whose stat data match the snapshot
+    recorded in db (see HashDatabase.get_directory()) are not listed.
+
+    Yield a (dir_path, dir_path_list, file_list, dir_snapshot) tuple for each
+    directory where dir_snapshot is a (dir_stat, stat_time, stored_entry)
+    tuple; for unchanged directories, file_list is None and stored_entry is
+    the recorded (digest, dir_name_list, file_entry_list) tuple, otherwise
+    stored_entry is None."""
+
+    stack = [(os.path.abspath(root_path), None)]
+
+    if progress is not None:
+        progress.dirs_found += 1
+
+    while len(stack) > 0:
+        dir_path, content = stack.pop()
+
+        if content is None:
+            stat_time = time.time()
+            try:
+                dir_stat = os.stat(dir_path)
+            except OSError:
+                continue
+
+            stored_entry = db.get_directory(dir_path, dir_stat)
+            if stored_entry is None:
+                try:
+                    dir_path_list, file_list = list_directory(dir_path)
+                except OSError:
+                    continue
+            else:
+                dir_path_list = [os.path.join(dir_path, dir_name) for dir_name in stored_entry[1]]
+                file_list = None
+
+            if progress is not None:
+                progress.dirs_found += len(dir_path_list)
+                progress.dirs_listed += 1
+
+            stack.append((dir_path, (dir_path_list, file_list, (dir_stat, stat_time, stored_entry))))
+            stack.extend((sub_dir_path, None) for sub_dir_path in reversed(dir_path_list))
+        else:
+            yield (dir_path,) + content
+
+def walk(root_path,
+         db=None,
+         placeholder_dict=None,
+         executor=None,
+         max_pending_files=MAX_PENDING_FILES,
+         progress=None,
+         index=None,
+         hash_algorithm=DEFAULT_HASH_ALGORITHM,
+         stats=None,
+         snapshot=False,
+         listing_dict=None):
+    """Walk the tree starting from "root_path" and build the {path:md5,...}
+    dictionary
+
+    Files and directories are hashed with hash_algorithm (see
+    pydfm.file_hash.HASH_ALGORITHMS).
+
+    db is an optional HashDatabase used to cache the hash of files.
+
+    Files listed in placeholder_dict (see prefilter_files()) are not hashed:
+    their placeholder digest is used instead.
+
+    If executor is a concurrent.futures.Executor, files are hashed
+    concurrently with it; at most max_pending_files files are submitted to
+    it and not hashed yet at any time (even within a single directory) and
+    the oldest directories are resolved as soon as more than
+    max_pending_files hashes are not collected. Directories digests are
+    computed bottom-up once all their children are resolved.
+
+    If progress is a ScanProgress object, it is updated (and notified) after
+    each directory.
+
+    If index is a TreeIndex, walked directories are added to it. If index is
+    a ScanResult, digests are only stored in it and the returned dictionaries
+    are views of index (see ScanResult.file_view()).
+
+    If stats is a ScanStats object, the time spent hashing files and
+    accessing db is added to its 'hash' and 'cache' stages.
+
+    If snapshot is True, the digest tree is recorded in db (see
+    HashDatabase.put_directory()) and directories whose stat data haven't
+    changed since the previous walk are not listed: their subdirectories are
+    still checked but the recorded digests of their files are reused. As
+    the stat data of a directory only change when entries are added, removed
+    or renamed, files modified in place in unchanged directories are not
+    detected.
+
+    Directories found in listing_dict (see scan_tree()) are not listed
+    again."""
+
+    if isinstance(index, ScanResult):
+        local_file_dict = index.file_view()
+        local_dir_dict = index.dir_view()
+    else:
+        local_file_dict = {}   # dict = {path: md5, ...}
+        local_dir_dict = {}    # dict = {path: md5, ...}
+
+    # Directories whose digest is not computed yet (in bottom-up order):
+    # [(dir_path, [(file_path, file_stat, file_md5, is_new), ...], [dir_path, ...], dir_snapshot), ...]
+    # where file_md5 is either a string or a future if the file is being hashed
+    # (file_stat is None for files whose digest comes from the snapshot)
+    pending_dir_deque = collections.deque()
+    num_pending_files = 0
+
+    # Futures of the files which may not be hashed yet
+    pending_future_set = set()
+
+    # current_dir_path = a string, the absolute path to the directory.
+    # dir_path_list    = a list of the paths (strings) of the subdirectories in
+    #                    current_dir_path (excluding '.', '..' and links).
+    # file_list        = a list of (path, os.stat_result) tuples for the
+    #                    non-directory files in current_dir_path (excluding
+    #                    links), or None if the directory hasn't changed
+    #                    since the snapshot dir_snapshot.
+    if snapshot:
+        tree = _scan_tree_snapshot(root_path, db, progress)
+    else:
+        tree = (content + (None,) for content in scan_tree(root_path, progress, listing_dict))
+
+    for current_dir_path, dir_path_list, file_list, dir_snapshot in tree:
+
+        if file_list is None:
+            pending_dir = _reuse_directory(current_dir_path, dir_path_list, dir_snapshot[2], progress)
+            num_submitted_files = 0
+        else:
+            pending_dir, num_submitted_files = _scan_directory(current_dir_path,
+                                                               dir_path_list,
+                                                               file_list,
+                                                               db,
+                                                               placeholder_dict,
+                                                               executor,
+                                                               progress,
+                                                               hash_algorithm,
+                                                               stats,
+                                                               pending_future_set,
+                                                               max_pending_files)
+        pending_dir_deque.append(pending_dir + (dir_snapshot,))
+        num_pending_files += num_submitted_files
+
+        # Compute the digest of directories whose children are resolved (or
+        # wait for the oldest ones if too many files are pending)
+        while len(pending_dir_deque) > 0:
+            file_list = pending_dir_deque[0][1]
+            is_resolved = all(isinstance(item[2], str) or item[2].done() for item in file_list)
+            if is_resolved or num_pending_files > max_pending_files:
+                num_pending_files -= _resolve_directory(pending_dir_deque.popleft(),
+                                                        local_file_dict,
+                                                        local_dir_dict,
+                                                        db,
+                                                        progress,
+                                                        index,
+                                                        hash_algorithm,
+                                                        stats)
+            else:
+                break
+
+        if progress is not None:
+            progress.notify()
+
+    while len(pending_dir_deque) > 0:
+        _resolve_directory(pending_dir_deque.popleft(), local_file_dict, local_dir_dict, db, progress, index, hash_algorithm, stats)
+
+    if progress is not None:
+        progress.notify()
+
+    return local_file_dict, local_dir_dict
+
+def _scan_directory(current_dir_path,
+                    dir_path_list,
+                    file_list,
+                    db,
+                    placeholder_dict=None,
+                    executor=None,
+                    progress=None,
+                    hash_algorithm=DEFAULT_HASH_ALGORITHM,
+                    stats=None,
+                    pending_future_set=None,
+                    max_pending_files=MAX_PENDING_FILES):
+    """Get (or start to compute) the digest of the files contained in the
+    directory current_dir_path (as yielded by scan_tree()).
+
+    Files are submitted to executor as long as the pending_future_set of
+    files which may not be hashed yet (updated in place, shared by the
+    directories of a walk) contains less than max_pending_files futures.
+
+    Return a (pending_dir, num_submitted_files) tuple where pending_dir is to
+    be given to _resolve_directory() and num_submitted_files is the number
+    of files submitted to the executor."""
+
+    num_submitted_files = 0
+
+    if pending_future_set is None:
+        pending_future_set = set()
+
+    # CHILD FILES
+    pending_file_list = []
+    for file_path, file_stat in file_list:
+        file_md5 = None
+        is_new = False
+
+        if placeholder_dict is not None and file_path in placeholder_dict:
+            file_md5 = placeholder_dict[file_path]
+            if progress is not None:
+                progress.files_skipped += 1
+                progress.bytes_skipped += file_stat.st_size
+        elif db is not None:
+            # If the file is known and hasn't changed since the last
+            # walk => don't compute the MD5, use the one in db.
+            with _stage(stats, 'cache', True):
+                file_md5 = db.get(file_path, file_stat)
+            if file_md5 is not None and progress is not None:
+                progress.files_cached += 1
+                progress.bytes_cached += file_stat.st_size
+
+        if progress is not None:
+            progress.files_found += 1
+            progress.bytes_found += file_stat.st_size
+
+        if file_md5 is None:
+            is_new = True
+            if executor is None:
+                file_md5 = _hash_file(file_path, hash_algorithm, stats)
+            else:
+                while len(pending_future_set) >= max_pending_files:
+                    done_future_set, not_done_future_set = concurrent.futures.wait(pending_future_set,
+                                                                                   return_when=concurrent.futures.FIRST_COMPLETED)
+                    pending_future_set.difference_update(done_future_set)
+                file_md5 = executor.submit(_hash_file, file_path, hash_algorithm, stats)
+                pending_future_set.add(file_md5)
+                num_submitted_files += 1
+
+        pending_file_list.append((file_path, file_stat, file_md5, is_new))
+
+    return (current_dir_path, pending_file_list, dir_path_list), num_submitted_files
+
+def _reuse_directory(current_dir_path, dir_path_list, stored_entry, progress=None):
+    """Make the pending_dir of an unchanged directory (see _scan_directory())
+    from its stored_entry snapshot (see HashDatabase.get_directory())."""
+
+    pending_file_list = []
+    for file_name, file_size, file_md5 in stored_entry[2]:
+        pending_file_list.append((os.path.join(current_dir_path, file_name), None, file_md5, False))
+
+        if progress is not None:
+            progress.files_found += 1
+            progress.bytes_found += file_size
+            progress.files_cached += 1
+            progress.bytes_cached += file_size
+
+    return current_dir_path, pending_file_list, dir_path_list
+
+class _UnreadableDigest(str):
+    """The digest given to a file which can't be hashed (see _hash_file()):
+    it is never recorded in the database."""
+
+def _hash_file(file_path, hash_algorithm, stats=None):
+    """Return the hash of file_path (the time spent is added to the 'hash'
+    stage of stats).
+
+    Files which can't be read (e.g. removed since they have been listed) or
+    which are not regular files get a placeholder digest unique to their
+    path (see _UnreadableDigest)."""
+
+    with _stage(stats, 'hash', True):
+        try:
+            return hashsum(file_path, hash_algorithm)
+        except OSError:
+            warnings.warn("can't read " + file_path, UserWarning)
+            return _UnreadableDigest(placeholder_digest('unreadable', file_path, digest_size=hash_digest_size(hash_algorithm)))
+
+def _resolve_directory(pending_dir,
+                       local_file_dict,
+                       local_dir_dict,
+                       db,
+                       progress=None,
+                       index=None,
+                       hash_algorithm=DEFAULT_HASH_ALGORITHM,
+                       stats=None):
+    """Collect the digests of the children of a directory walked by walk()
+    and compute its digest.
+
+    If index is a ScanResult, digests are stored in it rather than in
+    local_file_dict and local_dir_dict (which are then views of index).
+
+    If the directory has a dir_snapshot (see walk()), its snapshot is
+    recorded in db if it has changed.
+
+    Return the number of files whose hash was computed by an executor."""
+
+    current_dir_path, file_list, dir_list, dir_snapshot = pending_dir
+
+    is_compact = isinstance(index, ScanResult)
+
+    # MAKE THE MD5 LIST OF CURRENT_DIR'S CONTENT (REQUIRED TO COMPUTE
+    # CURRENT_DIR'S MD5)
+    file_md5_list = []
+    dir_md5_list = []
+    accessible_dir_list = []
+    num_collected_files = 0
+
+    # CHILD FILES
+    for file_path, file_stat, file_md5, is_new in file_list:
+        if not isinstance(file_md5, str):
+            file_md5 = file_md5.result()
+            num_collected_files += 1
+
+        if is_new and not isinstance(file_md5, _UnreadableDigest):
+            if db is not None:
+                with _stage(stats, 'cache', True):
+                    db.put(file_path, file_stat, file_md5)
+            if progress is not None:
+                progress.files_hashed += 1
+                progress.bytes_hashed += file_stat.st_size
+
+        if not is_compact:
+            local_file_dict[file_path] = file_md5
+        file_md5_list.append(file_md5)
+
+    # CHILD DIRECTORIES
+    for dir_path in dir_list:
+        try:
+            dir_md5 = local_dir_dict[dir_path]
+            dir_md5_list.append(dir_md5)
+            accessible_dir_list.append(dir_path)
+        except KeyError:
+            ## "local_dir_dict[dir_path]" should exists as we are doing a bottom-up tree walk
+            #print 'Internal error. Check whether or not "topdown" argument is set to "False" in os.walk function call.'
+            #print dir_path, "key doesn't exist in \"local_dir_dict\" dictionary."
+            #sys.exit(4)
+            warnings.warn("can't access " + dir_path, UserWarning)
+
+    # CURRENT_DIRECTORY'S MD5
+    current_dir_md5 = directory_digest(file_md5_list + dir_md5_list, hash_algorithm)
+
+    if not is_compact:
+        local_dir_dict[current_dir_path] = current_dir_md5
+
+    if index is not None:
+        if dir_snapshot is not None and dir_snapshot[2] is not None:
+            # The files of an unchanged directory have no stat data
+            file_size_list = [file_entry[1] for file_entry in dir_snapshot[2][2]]
+        else:
+            file_size_list = [item[1].st_size for item in file_list]
+        index.add_directory(current_dir_path,
+                            [item[0] for item in file_list],
+                            accessible_dir_list,
+                            file_md5_list,
+                            current_dir_md5,
+                            file_size_list)
+
+    # SNAPSHOT
+    if dir_snapshot is not None and db is not None:
+        dir_stat, stat_time, stored_entry = dir_snapshot
+        with _stage(stats, 'cache', True):
+            if stored_entry is None:
+                # Directories containing unreadable files are not recorded
+                is_readable = not any(isinstance(file_md5, _UnreadableDigest) for file_md5 in file_md5_list)
+                if is_readable and stat_time - max(dir_stat.st_mtime, dir_stat.st_ctime) >= SNAPSHOT_MIN_AGE:
+                    db.put_directory(current_dir_path,
+                                     dir_stat,
+                                     current_dir_md5,
+                                     [os.path.basename(dir_path) for dir_path in dir_list],
+                                     [(os.path.basename(item[0]), item[1].st_size, file_md5) for item, file_md5 in zip(file_list, file_md5_list)])
+            elif stored_entry[0] != current_dir_md5:
+                db.put_directory(current_dir_path, dir_stat, current_dir_md5, stored_entry[1], stored_entry[2])
+
+    return num_collected_files
+
+# ASYNCIO SCAN ENGINE #########################################################
+
+async def build_path_dictionary_async(root_paths,
+                                      db_path=None,
+                                      workers=None,
+                                      queue_size=ASYNC_QUEUE_SIZE,
+                                      progress_callback=None,
+                                      index=None,
+                                      hash_algorithm=DEFAULT_HASH_ALGORITHM,
+                                      stats=None):
+    """Coroutine version of build_path_dictionary() (see walk_async()): it
+    returns the same dictionaries and can be awaited from a running event
+    loop.
+
+    Files are hashed by a pool of workers threads (by the default executor
+    of the loop if workers is None); the database is accessed from its own
+    thread."""
+
+    loop = asyncio.get_running_loop()
+
+    root_paths = _normalize_root_paths(root_paths)
+
+    is_compact = isinstance(index, ScanResult)
+    if is_compact:
+        file_dict = index.file_view()
+        dir_dict = index.dir_view()
+    else:
+        file_dict = {}   # dict = {path: md5, ...}
+        dir_dict = {}    # dict = {path: md5, ...}
+
+    progress = ScanProgress(progress_callback)
+
+    executor = None
+    if workers is not None:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    # SQLite connections can only be used by the thread which created them
+    db = None
+    db_executor = None
+    if db_path is not None:
+        db_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        db = await loop.run_in_executor(db_executor, functools.partial(HashDatabase, db_path, hash_algorithm=hash_algorithm))
+
+    try:
+        with _stage(stats, 'walk'):
+            for path in root_paths:
+                local_file_dict, local_dir_dict = await walk_async(path,
+                                                                   db,
+                                                                   executor,
+                                                                   db_executor,
+                                                                   queue_size,
+                                                                   workers or ASYNC_HASH_TASKS,
+                                                                   progress,
+                                                                   index,
+                                                                   hash_algorithm,
+                                                                   stats)
+                if not is_compact:
+                    file_dict.update(local_file_dict)
+                    dir_dict.update(local_dir_dict)
+    finally:
+        if db is not None:
+            await loop.run_in_executor(db_executor, db.close)
+            db_executor.shutdown()
+        if executor is not None:
+            executor.shutdown()
+
+    if stats is not None:
+        stats.files += progress.files_found
+        stats.bytes_read += progress.bytes_hashed
+        stats.cache_hits += progress.files_cached
+        if db_path is not None:
+            stats.cache_misses += progress.files_hashed
+
+    return file_dict, dir_dict
+
+async def walk_async(root_path,
+                     db=None,
+                     executor=None,
+                     db_executor=None,
+                     queue_size=ASYNC_QUEUE_SIZE,
+                     hash_tasks=ASYNC_HASH_TASKS,
+                     progress=None,
+                     index=None,
+                     hash_algorithm=DEFAULT_HASH_ALGORITHM,
+                     stats=None):
+    """Coroutine version of walk(): the tree is walked by separate stages
+    connected by queues of at most queue_size items (so that a fast stage
+    waits for the slower ones):
+
+    1. directories are listed (see scan_tree()) in executor,
+    2. the digests of their files are looked up in db (in db_executor,
+       which must be the thread that created db, or in the loop thread if
+       None) and the other files are queued to be hashed,
+    3. hash_tasks files are hashed concurrently in executor,
+    4. the digests of directories are computed bottom-up once the digests
+       of their files are known (see _resolve_directory()).
+
+    executor is the executor used for blocking calls (the default executor
+    of the loop if None). Returns the same dictionaries as walk()."""
+
+    loop = asyncio.get_running_loop()
+
+    if isinstance(index, ScanResult):
+        local_file_dict = index.file_view()
+        local_dir_dict = index.dir_view()
+    else:
+        local_file_dict = {}   # dict = {path: md5, ...}
+        local_dir_dict = {}    # dict = {path: md5, ...}
+
+    async def call_db(function, *args):
+        if db_executor is None:
+            return function(*args)
+        return await loop.run_in_executor(db_executor, functools.partial(function, *args))
+
+    dir_queue = asyncio.Queue(queue_size)       # (dir_path, dir_path_list, file_list)
+    hash_queue = asyncio.Queue(queue_size)      # (file_path, future)
+    pending_queue = asyncio.Queue(queue_size)   # pending_dir (see walk())
+
+    # 1. ENUMERATE DIRECTORIES
+    async def list_directories():
+        tree = scan_tree(root_path, progress)
+        while True:
+            content = await loop.run_in_executor(executor, next, tree, None)
+            if content is None:
+                break
+            await dir_queue.put(content)
+        await dir_queue.put(None)
+
+    # 2. LOOK UP THE CACHE
+    async def check_files():
+        while True:
+            content = await dir_queue.get()
+            if content is None:
+                break
+            current_dir_path, dir_path_list, file_list = content
+
+            if db is None:
+                cached_md5_list = [None] * len(file_list)
+            else:
+                cached_md5_list = await call_db(_get_cached_digests, db, file_list, stats)
+
+            pending_file_list = []
+            for (file_path, file_stat), file_md5 in zip(file_list, cached_md5_list):
+                if progress is not None:
+                    progress.files_found += 1
+                    progress.bytes_found += file_stat.st_size
+                    if file_md5 is not None:
+                        progress.files_cached += 1
+                        progress.bytes_cached += file_stat.st_size
+
+                if file_md5 is None:
+                    file_md5 = loop.create_future()
+                    await hash_queue.put((file_path, file_md5))
+                    pending_file_list.append((file_path, file_stat, file_md5, True))
+                else:
+                    pending_file_list.append((file_path, file_stat, file_md5, False))
+
+            await pending_queue.put((current_dir_path, pending_file_list, dir_path_list, None))
+
+        for task_index in range(hash_tasks):
+            await hash_queue.put(None)
+        await pending_queue.put(None)
+
+    # 3. HASH FILES
+    async def hash_files():
+        while True:
+            item = await hash_queue.get()
+            if item is None:
+                break
+            file_path, future = item
+            try:
+                future.set_result(await loop.run_in_executor(executor, _hash_file, file_path, hash_algorithm, stats))
+            except Exception as exception:
+                future.set_exception(exception)
+
+    # 4. COMPUTE DIRECTORIES DIGESTS
+    async def resolve_directories():
+        while True:
+            pending_dir = await pending_queue.get()
+            if pending_dir is None:
+                break
+            current_dir_path, pending_file_list, dir_path_list, dir_snapshot = pending_dir
+
+            resolved_file_list = []
+            for file_path, file_stat, file_md5, is_new in pending_file_list:
+                if not isinstance(file_md5, str):
+                    file_md5 = await file_md5
+                resolved_file_list.append((file_path, file_stat, file_md5, is_new))
+
+            await call_db(_resolve_directory,
+                          (current_dir_path, resolved_file_list, dir_path_list, dir_snapshot),
+                          local_file_dict,
+                          local_dir_dict,
+                          db,
+                          progress,
+                          index,
+                          hash_algorithm,
+                          stats)
+
+            if progress is not None:
+                progress.notify()
+
+    task_list = [asyncio.ensure_future(coroutine) for coroutine in [list_directories(), check_files(), resolve_directories()] +
+                                                                   [hash_files() for task_index in range(hash_tasks)]]
+    try:
+        await asyncio.gather(*task_list)
+    except BaseException:
+        for task in task_list:
+            task.cancel()
+        raise
 
     return local_file_dict, local_dir_dict
 
+def _get_cached_digests(db, file_list, stats=None):
+    """Return the list of the digests of file_list (see list_directory())
+    recorded in db (None for unknown files)."""
+
+    with _stage(stats, 'cache', True):
+        return [db.get(file_path, file_stat) for file_path, file_stat in file_list]
@@ -30,12 +30,381 @@ This module contains some tools to manage databases of computed file hashes
 (to speedup their future accesses).
 """
 
-__all__ = ['get_default_db_path',
+__all__ = ['HashDatabase',
+           'get_default_db_path',
+           'import_dbm_db',
            'print_db',
-           'clear_db']
+           'clear_db',
+           'prune_db']
 
 import dbm.dumb
+import json
 import os
+import sqlite3
+import stat
+import time
+
+from pydfm.file_hash import DEFAULT_HASH_ALGORITHM
+
+# Version of the database schema; databases with another version are reset
+# (they only contain a cache of hashes)
+SCHEMA_VERSION = 6
+
+# Number of updates buffered before being written in a single transaction
+DEFAULT_BATCH_SIZE = 1000
+
+# Number of seconds to wait for a lock held by another process
+DEFAULT_TIMEOUT = 60.
+
+
+class HashDatabase:
+    """A database of computed file hashes, stored in a SQLite file.
+
+    Files are recorded with their modification time, their size and the
+    hash algorithm used so that their hash can be reused as long as they
+    haven't changed. Each HashDatabase object only reads and writes the
+    hashes computed with its hash_algorithm: entries of different algorithms
+    are stored side by side but never mixed. They are also indexed
+    by their (st_dev, st_ino, st_size, st_mtime_ns) attributes so that the
+    hash of a renamed or moved file can be reused too (its st_ctime changes
+    when it is renamed on most file systems). Updates
+    are buffered and written by batches of batch_size entries in a single
+    transaction.
+
+    The last time each entry (and each directory snapshot) has been used is
+    recorded so that the least recently seen entries can be evicted to keep
+    the database bounded (see evict()).
+
+    The database also holds a snapshot of the scanned directories (see
+    get_directory() and put_directory()): their stat data, their digest and
+    their entries, so that directories which haven't changed don't have to
+    be listed again.
+
+    If the database doesn't exist yet and a legacy dbm.dumb database exists
+    at the same path (i.e. "db_path.dat" and "db_path.dir" files), its
+    content is imported.
+    """
+
+    def __init__(self, db_path, batch_size=DEFAULT_BATCH_SIZE, hash_algorithm=DEFAULT_HASH_ALGORITHM):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.hash_algorithm = hash_algorithm
+        self._pending_entries = []
+        self._pending_touches = []
+        self._pending_dirs = []
+        self._pending_dir_touches = []
+
+        self.connection = sqlite3.connect(db_path, timeout=DEFAULT_TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        is_new = False
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            with self.connection:
+                # Lock the database and read the version again: other
+                # processes may be creating the schema at the same time
+                self.connection.execute("BEGIN IMMEDIATE")
+                schema_version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+                if schema_version != SCHEMA_VERSION:
+                    is_new = (schema_version == 0)
+                    self.connection.execute("DROP TABLE IF EXISTS files")
+                    self.connection.execute("DROP TABLE IF EXISTS dirs")
+                    self.connection.execute("""CREATE TABLE files (
+                                                   path BLOB NOT NULL,
+                                                   algorithm TEXT NOT NULL,
+                                                   mtime REAL NOT NULL,
+                                                   size INTEGER NOT NULL,
+                                                   digest TEXT NOT NULL,
+                                                   dev INTEGER,
+                                                   ino INTEGER,
+                                                   mtime_ns INTEGER,
+                                                   ctime_ns INTEGER,
+                                                   last_seen REAL NOT NULL,
+                                                   PRIMARY KEY (path, algorithm))""")
+                    self.connection.execute("CREATE INDEX files_inode ON files (dev, ino)")
+                    self.connection.execute("CREATE INDEX files_last_seen ON files (last_seen)")
+                    self.connection.execute("""CREATE TABLE dirs (
+                                                   path BLOB NOT NULL,
+                                                   algorithm TEXT NOT NULL,
+                                                   dev INTEGER NOT NULL,
+                                                   ino INTEGER NOT NULL,
+                                                   mtime_ns INTEGER NOT NULL,
+                                                   ctime_ns INTEGER NOT NULL,
+                                                   digest TEXT NOT NULL,
+                                                   entries TEXT NOT NULL,
+                                                   last_seen REAL NOT NULL,
+                                                   PRIMARY KEY (path, algorithm))""")
+                    self.connection.execute("CREATE INDEX dirs_last_seen ON dirs (last_seen)")
+                    self.connection.execute("PRAGMA user_version={0}".format(SCHEMA_VERSION))
+
+        if is_new and os.path.isfile(db_path + ".dat") and os.path.isfile(db_path + ".dir"):
+            import_dbm_db(self, db_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        self.commit()
+        return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def get(self, file_path, file_stat):
+        """Return the recorded hash of file_path (whose os.stat_result is
+        file_stat) or None if this file is unknown or if it has changed (i.e.
+        its modification time or its size differs).
+
+        If file_path is unknown but its inode is known and hasn't changed,
+        the recorded hash is returned and file_path is recorded."""
+
+        row = self.connection.execute("SELECT digest FROM files WHERE path=? AND algorithm=? AND mtime=? AND size=?",
+                                      (os.fsencode(file_path),
+                                       self.hash_algorithm,
+                                       file_stat.st_mtime,
+                                       file_stat.st_size)).fetchone()
+
+        if row is not None:
+            self._pending_touches.append((time.time(), os.fsencode(file_path), self.hash_algorithm))
+            if len(self._pending_touches) >= self.batch_size:
+                self.commit()
+        else:
+            row = self.connection.execute("""SELECT digest FROM files
+                                             WHERE dev=? AND ino=? AND algorithm=? AND size=? AND mtime_ns=?""",
+                                          (file_stat.st_dev,
+                                           file_stat.st_ino,
+                                           self.hash_algorithm,
+                                           file_stat.st_size,
+                                           file_stat.st_mtime_ns)).fetchone()
+            if row is not None:
+                # The file has been renamed or moved
+                self.put(file_path, file_stat, row[0])
+
+        return None if row is None else row[0]
+
+    def put(self, file_path, file_stat, file_md5):
+        """Record the hash of file_path (whose os.stat_result is
+        file_stat) computed with the hash_algorithm of the database."""
+
+        self._pending_entries.append((os.fsencode(file_path),
+                                      self.hash_algorithm,
+                                      file_stat.st_mtime,
+                                      file_stat.st_size,
+                                      file_md5,
+                                      file_stat.st_dev,
+                                      file_stat.st_ino,
+                                      file_stat.st_mtime_ns,
+                                      file_stat.st_ctime_ns,
+                                      time.time()))
+
+        if len(self._pending_entries) >= self.batch_size:
+            self.commit()
+
+    def get_directory(self, dir_path, dir_stat):
+        """Return the recorded (digest, dir_name_list, file_entry_list) tuple
+        of the directory dir_path (whose os.stat_result is dir_stat) or None
+        if this directory is unknown or if it has changed (i.e. entries have
+        been added, removed or renamed).
+
+        dir_name_list is the list of the names of its subdirectories and
+        file_entry_list the list of the (name, size, digest) tuples of its
+        files. Note that files modified in place don't change the stat data
+        of their directory."""
+
+        row = self.connection.execute("""SELECT digest, entries FROM dirs
+                                         WHERE path=? AND algorithm=? AND dev=? AND ino=? AND mtime_ns=? AND ctime_ns=?""",
+                                      (os.fsencode(dir_path),
+                                       self.hash_algorithm,
+                                       dir_stat.st_dev,
+                                       dir_stat.st_ino,
+                                       dir_stat.st_mtime_ns,
+                                       dir_stat.st_ctime_ns)).fetchone()
+
+        if row is None:
+            return None
+
+        self._pending_dir_touches.append((time.time(), os.fsencode(dir_path), self.hash_algorithm))
+        if len(self._pending_dir_touches) >= self.batch_size:
+            self.commit()
+
+        entries = json.loads(row[1])
+        return row[0], entries["dirs"], [tuple(file_entry) for file_entry in entries["files"]]
+
+    def put_directory(self, dir_path, dir_stat, dir_digest, dir_name_list, file_entry_list):
+        """Record the directory dir_path (whose os.stat_result is dir_stat),
+        its digest and its entries (see get_directory())."""
+
+        entries = json.dumps({"dirs": dir_name_list, "files": file_entry_list})
+        self._pending_dirs.append((os.fsencode(dir_path),
+                                   self.hash_algorithm,
+                                   dir_stat.st_dev,
+                                   dir_stat.st_ino,
+                                   dir_stat.st_mtime_ns,
+                                   dir_stat.st_ctime_ns,
+                                   dir_digest,
+                                   entries,
+                                   time.time()))
+
+        if len(self._pending_dirs) >= self.batch_size:
+            self.commit()
+
+    def items(self):
+        """Iterate over recorded files (of all hash algorithms): yield
+        (path, mtime, size, algorithm, digest) tuples."""
+
+        self.commit()
+        for path, mtime, size, algorithm, digest in self.connection.execute("""SELECT path, mtime, size, algorithm, digest
+                                                                               FROM files ORDER BY path, algorithm"""):
+            yield os.fsdecode(path), mtime, size, algorithm, digest
+
+    def clear(self):
+        """Remove all recorded files."""
+
+        self._pending_entries = []
+        self._pending_touches = []
+        self._pending_dirs = []
+        self._pending_dir_touches = []
+        with self.connection:
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("DELETE FROM dirs")
+        self.compact()
+
+    def prune(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Remove entries of files that don't exist anymore or that have
+        changed since they have been recorded, as well as the snapshot of
+        directories that don't exist anymore or that have changed.
+
+        Entries are checked by batches of batch_size entries. Return the
+        number of removed file entries."""
+
+        self.commit()
+
+        num_removed_entries = 0
+        last_rowid = 0
+
+        while True:
+            rows = self.connection.execute("SELECT rowid, path, mtime, size FROM files WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                                           (last_rowid, batch_size)).fetchall()
+            if len(rows) == 0:
+                break
+
+            stale_rowid_list = []
+            for rowid, path, mtime, size in rows:
+                try:
+                    file_stat = os.lstat(path)
+                    if stat.S_ISLNK(file_stat.st_mode) or file_stat.st_mtime != mtime or file_stat.st_size != size:
+                        stale_rowid_list.append((rowid,))
+                except OSError:
+                    stale_rowid_list.append((rowid,))
+
+            with self.connection:
+                self.connection.executemany("DELETE FROM files WHERE rowid=?", stale_rowid_list)
+
+            num_removed_entries += len(stale_rowid_list)
+            last_rowid = rows[-1][0]
+
+        last_rowid = 0
+        while True:
+            rows = self.connection.execute("""SELECT rowid, path, dev, ino, mtime_ns, ctime_ns FROM dirs
+                                              WHERE rowid > ? ORDER BY rowid LIMIT ?""",
+                                           (last_rowid, batch_size)).fetchall()
+            if len(rows) == 0:
+                break
+
+            stale_rowid_list = []
+            for rowid, path, dev, ino, mtime_ns, ctime_ns in rows:
+                try:
+                    dir_stat = os.stat(path)
+                    if (dir_stat.st_dev, dir_stat.st_ino, dir_stat.st_mtime_ns, dir_stat.st_ctime_ns) != (dev, ino, mtime_ns, ctime_ns):
+                        stale_rowid_list.append((rowid,))
+                except OSError:
+                    stale_rowid_list.append((rowid,))
+
+            with self.connection:
+                self.connection.executemany("DELETE FROM dirs WHERE rowid=?", stale_rowid_list)
+
+            last_rowid = rows[-1][0]
+
+        return num_removed_entries
+
+    def evict(self, max_entries=None, max_bytes=None):
+        """Remove the least recently seen entries until the database contains
+        at most max_entries entries and until its content takes at most
+        max_bytes bytes (compact() should then be called to shrink the
+        database file).
+
+        Both file entries and directories snapshots count as entries: the
+        same fraction of each table is evicted.
+
+        Return the number of removed entries."""
+
+        num_files = len(self)
+        num_dirs = self.connection.execute("SELECT COUNT(*) FROM dirs").fetchone()[0]
+        num_entries = num_files + num_dirs
+        num_kept_entries = num_entries
+
+        if max_entries is not None:
+            num_kept_entries = min(num_kept_entries, max_entries)
+
+        if max_bytes is not None and num_entries > 0:
+            page_size = self.connection.execute("PRAGMA page_size").fetchone()[0]
+            page_count = self.connection.execute("PRAGMA page_count").fetchone()[0]
+            freelist_count = self.connection.execute("PRAGMA freelist_count").fetchone()[0]
+            used_bytes = (page_count - freelist_count) * page_size
+            if used_bytes > max_bytes:
+                num_kept_entries = min(num_kept_entries, int(num_entries * max_bytes / used_bytes))
+
+        if num_kept_entries == num_entries:
+            return 0
+
+        num_removed_files = num_files - num_files * num_kept_entries // num_entries
+        num_removed_dirs = num_dirs - num_dirs * num_kept_entries // num_entries
+
+        with self.connection:
+            self.connection.execute("""DELETE FROM files WHERE rowid IN
+                                       (SELECT rowid FROM files ORDER BY last_seen LIMIT ?)""",
+                                    (num_removed_files,))
+            self.connection.execute("""DELETE FROM dirs WHERE rowid IN
+                                       (SELECT rowid FROM dirs ORDER BY last_seen LIMIT ?)""",
+                                    (num_removed_dirs,))
+
+        return num_removed_files + num_removed_dirs
+
+    def compact(self):
+        """Shrink the database file."""
+
+        self.commit()
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.connection.execute("VACUUM")
+
+    def commit(self):
+        """Write pending updates to the database file."""
+
+        if len(self._pending_entries) > 0 or len(self._pending_touches) > 0 or len(self._pending_dirs) > 0 or len(self._pending_dir_touches) > 0:
+            with self.connection:
+                self.connection.executemany("""INSERT OR REPLACE INTO files
+                                               (path, algorithm, mtime, size, digest, dev, ino, mtime_ns, ctime_ns, last_seen)
+                                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                            self._pending_entries)
+                self.connection.executemany("UPDATE files SET last_seen=? WHERE path=? AND algorithm=?",
+                                            self._pending_touches)
+                self.connection.executemany("""INSERT OR REPLACE INTO dirs
+                                               (path, algorithm, dev, ino, mtime_ns, ctime_ns, digest, entries, last_seen)
+                                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                            self._pending_dirs)
+                self.connection.executemany("UPDATE dirs SET last_seen=? WHERE path=? AND algorithm=?",
+                                            self._pending_dir_touches)
+            self._pending_entries = []
+            self._pending_touches = []
+            self._pending_dirs = []
+            self._pending_dir_touches = []
+
+    def close(self):
+        """Write pending updates and close the database."""
+
+        self.commit()
+        self.connection.close()
+
 
 def get_default_db_path():
     """Return the default database path."""
@@ -48,24 +417,46 @@ def get_default_db_path():
     return db_path
 
 
+def import_dbm_db(db, dbm_path):
+    """Import the content of a legacy dbm.dumb database (in which values are
+    "mtime size md5" strings) into the HashDatabase db (as MD5 entries)."""
+
+    dbm_db = dbm.dumb.open(dbm_path, 'r')
+
+    # Legacy entries are not indexed by inode
+    last_seen = time.time()
+    for file_path, file_attributes in dbm_db.items():
+        file_mtime, file_size, file_md5 = file_attributes.decode('utf-8').split()
+        db._pending_entries.append((os.fsencode(file_path.decode('utf-8')),
+                                    'md5',
+                                    float(file_mtime),
+                                    int(file_size),
+                                    file_md5,
+                                    None, None, None, None,
+                                    last_seen))
+
+    dbm_db.close()
+    db.commit()
+
+
 def print_db(db_path):
     """Print the database content."""
 
     if db_path is not None:
-        db = dbm.dumb.open(db_path, 'c')
+        with HashDatabase(db_path) as db:
+            num_files = 0
+            for file_path, file_mtime, file_size, file_algorithm, file_digest in db.items():
+                print("{path} {mtime} {size} {algorithm} {digest}".format(path=file_path,
+                                                                          mtime=file_mtime,
+                                                                          size=file_size,
+                                                                          algorithm=file_algorithm,
+                                                                          digest=file_digest))
+                num_files += 1
 
-        if len(db) == 0:
-            print("Empty database.")
-        else:
-            for file_path, file_attributes in list(db.items()):
-                file_mtime, file_size, file_md5 = file_attributes.split()
-                print("{path} {mtime} {size} {md5}".format(path=file_path,
-                                                           mtime=file_mtime,
-                                                           size=file_size,
-                                                           md5=file_md5))
-            print(len(db), "files are recorded in", db_path)
-
-        db.close()
+            if num_files == 0:
+                print("Empty database.")
+            else:
+                print(num_files, "files are recorded in", db_path)
     else:
         print("No database.")
 
@@ -75,10 +466,25 @@ def clear_db(db_path):
 
     if db_path is not None:
         print("Clear ", db_path)
-        #db = dbm.dumb.open(db_path, 'n')  # TODO: it doesn't work...
-        db = dbm.dumb.open(db_path, 'c')
-        db.clear()
-        db.close()
+        with HashDatabase(db_path) as db:
+            db.clear()
     else:
         print("No database.")
 
+
+def prune_db(db_path, max_entries=None, max_bytes=None):
+    """Remove the entries of deleted or modified files from the database,
+    evict the least recently seen entries to keep at most max_entries
+    entries (and at most max_bytes bytes) and compact the database."""
+
+    if db_path is not None:
+        print("Prune ", db_path)
+        with HashDatabase(db_path) as db:
+            num_pruned_entries = db.prune()
+            num_evicted_entries = db.evict(max_entries, max_bytes)
+            db.compact()
+            print(num_pruned_entries, "stale entries removed")
+            print(num_evicted_entries, "entries evicted")
+            print(len(db), "files are recorded in", db_path)
+    else:
+        print("No database.")
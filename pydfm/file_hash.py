@@ -32,41 +32,303 @@ file.
 See https://docs.python.org/3/library/hashlib.html for more information.
 """
 
-__all__ = ['compute_files_hash',
+__all__ = ['HASH_ALGORITHMS',
+           'new_hash',
+           'hash_digest_size',
+           'compute_files_hash',
+           'compute_partial_hash',
+           'hashsum',
+           'partial_hashsum',
+           'compare_files',
+           'partial_md5sum',
            'md5sum',
            'sha1sum',
            'sha256sum',
            'sha512sum']
 
+import contextlib
+import errno
 import hashlib
+import mmap
 import os
+import stat
+import threading
 
-# TODO: profile the message digest with different chunk sizes
-DEFAULT_CHUNK_SIZE = 2**12
+# Size of the buffer used to read files. Larger buffers don't make hashing
+# faster while 4 KiB ones make it about 15% slower (see
+# benchmarks/bench_read.py)
+DEFAULT_CHUNK_SIZE = 2**18
+
+# Files are read into a reusable buffer by default. Memory mapping large
+# files is only about 5% faster but a file truncated while it is mapped kills
+# the process with SIGBUS (no Python exception can be caught), which is
+# likely on network shares: 'mmap' must be explicitly requested.
+DEFAULT_READ_METHOD = 'readinto'
+
+# Ways of reading files in compute_files_hash()
+READ_METHODS = ('read', 'readinto', 'mmap')
+if hasattr(hashlib, 'file_digest'):
+    READ_METHODS += ('file_digest',)
+
+# Size of the head and tail blocks read by compute_partial_hash()
+DEFAULT_PARTIAL_BLOCK_SIZE = 2**16
+
+# Size of the buffers used by compare_files() (one per compared file)
+DEFAULT_COMPARE_CHUNK_SIZE = 2**20
+
+# Hash algorithms usable to compare files: {name: hash generator constructor}
+HASH_ALGORITHMS = {'md5': hashlib.md5,
+                   'sha1': hashlib.sha1,
+                   'sha256': hashlib.sha256,
+                   'sha512': hashlib.sha512,
+                   'blake2b': hashlib.blake2b,
+                   'blake2b-128': lambda: hashlib.blake2b(digest_size=16),
+                   'blake2b-64': lambda: hashlib.blake2b(digest_size=8),
+                   'blake2s': hashlib.blake2s}
+
+DEFAULT_HASH_ALGORITHM = 'md5'
+
+
+def new_hash(hash_algorithm=DEFAULT_HASH_ALGORITHM):
+    """Return a new hash generator for the given algorithm (one of the keys
+    of HASH_ALGORITHMS).
+
+    Raise a ValueError if the algorithm is unknown.
+    """
+
+    try:
+        hash_constructor = HASH_ALGORITHMS[hash_algorithm]
+    except KeyError:
+        raise ValueError("unknown hash algorithm: {0}".format(hash_algorithm))
+
+    return hash_constructor()
+
+
+def hash_digest_size(hash_algorithm=DEFAULT_HASH_ALGORITHM):
+    """Return the size (in bytes) of the digests of the given algorithm."""
+
+    return new_hash(hash_algorithm).digest_size
+
+
+# Reusable read buffers (one per thread)
+_thread_local = threading.local()
 
 
 def compute_files_hash(hash_generator,
                        file_path,
-                       chunk_size=DEFAULT_CHUNK_SIZE):
+                       chunk_size=DEFAULT_CHUNK_SIZE,
+                       method=None):
     """Return the hash of a given file.
 
     :param string file_path: the path of the file for which the hash is
         computed.
+    :param int chunk_size: the size (in bytes) of the read buffer.
+    :param string method: the way the file is read (one of READ_METHODS):
+        'read' reads chunks in new bytes objects, 'readinto' reads chunks into
+        a reusable buffer, 'mmap' maps the whole file in memory and
+        'file_digest' uses hashlib.file_digest(). If None,
+        DEFAULT_READ_METHOD is used. Only use 'mmap' on files that can't be
+        truncated while they are hashed (see DEFAULT_READ_METHOD).
+    :raises OSError: if file_path can't be read or is not a regular file
+        (special files are not opened in blocking mode).
     """
 
-    if os.path.isfile(file_path): # TODO: exception !!!
-
-        with open(file_path, 'rb') as fd:
+    with open(file_path, 'rb', buffering=0, opener=_open_regular_file) as fd:
+        if method is None:
+            method = DEFAULT_READ_METHOD
+
+        if method == 'mmap':
+            try:
+                with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                    hash_generator.update(mapped_file)
+            except (OSError, ValueError):
+                # Empty files and some special file systems can't be mapped
+                _update_readinto(hash_generator, fd, chunk_size)
+        elif method == 'readinto':
+            _update_readinto(hash_generator, fd, chunk_size)
+        elif method == 'read':
             data = fd.read(chunk_size)
             while len(data) > 0:
                 hash_generator.update(data)
                 data = fd.read(chunk_size)
+        elif method == 'file_digest' and method in READ_METHODS:
+            hashlib.file_digest(fd, lambda: hash_generator)
+        else:
+            raise ValueError("unknown read method: {0}".format(method))
 
     hash_hex_str = hash_generator.hexdigest()
 
     return hash_hex_str
 
 
+def _update_readinto(hash_generator, fd, chunk_size):
+    """Update hash_generator with the content of the (unbuffered) file object
+    fd, read into a reusable buffer of chunk_size bytes."""
+
+    buffer = getattr(_thread_local, 'buffer', None)
+    if buffer is None or len(buffer) != chunk_size:
+        buffer = memoryview(bytearray(chunk_size))
+        _thread_local.buffer = buffer
+
+    num_bytes = fd.readinto(buffer)
+    while num_bytes:
+        hash_generator.update(buffer[:num_bytes])
+        num_bytes = fd.readinto(buffer)
+
+
+def compute_partial_hash(hash_generator,
+                         file_path,
+                         block_size=DEFAULT_PARTIAL_BLOCK_SIZE):
+    """Return the hash of the first and the last block_size bytes of a given
+    file.
+
+    Files smaller than two blocks are entirely hashed.
+
+    :param string file_path: the path of the file for which the hash is
+        computed.
+    :param int block_size: the size (in bytes) of the head and tail blocks.
+    :raises OSError: if file_path can't be read or is not a regular file
+        (special files are not opened in blocking mode).
+    """
+
+    with open(file_path, 'rb', opener=_open_regular_file) as fd:
+        head = fd.read(block_size)
+        hash_generator.update(head)
+        if len(head) == block_size:
+            fd.seek(0, os.SEEK_END)
+            file_size = fd.tell()
+            fd.seek(max(block_size, file_size - block_size))
+            hash_generator.update(fd.read(block_size))
+
+    hash_hex_str = hash_generator.hexdigest()
+
+    return hash_hex_str
+
+
+def hashsum(file_path, hash_algorithm=DEFAULT_HASH_ALGORITHM, chunk_size=DEFAULT_CHUNK_SIZE, read_method=None):
+    """Return the hash of a given file computed with the given algorithm (see
+    HASH_ALGORITHMS).
+
+    :param string file_path: the path of the file for which the message digest
+        is computed.
+    :param string hash_algorithm: the name of the hash algorithm.
+    :param string read_method: the way the file is read (see
+        compute_files_hash()).
+    """
+
+    hash_generator = new_hash(hash_algorithm)
+    hash_hex_str = compute_files_hash(hash_generator, file_path, chunk_size, read_method)
+
+    return hash_hex_str
+
+
+def partial_hashsum(file_path, hash_algorithm=DEFAULT_HASH_ALGORITHM, block_size=DEFAULT_PARTIAL_BLOCK_SIZE):
+    """Return the hash of the first and the last block_size bytes of a given
+    file computed with the given algorithm (see HASH_ALGORITHMS).
+
+    :param string file_path: the path of the file for which the message digest
+        is computed.
+    :param string hash_algorithm: the name of the hash algorithm.
+    """
+
+    hash_generator = new_hash(hash_algorithm)
+    hash_hex_str = compute_partial_hash(hash_generator, file_path, block_size)
+
+    return hash_hex_str
+
+
+def compare_files(file_path_list, chunk_size=DEFAULT_COMPARE_CHUNK_SIZE, hash_algorithm=None):
+    """Compare the content of the files of file_path_list byte by byte.
+
+    All files are opened at once and read in lockstep, chunk_size bytes at a
+    time; groups of files are split as soon as their contents diverge and
+    files left alone are not read anymore.
+
+    Return a (class_list, digest_list, num_bytes_read) tuple where
+    class_list is the list of the lists of files having the same content (in
+    the order of file_path_list). If hash_algorithm is not None, the content
+    shared by each group is hashed while it is read (once per group rather
+    than once per file) and digest_list gives the hash of each class of
+    several files (None for the files left alone, which are not entirely
+    read); otherwise digest_list only contains None.
+
+    Files are opened without blocking and OSError is raised if one of them
+    is not a regular file (e.g. a FIFO, which would block the reads).
+
+    :param list file_path_list: the paths of the compared files.
+    :param int chunk_size: the size (in bytes) of the read buffers.
+    :param string hash_algorithm: the name of the hash algorithm (see
+        HASH_ALGORITHMS) or None.
+    """
+
+    num_bytes_read = 0
+    class_list = []     # [(group, hash_generator), ...]
+
+    with contextlib.ExitStack() as exit_stack:
+        fd_list = [exit_stack.enter_context(open(file_path, 'rb', buffering=0, opener=_open_regular_file)) for file_path in file_path_list]
+        buffer_list = [bytearray(chunk_size) for file_path in file_path_list]
+
+        # Groups of files whose contents are identical so far (as indices)
+        # and the hash of this content
+        hash_generator = None if hash_algorithm is None else new_hash(hash_algorithm)
+        group_list = [(list(range(len(file_path_list))), hash_generator)]
+
+        while len(group_list) > 0:
+            next_group_list = []
+
+            for group, hash_generator in group_list:
+                length_list = [fd_list[index].readinto(buffer_list[index]) for index in group]
+                num_bytes_read += sum(length_list)
+
+                # Split the group according to the content of the chunks
+                sub_group_list = []     # [(length, [index, ...]), ...]
+                for index, length in zip(group, length_list):
+                    for sub_group_length, sub_group in sub_group_list:
+                        other_index = sub_group[0]
+                        if length == sub_group_length and _same_chunk(buffer_list[index], buffer_list[other_index], length):
+                            sub_group.append(index)
+                            break
+                    else:
+                        sub_group_list.append((length, [index]))
+
+                for length, sub_group in sub_group_list:
+                    if len(sub_group) == 1:
+                        class_list.append((sub_group, None))
+                        continue
+
+                    sub_hash_generator = hash_generator
+                    if hash_generator is not None:
+                        if len(sub_group_list) > 1:
+                            sub_hash_generator = hash_generator.copy()
+                        sub_hash_generator.update(memoryview(buffer_list[sub_group[0]])[:length])
+
+                    if length == 0:
+                        class_list.append((sub_group, sub_hash_generator))
+                    else:
+                        next_group_list.append((sub_group, sub_hash_generator))
+
+            group_list = next_group_list
+
+    class_list.sort(key=lambda item: item[0])
+    return ([[file_path_list[index] for index in group] for group, hash_generator in class_list],
+            [None if hash_generator is None else hash_generator.hexdigest() for group, hash_generator in class_list],
+            num_bytes_read)
+
+def _open_regular_file(file_path, flags):
+    """Open file_path without blocking (see open()'s opener argument) and
+    raise OSError if it isn't a regular file."""
+
+    fd = os.open(file_path, flags | os.O_NONBLOCK)
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        os.close(fd)
+        raise OSError(errno.EINVAL, "not a regular file", file_path)
+    return fd
+
+def _same_chunk(buffer1, buffer2, length):
+    if length == len(buffer1):
+        return buffer1 == buffer2
+    return buffer1[:length] == buffer2[:length]
+
 def md5sum(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
     """Return the MD5 hash of a given file.
 
@@ -80,6 +342,20 @@ def md5sum(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
     return hash_hex_str
 
 
+def partial_md5sum(file_path, block_size=DEFAULT_PARTIAL_BLOCK_SIZE):
+    """Return the MD5 hash of the first and the last block_size bytes of a
+    given file.
+
+    :param string file_path: the path of the file for which the message digest
+        is computed.
+    """
+
+    hash_generator = hashlib.md5()
+    hash_hex_str = compute_partial_hash(hash_generator, file_path, block_size)
+
+    return hash_hex_str
+
+
 def sha1sum(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
     """Return the SHA1 hash of a given file.
 
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains an in-memory index of the scanned trees, built during
+the walk, so that later stages don't have to read directories again, and a
+compact representation of scan results for very large trees.
+"""
+
+__all__ = ['TreeIndex',
+           'ScanResult',
+           'DigestView']
+
+import array
+import collections.abc
+import os
+import sys
+
+# Size (in bytes) of the digests stored in a ScanResult (MD5)
+DEFAULT_DIGEST_SIZE = 16
+
+
+class TreeIndex:
+    """A compact parent -> children index of the scanned trees.
+
+    Each file or directory is identified by an integer ID. Nodes are stored
+    in arrays: the name, the parent ID and the size of each node and, for
+    directories, the range of their children IDs in a single contiguous
+    array. Only the
+    root directories are recorded with their full path, so full paths are
+    rebuilt from the chain of parents.
+
+    Directories have to be added bottom-up (see add_directory()), as they are
+    walked by pydfm.core.walk(). The files of a directory get consecutive IDs
+    (following the ID of the directory) in the order of their names.
+    """
+
+    def __init__(self):
+        self.name_list = []                    # {id: name}
+        self.parent_array = array.array('q')   # {id: parent_id} (-1 for roots)
+        self.is_dir_array = bytearray()        # {id: is_dir}
+        self.size_array = array.array('q')     # {id: size in bytes} (-1 if unknown)
+
+        # The children of the directory id are
+        # child_array[child_offset_array[id]:child_offset_array[id] + child_count_array[id]]
+        self.child_offset_array = array.array('q')
+        self.child_count_array = array.array('q')
+        self.child_array = array.array('q')
+        self.file_count_array = array.array('q')  # {id: number of files}
+
+        self._dir_id_dict = {}                 # {path: id} (directories only)
+
+    def __len__(self):
+        return len(self.name_list)
+
+    def __contains__(self, dir_path):
+        return dir_path in self._dir_id_dict
+
+    def _add_node(self, name, is_dir):
+        node_id = len(self.name_list)
+        self.name_list.append(sys.intern(name))
+        self.parent_array.append(-1)
+        self.is_dir_array.append(is_dir)
+        self.size_array.append(-1)
+        self.child_offset_array.append(len(self.child_array))
+        self.child_count_array.append(0)
+        self.file_count_array.append(0)
+        return node_id
+
+    def add_directory(self, dir_path, file_path_list, dir_path_list, file_digest_list=None, dir_digest=None, file_size_list=None):
+        """Add the directory dir_path and its files.
+
+        The directories of dir_path_list must have been added before (paths
+        not in the index are ignored). Digests are ignored by TreeIndex (see
+        ScanResult). The size of dir_path is the total size of its files
+        (file_size_list) and subdirectories; it is unknown if file_size_list
+        is None. Return the ID of dir_path."""
+
+        if dir_path in self._dir_id_dict:
+            raise ValueError("{0} is already indexed".format(dir_path))
+
+        dir_id = self._add_node(dir_path, True)
+        self._dir_id_dict[dir_path] = dir_id
+
+        if file_size_list is None:
+            file_size_list = [-1] * len(file_path_list)
+
+        file_item_list = sorted(zip((os.path.basename(file_path) for file_path in file_path_list), file_size_list))
+        file_name_list = [file_name for file_name, file_size in file_item_list]
+        child_id_list = [self._add_node(file_name, False) for file_name in file_name_list]
+        for child_id, (file_name, file_size) in zip(child_id_list, file_item_list):
+            self.size_array[child_id] = file_size
+
+        for sub_dir_path in dir_path_list:
+            sub_dir_id = self._dir_id_dict.get(sub_dir_path)
+            if sub_dir_id is not None:
+                # Only roots are named with their full path
+                self.name_list[sub_dir_id] = sys.intern(os.path.basename(sub_dir_path))
+                child_id_list.append(sub_dir_id)
+
+        for child_id in child_id_list:
+            self.parent_array[child_id] = dir_id
+
+        self.child_offset_array[dir_id] = len(self.child_array)
+        self.child_count_array[dir_id] = len(child_id_list)
+        self.file_count_array[dir_id] = len(file_name_list)
+        self.child_array.extend(child_id_list)
+
+        child_size_list = [self.size_array[child_id] for child_id in child_id_list]
+        if all(child_size >= 0 for child_size in child_size_list):
+            self.size_array[dir_id] = sum(child_size_list)
+
+        return dir_id
+
+    def merge(self, other):
+        """Add the content of the TreeIndex other to this index."""
+
+        id_offset = len(self.name_list)
+        child_offset = len(self.child_array)
+
+        self.name_list.extend(other.name_list)
+        self.parent_array.extend(parent_id + id_offset if parent_id >= 0 else -1 for parent_id in other.parent_array)
+        self.is_dir_array.extend(other.is_dir_array)
+        self.size_array.extend(other.size_array)
+        self.child_offset_array.extend(offset + child_offset for offset in other.child_offset_array)
+        self.child_count_array.extend(other.child_count_array)
+        self.file_count_array.extend(other.file_count_array)
+        self.child_array.extend(child_id + id_offset for child_id in other.child_array)
+
+        for dir_path, dir_id in other._dir_id_dict.items():
+            self._dir_id_dict[dir_path] = dir_id + id_offset
+
+    def node_id(self, path):
+        """Return the ID of the file or directory path.
+
+        Raise a KeyError if path is not in the index."""
+
+        dir_id = self._dir_id_dict.get(path)
+        if dir_id is not None:
+            return dir_id
+
+        # Files IDs follow the ID of their parent directory, sorted by name
+        parent_id = self._dir_id_dict[os.path.dirname(path)]
+        file_name = os.path.basename(path)
+
+        low = parent_id + 1
+        high = low + self.file_count_array[parent_id]
+        while low < high:
+            middle = (low + high) // 2
+            if self.name_list[middle] < file_name:
+                low = middle + 1
+            else:
+                high = middle
+        if low < parent_id + 1 + self.file_count_array[parent_id] and self.name_list[low] == file_name:
+            return low
+
+        raise KeyError(path)
+
+    def path(self, node_id):
+        """Return the full path of the node node_id."""
+
+        name_list = []
+        while node_id >= 0:
+            name_list.append(self.name_list[node_id])
+            node_id = self.parent_array[node_id]
+
+        return os.path.join(*reversed(name_list))
+
+    def is_dir(self, node_id):
+        """Return True if the node node_id is a directory."""
+
+        return bool(self.is_dir_array[node_id])
+
+    def size(self, node_id):
+        """Return the size (in bytes) of the node node_id (the total size of
+        their files for directories) or None if it is unknown."""
+
+        size = self.size_array[node_id]
+        return None if size < 0 else size
+
+    def child_ids(self, node_id):
+        """Return the IDs of the children of the node node_id."""
+
+        offset = self.child_offset_array[node_id]
+        return self.child_array[offset:offset + self.child_count_array[node_id]]
+
+    def children(self, dir_path):
+        """Return the paths of the files and directories contained in
+        dir_path."""
+
+        return [os.path.join(dir_path, self.name_list[child_id]) for child_id in self.child_ids(self._dir_id_dict[dir_path])]
+
+
+class ScanResult(TreeIndex):
+    """A compact representation of the result of a scan.
+
+    In addition to the TreeIndex arrays, the binary digest of each file and
+    directory is stored in a single contiguous buffer (digest_size bytes per
+    node). This takes a small fraction of the memory used by {path: md5}
+    dictionaries of full paths and hexadecimal strings.
+
+    file_view() and dir_view() give read-only dict-like views
+    ({path: hexdigest, ...}) so that the functions of pydfm.core working on
+    file_dict and dir_dict can be used unchanged.
+    """
+
+    def __init__(self, digest_size=DEFAULT_DIGEST_SIZE):
+        super().__init__()
+        self.digest_size = digest_size
+        self.digest_buffer = bytearray()
+        self.num_file_nodes = 0
+        self.num_dir_nodes = 0
+
+    def _add_node(self, name, is_dir):
+        self.digest_buffer.extend(bytes(self.digest_size))
+        if is_dir:
+            self.num_dir_nodes += 1
+        else:
+            self.num_file_nodes += 1
+        return super()._add_node(name, is_dir)
+
+    def add_directory(self, dir_path, file_path_list, dir_path_list, file_digest_list=None, dir_digest=None, file_size_list=None):
+        """Add the directory dir_path, its files and their (hexadecimal)
+        digests (see TreeIndex.add_directory())."""
+
+        dir_id = super().add_directory(dir_path, file_path_list, dir_path_list, file_size_list=file_size_list)
+
+        if dir_digest is not None:
+            self.set_digest(dir_id, dir_digest)
+
+        if file_digest_list is not None:
+            # Files are added in the order of their names
+            file_name_list = [os.path.basename(file_path) for file_path in file_path_list]
+            for file_index, (file_name, file_digest) in enumerate(sorted(zip(file_name_list, file_digest_list))):
+                self.set_digest(dir_id + 1 + file_index, file_digest)
+
+        return dir_id
+
+    def merge(self, other):
+        """Add the content of the ScanResult other to this one."""
+
+        super().merge(other)
+        self.digest_buffer.extend(other.digest_buffer)
+        self.num_file_nodes += other.num_file_nodes
+        self.num_dir_nodes += other.num_dir_nodes
+
+    def set_digest(self, node_id, hex_digest):
+        """Set the (hexadecimal) digest of the node node_id."""
+
+        offset = node_id * self.digest_size
+        self.digest_buffer[offset:offset + self.digest_size] = bytes.fromhex(hex_digest)
+
+    def digest(self, node_id):
+        """Return the (hexadecimal) digest of the node node_id."""
+
+        offset = node_id * self.digest_size
+        return self.digest_buffer[offset:offset + self.digest_size].hex()
+
+    def file_view(self):
+        """Return a read-only {file_path: hexdigest, ...} view."""
+
+        return DigestView(self, False)
+
+    def dir_view(self):
+        """Return a read-only {dir_path: hexdigest, ...} view."""
+
+        return DigestView(self, True)
+
+
+class DigestView(collections.abc.Mapping):
+    """A read-only {path: hexdigest, ...} view of the files (or of the
+    directories if is_dir is True) of a ScanResult."""
+
+    def __init__(self, scan_result, is_dir):
+        self.scan_result = scan_result
+        self.is_dir = is_dir
+
+    def __getitem__(self, path):
+        node_id = self.scan_result.node_id(path)
+        if self.scan_result.is_dir(node_id) != self.is_dir:
+            raise KeyError(path)
+        return self.scan_result.digest(node_id)
+
+    def __iter__(self):
+        for path, digest in self.items():
+            yield path
+
+    def __len__(self):
+        if self.is_dir:
+            return self.scan_result.num_dir_nodes
+        return self.scan_result.num_file_nodes
+
+    def items(self):
+        return _DigestItemsView(self)
+
+    def _iter_items(self):
+        """Yield (path, hexdigest) tuples without looking up each path."""
+
+        scan_result = self.scan_result
+        for dir_path, dir_id in scan_result._dir_id_dict.items():
+            if self.is_dir:
+                yield dir_path, scan_result.digest(dir_id)
+            else:
+                for file_id in range(dir_id + 1, dir_id + 1 + scan_result.file_count_array[dir_id]):
+                    yield os.path.join(dir_path, scan_result.name_list[file_id]), scan_result.digest(file_id)
+
+
+class _DigestItemsView(collections.abc.ItemsView):
+    """The items view of a DigestView."""
+
+    def __iter__(self):
+        return self._mapping._iter_items()
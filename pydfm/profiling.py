@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains a profiling hook for the pydfm pipeline, based on
+cProfile.
+
+Here is an example of usage in library code:
+
+    with Profiler("scan.prof"):
+        file_dict, dir_dict = build_path_dictionary(root_paths)
+
+The profile can then be loaded with pstats:
+
+    python3 -m pstats scan.prof
+"""
+
+__all__ = ['Profiler']
+
+import cProfile
+import contextlib
+import pstats
+
+
+class Profiler:
+    """A context manager running its block under cProfile and dumping the
+    profile to file_path (if not None) on exit.
+
+    If stage is not None, only the blocks wrapped in stage(stage) are
+    profiled (e.g. 'walk' or 'likeness'); the block of the Profiler itself
+    is not. If enabled is False, nothing is profiled.
+
+    The profiler can be entered several times: the profile accumulates
+    across all the runs and is dumped after each one.
+
+    Note that cProfile only profiles the current thread: the time spent by
+    the hashing threads and processes of build_path_dictionary() is seen as
+    waiting time."""
+
+    def __init__(self, file_path=None, stage=None, enabled=True):
+        self.file_path = file_path
+        self.stage_name = stage
+        self.enabled = enabled
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        if self.enabled and self.stage_name is None:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.enabled and self.stage_name is None:
+            self.profile.disable()
+        self.dump()
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        """Context manager profiling its block if stage is the stage to
+        profile."""
+
+        is_profiled = self.enabled and stage == self.stage_name
+        if is_profiled:
+            self.profile.enable()
+        try:
+            yield self
+        finally:
+            if is_profiled:
+                self.profile.disable()
+
+    def dump(self):
+        """Write the profile to file_path (if not None) in the pstats
+        format."""
+
+        if self.enabled and self.file_path is not None:
+            self.profile.dump_stats(self.file_path)
+
+    def stats(self):
+        """Return a pstats.Stats object of the profile."""
+
+        return pstats.Stats(self.profile)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Answer duplicate queries on a Unix socket from an index kept in memory.
+
+The protocol is line based: each request is a JSON query object (or a JSON
+array of query objects for a batch) on a single line and each answer is a
+JSON object (or array) on a single line. Queries are:
+
+    {"op": "digest", "digest": DIGEST}   paths of the files whose digest is
+                                         DIGEST (or of the directories with
+                                         "type": "dir")
+    {"op": "path", "path": PATH}         digest of the file (or directory)
+                                         PATH and paths of its duplicates
+    {"op": "info"}                       hash algorithm and number of
+                                         indexed files and directories
+
+Here is an example of pydfm.server usage:
+
+    # Server
+    server = QueryServer(socket_path, live_index)
+    server.serve_forever()
+
+    # Client
+    with QueryClient(socket_path) as client:
+        paths = client.lookup_file(file_path)
+"""
+
+__all__ = ['QueryServer',
+           'QueryClient']
+
+import json
+import os
+import socket
+import socketserver
+import threading
+
+from pydfm.file_hash import hashsum
+
+# QUERY SERVER ################################################################
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A server answering queries on live_index (a pydfm.watch.LiveIndex)
+    through the Unix socket socket_path.
+
+    Each connection is handled by its own thread; queries hold lock (a
+    threading.Lock, to share with the code updating live_index).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, live_index, lock=None):
+        self.live_index = live_index
+        self.lock = threading.Lock() if lock is None else lock
+        super().__init__(socket_path, QueryHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+    def answer(self, query):
+        """Return the answer (a dictionary) to query (see the module
+        documentation)."""
+
+        if not isinstance(query, dict):
+            return {"error": "a query must be a JSON object"}
+
+        op = query.get("op")
+        with self.lock:
+            if op == "digest":
+                if query.get("type", "file") == "dir":
+                    reversed_dict = self.live_index.reversed_dir_dict
+                else:
+                    reversed_dict = self.live_index.reversed_file_dict
+                digest = str(query.get("digest", "")).lower()
+                return {"digest": digest, "paths": sorted(reversed_dict.get(digest, ()))}
+            elif op == "path":
+                path = os.path.abspath(str(query.get("path", "")))
+                if path in self.live_index.file_dict:
+                    digest = self.live_index.file_dict[path]
+                    return {"path": path, "type": "file", "digest": digest, "paths": sorted(self.live_index.reversed_file_dict[digest])}
+                elif path in self.live_index.dir_dict:
+                    digest = self.live_index.dir_dict[path]
+                    return {"path": path, "type": "dir", "digest": digest, "paths": sorted(self.live_index.reversed_dir_dict[digest])}
+                else:
+                    return {"path": path, "type": None, "digest": None, "paths": []}
+            elif op == "info":
+                return {"hash_algorithm": self.live_index.hash_algorithm,
+                        "files": len(self.live_index.file_dict),
+                        "dirs": len(self.live_index.dir_dict)}
+            else:
+                return {"error": "unknown query: {0}".format(op)}
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    """Answer the queries of a connection to a QueryServer."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                answer = {"error": "invalid JSON"}
+            else:
+                if isinstance(request, list):
+                    answer = [self.server.answer(query) for query in request]
+                else:
+                    answer = self.server.answer(request)
+
+            self.wfile.write(json.dumps(answer).encode("ascii") + b"\n")
+            self.wfile.flush()
+
+# QUERY CLIENT ################################################################
+
+class QueryClient:
+    """A client of a QueryServer listening on socket_path.
+
+    The connection is kept open until close() is called so that many
+    queries can be sent cheaply; query() sends a whole batch at once."""
+
+    def __init__(self, socket_path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+        self.file = self.socket.makefile("rwb")
+        self._hash_algorithm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def query(self, request):
+        """Send request (a query dictionary or a list of query dictionaries,
+        see the module documentation) and return the answer."""
+
+        self.file.write(json.dumps(request).encode("ascii") + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if len(line) == 0:
+            raise ConnectionError("the server closed the connection")
+
+        answer = json.loads(line)
+        for item in (answer if isinstance(answer, list) else [answer]):
+            if "error" in item:
+                raise ValueError(item["error"])
+        return answer
+
+    @property
+    def hash_algorithm(self):
+        """The hash algorithm of the server."""
+
+        if self._hash_algorithm is None:
+            self._hash_algorithm = self.query({"op": "info"})["hash_algorithm"]
+        return self._hash_algorithm
+
+    def lookup_digest(self, digest):
+        """Return the paths of the files whose digest is digest."""
+
+        return self.query({"op": "digest", "digest": digest})["paths"]
+
+    def lookup_digests(self, digest_list):
+        """Return the list of the paths of the files of each digest of
+        digest_list (in a single batch)."""
+
+        return [answer["paths"] for answer in self.query([{"op": "digest", "digest": digest} for digest in digest_list])]
+
+    def lookup_path(self, path):
+        """Return the paths of the duplicates of path (including path), or an
+        empty list if path isn't indexed."""
+
+        return self.query({"op": "path", "path": os.path.abspath(path)})["paths"]
+
+    def lookup_file(self, file_path):
+        """Hash the local file file_path and return the paths of the indexed
+        files with the same content."""
+
+        return self.lookup_digest(hashsum(file_path, self.hash_algorithm))
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+Keep the duplicate index of some trees up to date with inotify (Linux only).
+
+Here is an example of pydfm.watch usage:
+
+    with Watcher(root_paths, db_path) as watcher:
+        while True:
+            watcher.wait()
+            watcher.live_index.write_report(sys.stdout)
+
+The trees are scanned once (see Watcher.scan()) then the changes reported by
+inotify (created, modified, moved or deleted files and directories) are
+applied to a LiveIndex: only the changed files are hashed and only the
+digests of their ancestor directories are computed again.
+"""
+
+__all__ = ['Inotify',
+           'LiveIndex',
+           'Watcher']
+
+import ctypes
+import ctypes.util
+import errno
+import heapq
+import os
+import select
+import stat
+import struct
+import sys
+
+from pydfm import core
+from pydfm.database import HashDatabase
+from pydfm.file_hash import hashsum, DEFAULT_HASH_ALGORITHM
+
+# inotify flags and events (see <sys/inotify.h>)
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+
+# Events watched in each directory
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+# struct inotify_event {int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[];}
+EVENT_STRUCT = struct.Struct("iIII")
+
+# Size of the buffer used to read events
+EVENT_BUFFER_SIZE = 2**16
+
+# INOTIFY #####################################################################
+
+class Inotify:
+    """A minimal (ctypes) binding of the Linux inotify API.
+
+    Inotify objects can be given to select.select() (see fileno())."""
+
+    def __init__(self):
+        library_path = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or library_path is None:
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+
+        self._libc = ctypes.CDLL(library_path, use_errno=True)
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = self._check(self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _check(self, result, path=None):
+        if result < 0:
+            error_number = ctypes.get_errno()
+            raise OSError(error_number, os.strerror(error_number), path)
+        return result
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        """Watch the path directory and return the watch descriptor."""
+
+        return self._check(self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask), path)
+
+    def rm_watch(self, wd):
+        """Stop watching the watch descriptor wd (the IN_IGNORED event is
+        then generated)."""
+
+        self._check(self._libc.inotify_rm_watch(self.fd, wd))
+
+    def read_events(self):
+        """Return the list of pending (wd, mask, cookie, name) events (without
+        blocking)."""
+
+        event_list = []
+
+        while True:
+            try:
+                data = os.read(self.fd, EVENT_BUFFER_SIZE)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, name_length = EVENT_STRUCT.unpack_from(data, offset)
+                offset += EVENT_STRUCT.size
+                name = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+                offset += name_length
+                event_list.append((wd, mask, cookie, name))
+
+        return event_list
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+# LIVE INDEX ##################################################################
+
+class LiveIndex:
+    """The digests of the files and directories of some trees and their
+    duplicated groups, which can be updated incrementally.
+
+    file_dict and dir_dict are {path: digest} dictionaries (as returned by
+    pydfm.core.build_path_dictionary()) and reversed_file_dict and
+    reversed_dir_dict are {digest: set(paths)} dictionaries.
+
+    Changed directories are marked as dirty; their digest (and the one of
+    their ancestors, as long as it changes) is computed again by
+    update_directories().
+    """
+
+    def __init__(self, hash_algorithm=DEFAULT_HASH_ALGORITHM):
+        self.hash_algorithm = hash_algorithm
+
+        self.file_dict = {}            # {path: digest}
+        self.dir_dict = {}             # {path: digest}
+        self.reversed_file_dict = {}   # {digest: set(paths)}
+        self.reversed_dir_dict = {}    # {digest: set(paths)}
+
+        self._child_dict = {}          # {dir_path: set(child paths)}
+        self._dirty_dir_set = set()
+
+    def __contains__(self, path):
+        return path in self.file_dict or path in self.dir_dict
+
+    @staticmethod
+    def _set_digest(path_dict, reversed_dict, path, digest):
+        old_digest = path_dict.get(path)
+        if old_digest == digest:
+            return False
+
+        if old_digest is not None:
+            _discard(reversed_dict, old_digest, path)
+        if digest is None:
+            del path_dict[path]
+        else:
+            path_dict[path] = digest
+            reversed_dict.setdefault(digest, set()).add(path)
+        return True
+
+    def _attach(self, path):
+        """Add path to the children of its parent directory (if indexed) and
+        mark the parent as dirty."""
+
+        parent_path = os.path.dirname(path)
+        if parent_path in self._child_dict:
+            self._child_dict[parent_path].add(path)
+            self._dirty_dir_set.add(parent_path)
+
+    def add_tree(self, root_path, file_dict, dir_dict):
+        """Add (or replace) the tree root_path whose files and directories
+        digests are given in file_dict and dir_dict (see
+        pydfm.core.walk())."""
+
+        self.remove(root_path)
+
+        for dir_path in dir_dict:
+            self._child_dict[dir_path] = set()
+
+        for file_path, digest in file_dict.items():
+            self._set_digest(self.file_dict, self.reversed_file_dict, file_path, digest)
+            self._child_dict[os.path.dirname(file_path)].add(file_path)
+
+        for dir_path, digest in dir_dict.items():
+            self._set_digest(self.dir_dict, self.reversed_dir_dict, dir_path, digest)
+            if dir_path != root_path:
+                self._child_dict[os.path.dirname(dir_path)].add(dir_path)
+
+        if root_path in self.dir_dict:
+            self._attach(root_path)
+
+    def add_scan(self, root_paths, file_dict, dir_dict):
+        """Add the trees root_paths whose files and directories digests are
+        given in file_dict and dir_dict (see
+        pydfm.core.build_path_dictionary())."""
+
+        for root_path in root_paths:
+            root_path = os.path.abspath(root_path)
+            root_prefix = os.path.join(root_path, "")
+            self.add_tree(root_path,
+                          {path: digest for path, digest in file_dict.items() if path.startswith(root_prefix)},
+                          {path: digest for path, digest in dir_dict.items() if path == root_path or path.startswith(root_prefix)})
+        self.update_directories()
+
+    def set_file(self, file_path, digest):
+        """Add (or update) the file file_path."""
+
+        if self._set_digest(self.file_dict, self.reversed_file_dict, file_path, digest):
+            self._attach(file_path)
+
+    def remove(self, path):
+        """Remove the file or the tree path and return the list of the removed
+        directories."""
+
+        removed_dir_list = []
+
+        if path in self.file_dict:
+            self._set_digest(self.file_dict, self.reversed_file_dict, path, None)
+        elif path in self._child_dict:
+            stack = [path]
+            while len(stack) > 0:
+                dir_path = stack.pop()
+                for child_path in self._child_dict.pop(dir_path):
+                    if child_path in self._child_dict:
+                        stack.append(child_path)
+                    else:
+                        self._set_digest(self.file_dict, self.reversed_file_dict, child_path, None)
+                self._set_digest(self.dir_dict, self.reversed_dir_dict, dir_path, None)
+                self._dirty_dir_set.discard(dir_path)
+                removed_dir_list.append(dir_path)
+        else:
+            return removed_dir_list
+
+        parent_path = os.path.dirname(path)
+        if parent_path in self._child_dict:
+            self._child_dict[parent_path].discard(path)
+            self._dirty_dir_set.add(parent_path)
+
+        return removed_dir_list
+
+    def update_directories(self):
+        """Compute again the digest of dirty directories and of their
+        ancestors (deepest directories first, each one once) and return the
+        number of updated directories."""
+
+        # Heap of (-depth, dir_path)
+        dir_heap = [(-dir_path.count(os.sep), dir_path) for dir_path in self._dirty_dir_set]
+        heapq.heapify(dir_heap)
+        self._dirty_dir_set = set()
+        queued_dir_set = {dir_path for depth, dir_path in dir_heap}
+        num_updated_dirs = 0
+
+        while len(dir_heap) > 0:
+            depth, dir_path = heapq.heappop(dir_heap)
+            child_set = self._child_dict.get(dir_path)
+            if child_set is None:
+                continue
+
+            digest_list = []
+            for child_path in child_set:
+                digest = self.file_dict.get(child_path)
+                if digest is None:
+                    digest = self.dir_dict[child_path]
+                digest_list.append(digest)
+
+            digest = core.directory_digest(digest_list, self.hash_algorithm)
+            if self._set_digest(self.dir_dict, self.reversed_dir_dict, dir_path, digest):
+                num_updated_dirs += 1
+                parent_path = os.path.dirname(dir_path)
+                if parent_path in self._child_dict and parent_path not in queued_dir_set:
+                    queued_dir_set.add(parent_path)
+                    heapq.heappush(dir_heap, (-parent_path.count(os.sep), parent_path))
+
+        return num_updated_dirs
+
+    def duplicates(self, threshold=core.LIKENESS_THRESHOLD):
+        """Return the (reversed_file_dict, reversed_dir_dict,
+        directory_likeness_dict) tuple of the current duplicated items, as
+        expected by pydfm.core.write_report()."""
+
+        reversed_file_dict = {digest: sorted(paths) for digest, paths in self.reversed_file_dict.items() if len(paths) > 1}
+        reversed_dir_dict = {digest: sorted(paths) for digest, paths in self.reversed_dir_dict.items() if len(paths) > 1}
+
+        core.remove_redundant_entries(reversed_file_dict, self.dir_dict)
+        core.remove_redundant_entries(reversed_dir_dict, self.dir_dict)
+
+        directory_likeness_dict = core.compute_directory_likeness(reversed_file_dict,
+                                                                  self.file_dict,
+                                                                  self.dir_dict,
+                                                                  threshold)
+
+        return reversed_file_dict, reversed_dir_dict, directory_likeness_dict
+
+    def write_report(self, file, threshold=core.LIKENESS_THRESHOLD):
+        """Write the report of the current duplicated items to file."""
+
+        core.write_report(file, *self.duplicates(threshold))
+
+def _discard(reversed_dict, digest, path):
+    path_set = reversed_dict[digest]
+    path_set.discard(path)
+    if len(path_set) == 0:
+        del reversed_dict[digest]
+
+# WATCHER #####################################################################
+
+class Watcher:
+    """Watch root_paths with inotify and keep a LiveIndex of them up to date.
+
+    db_path is an optional hash database (see pydfm.database.HashDatabase):
+    files moved within the watched trees are then not hashed again. workers
+    is the number of threads used by the initial scan (see
+    pydfm.core.build_path_dictionary()).
+
+    Events are applied by batches (see wait() and process_events()): created
+    or modified files are hashed once per batch, after the whole batch has
+    been read. If the inotify queue overflows, the trees are scanned again.
+    """
+
+    def __init__(self, root_paths, db_path=None, hash_algorithm=DEFAULT_HASH_ALGORITHM, workers=None):
+        self.root_paths = [os.path.abspath(path) for path in root_paths]
+        self.db_path = db_path
+        self.hash_algorithm = hash_algorithm
+        self.workers = workers
+
+        self.live_index = LiveIndex(hash_algorithm)
+        self.inotify = Inotify()
+        self.db = None if db_path is None else HashDatabase(db_path, hash_algorithm=hash_algorithm)
+
+        self._wd_dict = {}         # {wd: dir_path}
+        self._path_wd_dict = {}    # {dir_path: wd}
+
+        self.scan()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def fileno(self):
+        return self.inotify.fileno()
+
+    def close(self):
+        self.inotify.close()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def scan(self):
+        """Scan again all the root paths."""
+
+        if self.db is not None:
+            self.db.commit()
+
+        for root_path in self.root_paths:
+            # Directories are watched before being walked so that no change is
+            # lost (changes made during the walk are applied twice)
+            self._watch_tree(root_path)
+        file_dict, dir_dict = core.build_path_dictionary(self.root_paths,
+                                                         self.db_path,
+                                                         workers=self.workers,
+                                                         hash_algorithm=self.hash_algorithm)
+        self.live_index.add_scan(self.root_paths, file_dict, dir_dict)
+
+    def _watch_tree(self, root_path):
+        for dir_path, dir_path_list, file_list in core.scan_tree(root_path):
+            try:
+                wd = self.inotify.add_watch(dir_path)
+            except OSError:
+                continue
+            self._wd_dict[wd] = dir_path
+            self._path_wd_dict[dir_path] = wd
+
+    def _unwatch(self, dir_path):
+        wd = self._path_wd_dict.pop(dir_path, None)
+        if wd is not None and self._wd_dict.get(wd) == dir_path:
+            del self._wd_dict[wd]
+            try:
+                self.inotify.rm_watch(wd)
+            except OSError:
+                # The directory has already been deleted
+                pass
+
+    def _add_tree(self, dir_path):
+        self._watch_tree(dir_path)
+        file_dict, dir_dict = core.walk(dir_path, self.db, hash_algorithm=self.hash_algorithm)
+        self.live_index.add_tree(dir_path, file_dict, dir_dict)
+
+    def _remove(self, path):
+        for dir_path in self.live_index.remove(path):
+            self._unwatch(dir_path)
+
+    def _update_file(self, file_path):
+        try:
+            file_stat = os.lstat(file_path)
+        except OSError:
+            self._remove(file_path)
+            return
+
+        if not stat.S_ISREG(file_stat.st_mode):
+            if file_path in self.live_index.file_dict:
+                self._remove(file_path)
+            return
+
+        digest = None
+        if self.db is not None:
+            digest = self.db.get(file_path, file_stat)
+        if digest is None:
+            try:
+                digest = hashsum(file_path, self.hash_algorithm)
+            except OSError:
+                self._remove(file_path)
+                return
+            if self.db is not None:
+                self.db.put(file_path, file_stat, digest)
+
+        self.live_index.set_file(file_path, digest)
+
+    def process_events(self, event_list):
+        """Apply the (wd, mask, cookie, name) inotify events of event_list
+        (see Inotify.read_events()) and return the number of updated
+        directories."""
+
+        pending_file_set = set()   # Created or modified files
+
+        for wd, mask, cookie, name in event_list:
+            if mask & IN_Q_OVERFLOW:
+                self.scan()
+                return len(self.live_index.dir_dict)
+
+            dir_path = self._wd_dict.get(wd)
+            if dir_path is None:
+                # Event of a directory which is not watched anymore
+                continue
+
+            if mask & IN_IGNORED:
+                del self._wd_dict[wd]
+                if self._path_wd_dict.get(dir_path) == wd:
+                    del self._path_wd_dict[dir_path]
+                continue
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # Other directories are removed by the events of their parent
+                if dir_path in self.root_paths:
+                    self._remove(dir_path)
+                continue
+
+            path = os.path.join(dir_path, name)
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                pending_file_set.discard(path)
+                self._remove(path)
+            elif mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+            elif mask & (IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO):
+                pending_file_set.add(path)
+
+        for file_path in pending_file_set:
+            self._update_file(file_path)
+
+        if self.db is not None:
+            self.db.commit()
+
+        return self.live_index.update_directories()
+
+    def wait(self, timeout=None):
+        """Wait at most timeout seconds (forever if None) for inotify events,
+        apply them and return the number of updated directories."""
+
+        readable_list, writable_list, exceptional_list = select.select([self.inotify], [], [], timeout)
+        if len(readable_list) == 0:
+            return 0
+        return self.process_events(self.inotify.read_events())
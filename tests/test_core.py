@@ -0,0 +1,765 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains some unit tests for the "core" module.
+"""
+
+from pydfm import core
+from pydfm import database
+
+import asyncio
+import concurrent.futures
+import contextlib
+import csv
+import io
+import json
+import os.path
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+TESTS_DIRNAME = os.path.dirname(__file__)
+DATA_DIRNAME = os.path.join(TESTS_DIRNAME, "data")
+
+ROOT_PATHS = [os.path.join(DATA_DIRNAME, "test{0}".format(index)) for index in range(1, 7)]
+
+
+def duplicate_groups(path_dict):
+    """Return the set of duplicated paths groups found in path_dict."""
+
+    reversed_dict = core.remove_unique_items(core.reverse_dictionary(path_dict))
+    return {frozenset(paths) for paths in reversed_dict.values()}
+
+
+class BoundCheckingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """A thread pool which records the maximum number of submitted and not
+    finished calls."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_submitted = 0
+        self.num_pending = 0
+        self.max_num_pending = 0
+        self._counter_lock = threading.Lock()
+
+    def submit(self, *args, **kwargs):
+        with self._counter_lock:
+            self.num_submitted += 1
+            self.num_pending += 1
+            self.max_num_pending = max(self.max_num_pending, self.num_pending)
+        future = super().submit(*args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._counter_lock:
+            self.num_pending -= 1
+
+
+class TestCore(unittest.TestCase):
+    """
+    Contains some unit tests for the "core" module.
+    """
+
+    # Check prefilter_files() #################################################
+
+    def test_prefilter_files(self):
+        """Check that only files with a unique size get a placeholder."""
+
+        size_dict = {"a": 1, "b": 2, "c": 2, "d": 3}
+        placeholder_dict = core.prefilter_files(size_dict, ["size"])
+
+        self.assertEqual(set(placeholder_dict), {"a", "d"})
+        self.assertNotEqual(placeholder_dict["a"], placeholder_dict["d"])
+        self.assertEqual(placeholder_dict["a"], core.placeholder_digest(1))
+
+        with self.assertRaises(ValueError):
+            core.prefilter_files(size_dict, ["foo"])
+
+    def test_prefilter_files_cached_paths(self):
+        """Check that candidates which can't be told apart from cached files
+        without reading them are left to the full hashing."""
+
+        size_dict = {"a": 1, "b": 2, "c": 2, "d": 3, "e": 3}
+        counters = {}
+        placeholder_dict = core.prefilter_files(size_dict,
+                                                ["size", "partial"],
+                                                counters,
+                                                partial_block_size=0,
+                                                cached_paths={"a", "b", "d", "e"})
+
+        self.assertEqual(set(placeholder_dict), {"a"})
+        self.assertEqual(counters, {"size": 1, "partial": 0, "full": 4})
+
+    def test_prefilter_files_unreadable(self):
+        """Check that files whose partial hash can't be computed are left to
+        the full hashing."""
+
+        file_path = os.path.join(DATA_DIRNAME, "test1", "a", "1")
+        missing_path = os.path.join(DATA_DIRNAME, "missing_file")
+        size_dict = {file_path: 10, missing_path: 10}
+        counters = {}
+        placeholder_dict = core.prefilter_files(size_dict, ["size", "partial"], counters, partial_block_size=1)
+
+        self.assertEqual(set(placeholder_dict), {file_path})
+        self.assertEqual(counters, {"size": 0, "partial": 1, "full": 1})
+
+    # Check build_path_dictionary() ###########################################
+
+    def test_build_path_dictionary_prefilter(self):
+        """Check that the size prefilter finds the same duplicated files and
+        directories than a full scan."""
+
+        file_dict, dir_dict = core.build_path_dictionary(ROOT_PATHS)
+        prefiltered_file_dict, prefiltered_dir_dict = core.build_path_dictionary(ROOT_PATHS,
+                                                                                 prefilter=["size"])
+
+        self.assertEqual(set(file_dict), set(prefiltered_file_dict))
+        self.assertEqual(set(dir_dict), set(prefiltered_dir_dict))
+        self.assertEqual(duplicate_groups(file_dict), duplicate_groups(prefiltered_file_dict))
+        self.assertEqual(duplicate_groups(dir_dict), duplicate_groups(prefiltered_dir_dict))
+
+        prefiltered_file_dict, prefiltered_dir_dict = core.build_path_dictionary(ROOT_PATHS,
+                                                                                 prefilter=["size"],
+                                                                                 processes=2)
+
+        self.assertEqual(duplicate_groups(file_dict), duplicate_groups(prefiltered_file_dict))
+        self.assertEqual(duplicate_groups(dir_dict), duplicate_groups(prefiltered_dir_dict))
+
+    def test_split_subtrees(self):
+        """Check that each subtree only gets the entries it contains."""
+
+        path_dict = {os.path.join("root", "a"): 1,
+                     os.path.join("root", "a", "x"): 2,
+                     os.path.join("root", "ab", "y"): 3,
+                     os.path.join("root", "z"): 4}
+        subtree_path_list = [os.path.join("root", "a"), os.path.join("root", "ab")]
+
+        self.assertEqual(core._split_subtrees(path_dict, subtree_path_list),
+                         [{os.path.join("root", "a"): 1, os.path.join("root", "a", "x"): 2},
+                          {os.path.join("root", "ab", "y"): 3}])
+        self.assertEqual(core._split_subtrees(None, subtree_path_list), [None, None])
+
+    def test_build_path_dictionary_partial_prefilter(self):
+        """Check that the size and partial prefilters find the same duplicated
+        files and directories than a full scan."""
+
+        file_dict, dir_dict = core.build_path_dictionary(ROOT_PATHS)
+
+        counters = {}
+        prefiltered_file_dict, prefiltered_dir_dict = core.build_path_dictionary(ROOT_PATHS,
+                                                                                 prefilter=["size", "partial"],
+                                                                                 prefilter_counters=counters,
+                                                                                 partial_block_size=1)
+
+        self.assertEqual(duplicate_groups(file_dict), duplicate_groups(prefiltered_file_dict))
+        self.assertEqual(duplicate_groups(dir_dict), duplicate_groups(prefiltered_dir_dict))
+        self.assertEqual(counters["size"] + counters["partial"] + counters["full"], len(file_dict))
+
+    def test_build_path_dictionary_prefilter_listing(self):
+        """Check that the prefilter doesn't list directories a second time
+        and doesn't read the content of files cached in the database."""
+
+        file_dict, dir_dict = core.build_path_dictionary(ROOT_PATHS)
+        num_dirs = len(dir_dict)
+
+        with unittest.mock.patch.object(core, "list_directory", wraps=core.list_directory) as list_directory:
+            core.build_path_dictionary(ROOT_PATHS, prefilter=["size"])
+            self.assertEqual(list_directory.call_count, num_dirs)
+
+        tmp_dirname = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dirname, "db")
+            core.build_path_dictionary(ROOT_PATHS, db_path)
+
+            counters = {}
+            with unittest.mock.patch.object(core, "partial_hashsum", wraps=core.partial_hashsum) as partial_hashsum:
+                with unittest.mock.patch.object(core, "compare_files", wraps=core.compare_files) as compare_files:
+                    prefiltered_file_dict, prefiltered_dir_dict = core.build_path_dictionary(ROOT_PATHS,
+                                                                                             db_path,
+                                                                                             prefilter=core.PREFILTER_STAGES,
+                                                                                             prefilter_counters=counters,
+                                                                                             partial_block_size=1)
+                    self.assertEqual(partial_hashsum.call_count, 0)
+                    self.assertEqual(compare_files.call_count, 0)
+
+            self.assertEqual(duplicate_groups(file_dict), duplicate_groups(prefiltered_file_dict))
+            self.assertEqual(duplicate_groups(dir_dict), duplicate_groups(prefiltered_dir_dict))
+            self.assertEqual(counters["size"] + counters["partial"] + counters["compare"] + counters["full"], len(file_dict))
+        finally:
+            shutil.rmtree(tmp_dirname)
+
+    def test_build_path_dictionary_compare_prefilter(self):
+        """Check that the compare prefilter finds the same duplicated files
+        and directories than a full scan."""
+
+        file_dict, dir_dict = core.build_path_dictionary(ROOT_PATHS)
+
+        # Test files are in large groups of same size files
+        for workers, max_group_size in ((None, core.COMPARE_MAX_GROUP_SIZE), (None, 100), (2, 100)):
+            counters = {}
+            with unittest.mock.patch.object(core, "COMPARE_MAX_GROUP_SIZE", max_group_size):
+                prefiltered_file_dict, prefiltered_dir_dict = core.build_path_dictionary(ROOT_PATHS,
+                                                                                         prefilter=["size", "compare"],
+                                                                                         prefilter_counters=counters,
+                                                                                         workers=workers)
+
+            self.assertEqual(duplicate_groups(file_dict), duplicate_groups(prefiltered_file_dict))
+            self.assertEqual(duplicate_groups(dir_dict), duplicate_groups(prefiltered_dir_dict))
+            self.assertEqual(counters["size"] + counters["compare"] + counters["full"], len(file_dict))
+            if max_group_size > core.COMPARE_MAX_GROUP_SIZE:
+                self.assertEqual(counters["full"], 0)
+
+            # Duplicated items get the digest of their content
+            for paths in core.group_duplicates(prefiltered_file_dict).values():
+                for path in paths:
+                    self.assertEqual(prefiltered_file_dict[path], file_dict[path])
+            for paths in core.group_duplicates(prefiltered_dir_dict).values():
+                for path in paths:
+                    self.assertEqual(prefiltered_dir_dict[path], dir_dict[path])
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "FIFOs are not available")
+    def test_build_path_dictionary_compare_prefilter_fifo(self):
+        """Check that the compare prefilter doesn't block on FIFOs (which
+        are listed as empty files)."""
+
+        tmp_dirname = tempfile.mkdtemp()
+        try:
+            os.mkfifo(os.path.join(tmp_dirname, "fifo"))
+            open(os.path.join(tmp_dirname, "empty"), "w").close()
+
+            result_list = []
+            thread = threading.Thread(target=lambda: result_list.append(core.build_path_dictionary([tmp_dirname],
+                                                                                                   prefilter=["size", "compare"])),
+                                      daemon=True)
+            # The FIFO can't be hashed
+            with self.assertWarns(UserWarning):
+                thread.start()
+                thread.join(10)
+
+            self.assertFalse(thread.is_alive())
+            file_dict = result_list[0][0]
+            self.assertEqual(len(file_dict), 2)
+            self.assertNotEqual(file_dict[os.path.join(tmp_dirname, "fifo")], file_dict[os.path.join(tmp_dirname, "empty")])
+        finally:
+            shutil.rmtree(tmp_dirname)
+
+    def test_build_path_dictionary_unreadable_file(self):
+        """Check that a file which can't be hashed (e.g. removed after being
+        listed) is not a duplicate of empty files and is not recorded in the
+        database."""
+
+        tmp_dirname = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dirname, "db")
+            root_path = os.path.join(tmp_dirname, "root")
+            os.mkdir(root_path)
+            empty_path = os.path.join(root_path, "empty")
+            removed_path = os.path.join(root_path, "removed")
+            open(empty_path, "w").close()
+            open(removed_path, "w").close()
+
+            hashsum = core.hashsum
+
+            def removing_hashsum(file_path, *args):
+                if file_path == removed_path:
+                    os.remove(removed_path)
+                return hashsum(file_path, *args)
+
+            for workers in (None, 2):
+                with unittest.mock.patch.object(core, "hashsum", removing_hashsum):
+                    with self.assertWarns(UserWarning):
+                        file_dict, dir_dict = core.build_path_dictionary([root_path], db_path, workers=workers)
+
+                self.assertNotEqual(file_dict[removed_path], file_dict[empty_path])
+                with database.HashDatabase(db_path) as db:
+                    self.assertEqual([item[0] for item in db.items()], [empty_path])
+
+                open(removed_path, "w").close()
+        finally:
+            shutil.rmtree(tmp_dirname)
+
+    def test_build_path_dictionary_hash_algorithm(self):
+        """Check that the hash algorithm changes the digests but not the
+        duplicates found."""
+
+        file_dict, dir_dict = core.build_path_dictionary(ROOT_PATHS)
+
+        for prefilter in (None, core.PREFILTER_STAGES):
+            scan_result = core.ScanResult(digest_size=8)
+            file_view, dir_view = core.build_path_dictionary(ROOT_PATHS,
+                                                             prefilter=prefilter,
+                                                             index=scan_result,
+                                                             hash_algorithm="blake2b-64")
+
+            self.assertTrue(all(len(digest) == 16 for digest in file_view.values()))
+            self.assertEqual(duplicate_groups(file_view), duplicate_groups(file_dict))
+            self.assertEqual(duplicate_groups(dir_view), duplicate_groups(dir_dict))
+
+        # The digest size of the index must match the algorithm
+        with self.assertRaises(ValueError):
+            core.build_path_dictionary(ROOT_PATHS, index=core.ScanResult(), hash_algorithm="sha256")
+
+    def test_build_path_dictionary_workers(self):
+        """Check that the parallel scan returns the same dictionaries than the
+        serial scan."""
+
+        self.assertEqual(core.build_path_dictionary(ROOT_PATHS),
+                         core.build_path_dictionary(ROOT_PATHS, workers=4))
+
+    def test_build_path_dictionary_processes(self):
+        """Check that the multi-process scan returns the same dictionaries
+        than the serial scan."""
+
+        self.assertEqual(core.build_path_dictionary(ROOT_PATHS),
+                         core.build_path_dictionary(ROOT_PATHS, processes=2))
+
+    def test_build_path_dictionary_db_lifetime(self):
+        """Check that the database of the parent process is not open while
+        worker processes are forked and that it is closed on errors."""
+
+        open_db_list = []
+        event_list = []
+
+        class RecordingHashDatabase(core.HashDatabase):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                open_db_list.append(self)
+
+            def close(self):
+                super().close()
+                open_db_list.remove(self)
+
+        class RecordingProcessPoolExecutor(concurrent.futures.ProcessPoolExecutor):
+            def __init__(self, *args, **kwargs):
+                event_list.append(len(open_db_list))
+                super().__init__(*args, **kwargs)
+
+        tmp_dirname = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dirname, "db")
+            expected_dicts = core.build_path_dictionary(ROOT_PATHS)
+
+            with unittest.mock.patch.object(core, "HashDatabase", RecordingHashDatabase), \
+                 unittest.mock.patch.object(concurrent.futures, "ProcessPoolExecutor", RecordingProcessPoolExecutor):
+                for prefilter in (None, ["size"]):
+                    self.assertEqual(core.build_path_dictionary(ROOT_PATHS, db_path, prefilter=prefilter, processes=2),
+                                     core.build_path_dictionary(ROOT_PATHS, db_path, prefilter=prefilter))
+                    self.assertEqual(open_db_list, [])
+
+                self.assertEqual(event_list, [0, 0])
+
+                with unittest.mock.patch.object(core, "_resolve_directory", side_effect=RuntimeError):
+                    with self.assertRaises(RuntimeError):
+                        core.build_path_dictionary(ROOT_PATHS, db_path, workers=2)
+                self.assertEqual(open_db_list, [])
+
+            self.assertEqual(core.build_path_dictionary(ROOT_PATHS, db_path, processes=2), expected_dicts)
+        finally:
+            shutil.rmtree(tmp_dirname)
+
+    def test_build_path_dictionary_processes_new_db(self):
+        """Check that the database schema exists before worker processes are
+        started on a database which doesn't exist yet."""
+
+        expected_dicts = core.build_path_dictionary(ROOT_PATHS)
+        schema_version_list = []
+
+        class CheckingProcessPoolExecutor(concurrent.futures.ProcessPoolExecutor):
+            def __init__(self, *args, **kwargs):
+                with contextlib.closing(sqlite3.connect(db_path)) as connection:
+                    schema_version_list.append(connection.execute("PRAGMA user_version").fetchone()[0])
+                super().__init__(*args, **kwargs)
+
+        tmp_dirname = tempfile.mkdtemp()
+        try:
+            for index in range(5):
+                db_path = os.path.join(tmp_dirname, "db{0}".format(index))
+                with unittest.mock.patch.object(concurrent.futures, "ProcessPoolExecutor", CheckingProcessPoolExecutor):
+                    self.assertEqual(core.build_path_dictionary(ROOT_PATHS, db_path, processes=2), expected_dicts)
+        finally:
+            shutil.rmtree(tmp_dirname)
+
+        self.assertEqual(schema_version_list, [database.SCHEMA_VERSION] * 5)
+
+    def test_build_path_dictionary_async(self):
+        """Check that the asyncio scan returns the same dictionaries than the
+        serial scan, including when it runs in an existing event loop."""
+
+        expected_dicts = core.build_path_dictionary(ROOT_PATHS)
+
+        tmp_dirname = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dirname, "db")
+
+            async def scan_twice():
+                return await asyncio.gather(core.build_path_dictionary_async(ROOT_PATHS, queue_size=1),
+                                            core.build_path_dictionary_async(ROOT_PATHS, db_path, workers=2))
+
+            self.assertEqual(asyncio.run(scan_twice()), [expected_dicts, expected_dicts])
+
+            stats = core.ScanStats()
+            self.assertEqual(asyncio.run(core.build_path_dictionary_async(ROOT_PATHS, db_path, stats=stats)),
+                             expected_dicts)
+            self.assertEqual(stats.cache_hits, len(expected_dicts[0]))
+        finally:
+            shutil.rmtree(tmp_dirname)
+
+    def test_build_path_dictionary_progress(self):
+        """Check the final state of the progress counters."""
+
+        for processes in (None, 2):
+            progress_list = []
+            file_dict, dir_dict = core.build_path_dictionary(ROOT_PATHS,
+                                                             processes=processes,
+                                                             progress_callback=progress_list.append)
+
+            progress = progress_list[-1]
+            self.assertEqual(progress.files_found, len(file_dict))
+            self.assertEqual(progress.files_hashed, len(file_dict))
+            self.assertEqual(progress.estimated_files, len(file_dict))
+            self.assertEqual(progress.dirs_listed, len(dir_dict))
+
+    def test_progress_printer(self):
+        """Check that ProgressPrinter overwrites its line and prints the final
+        state of the scan."""
+
+        progress_file = io.StringIO()
+        progress_printer = core.ProgressPrinter(progress_file, interval=0)
+        file_dict, dir_dict = core.build_path_dictionary(ROOT_PATHS, progress_callback=progress_printer)
+        progress_printer.close()
+
+        line_list = progress_file.getvalue().split("\r")
+        self.assertEqual(line_list[0], "")
+        self.assertGreater(len(line_list), len(dir_dict))
+        self.assertEqual(line_list[-1], str(progress_printer.progress) + "\n")
+
+    # Check group_duplicates() ################################################
+
+    def test_group_duplicates(self):
+        """Check that group_duplicates() is equivalent to reverse_dictionary()
+        followed by remove_unique_items()."""
+
+        path_dict = {"k1": "v1", "k2": "v1", "k3": "v2", "k4": "v3", "k5": "v1", "k6": "v3"}
+
+        self.assertEqual(core.group_duplicates(path_dict, use_numpy=False),
+                         {"v1": ["k1", "k2", "k5"], "v3": ["k4", "k6"]})
+
+    @unittest.skipIf(core.numpy is None, "NumPy is not installed")
+    def test_group_duplicates_numpy(self):
+        """Check that the NumPy implementation of group_duplicates() gives the
+        same groups (in the same order) than the pure Python one."""
+
+        path_dict = {"k1": "v1", "k2": "v1", "k3": "v2", "k4": "v3", "k5": "v1", "k6": "v3"}
+
+        self.assertEqual(core.group_duplicates(path_dict, use_numpy=True),
+                         {"v1": ["k1", "k2", "k5"], "v3": ["k4", "k6"]})
+        self.assertEqual(core.group_duplicates({}, use_numpy=True), {})
+
+        scan_result = core.ScanResult()
+        file_view, dir_view = core.build_path_dictionary(ROOT_PATHS, index=scan_result)
+
+        for path_dict in (file_view, dir_view, dict(file_view.items())):
+            self.assertEqual(core.group_duplicates(path_dict, use_numpy=True),
+                             core.group_duplicates(path_dict, use_numpy=False))
+
+    def test_group_duplicates_repeated_roots(self):
+        """Check that the default pipeline of pydfm-nox (a ScanResult and
+        group_duplicates()) doesn't report a path as its own duplicate when
+        root paths are repeated or nested."""
+
+        root_path = os.path.join(DATA_DIRNAME, "test6")
+
+        expected_file_groups = core.group_duplicates(core.build_path_dictionary([root_path], index=core.ScanResult())[0])
+        self.assertEqual(len(expected_file_groups), 1)
+
+        for processes in (None, 2):
+            scan_result = core.ScanResult()
+            file_view, dir_view = core.build_path_dictionary([root_path, root_path, os.path.join(root_path, ".")],
+                                                             processes=processes,
+                                                             index=scan_result)
+
+            self.assertEqual(core.group_duplicates(file_view), expected_file_groups)
+            self.assertEqual(core.group_duplicates(dir_view), {})
+            for path_list in core.group_duplicates(file_view).values():
+                self.assertEqual(len(path_list), len(set(path_list)))
+
+    def test_build_path_dictionary_stats(self):
+        """Check the statistics collected by build_path_dictionary()."""
+
+        tmp_dirname = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dirname, "db")
+
+            for processes, num_cache_hits in ((None, 0), (2, None)):
+                stats = core.ScanStats()
+                file_dict, dir_dict = core.build_path_dictionary(ROOT_PATHS,
+                                                                 db_path,
+                                                                 processes=processes,
+                                                                 stats=stats)
+
+                self.assertEqual(stats.files, len(file_dict))
+                self.assertEqual(stats.cache_hits + stats.cache_misses, len(file_dict))
+                if num_cache_hits is not None:
+                    self.assertEqual(stats.cache_hits, num_cache_hits)
+                else:
+                    # Second scan: all files are in the cache
+                    self.assertEqual(stats.cache_hits, len(file_dict))
+                self.assertEqual(list(stats.stage_dict)[0], "walk")
+                self.assertIn("cache", stats.stage_dict)
+
+                stats_dict = json.loads(json.dumps(stats.as_dict()))
+                self.assertEqual(stats_dict["files"], len(file_dict))
+        finally:
+            shutil.rmtree(tmp_dirname)
+
+    def test_build_path_dictionary_snapshot(self):
+        """Check that rescans based on the snapshot give the same dictionaries
+        than full scans and only list changed directories."""
+
+        tmp_dirname = tempfile.mkdtemp()
+        try:
+            db_path = os.path.join(tmp_dirname, "db")
+            root_path = os.path.join(tmp_dirname, "test1")
+            shutil.copytree(os.path.join(DATA_DIRNAME, "test1"), root_path)
+
+            with self.assertRaises(ValueError):
+                core.build_path_dictionary([root_path], snapshot=True)
+            with self.assertRaises(ValueError):
+                core.build_path_dictionary([root_path], db_path, prefilter=["size"], snapshot=True)
+
+            with unittest.mock.patch.object(core, "SNAPSHOT_MIN_AGE", 0):
+                self.assertEqual(core.build_path_dictionary([root_path], db_path, snapshot=True),
+                                 core.build_path_dictionary([root_path]))
+
+                # Nothing has changed: no directory is listed
+                expected_dicts = core.build_path_dictionary([root_path])
+                with unittest.mock.patch.object(core, "list_directory", wraps=core.list_directory) as list_directory:
+                    self.assertEqual(core.build_path_dictionary([root_path], db_path, snapshot=True), expected_dicts)
+                    self.assertEqual(list_directory.call_count, 0)
+
+                # Add a file in a subdirectory (and make sure its mtime changes
+                # whatever the timestamps granularity)
+                dir_path = sorted(core.build_path_dictionary([root_path])[1])[-1]
+                with open(os.path.join(dir_path, "new_file"), "w") as new_file:
+                    new_file.write("new content")
+                dir_stat = os.stat(dir_path)
+                os.utime(dir_path, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns + 10**9))
+
+                expected_dicts = core.build_path_dictionary([root_path])
+                with unittest.mock.patch.object(core, "list_directory", wraps=core.list_directory) as list_directory:
+                    self.assertEqual(core.build_path_dictionary([root_path], db_path, snapshot=True), expected_dicts)
+                    self.assertEqual(list_directory.call_count, 1)
+
+                self.assertEqual(core.build_path_dictionary([root_path], db_path, processes=2, snapshot=True), expected_dicts)
+        finally:
+            shutil.rmtree(tmp_dirname)
+
+    # Check compute_directory_likeness() ######################################
+
+    def test_compute_directory_likeness(self):
+        """Check the likeness of the directories of "data/test3"."""
+
+        root_path = os.path.abspath(os.path.join(DATA_DIRNAME, "test3"))
+        dir_path_a, dir_path_b1, dir_path_b2 = [os.path.join(root_path, name) for name in ("a", "b1", "b2")]
+
+        file_dict, dir_dict = core.build_path_dictionary([root_path])
+        reversed_file_dict = core.remove_unique_items(core.reverse_dictionary(file_dict))
+        core.remove_redundant_entries(reversed_file_dict, dir_dict)
+
+        directory_likeness_dict = core.compute_directory_likeness(reversed_file_dict, file_dict, dir_dict)
+
+        self.assertEqual(set(directory_likeness_dict), {(dir_path_a, dir_path_b1),
+                                                        (dir_path_a, dir_path_b2),
+                                                        (dir_path_b1, dir_path_b2)})
+        self.assertAlmostEqual(directory_likeness_dict[(dir_path_a, dir_path_b1)], 200. / 3.)
+        self.assertAlmostEqual(directory_likeness_dict[(dir_path_b1, dir_path_b2)], 100.)
+
+        # Pairs below the threshold are not returned
+        directory_likeness_dict = core.compute_directory_likeness(reversed_file_dict, file_dict, dir_dict, 70)
+
+        self.assertEqual(set(directory_likeness_dict), {(dir_path_b1, dir_path_b2)})
+
+    # Check write_report() ####################################################
+
+    def test_write_report(self):
+        """Check that write_report() writes the text returned by report()."""
+
+        file_dict, dir_dict = core.build_path_dictionary(ROOT_PATHS)
+        reversed_file_dict = core.group_duplicates(file_dict)
+        reversed_dir_dict = core.group_duplicates(dir_dict)
+        directory_likeness_dict = core.compute_directory_likeness(reversed_file_dict, file_dict, dir_dict)
+
+        report_file = io.StringIO()
+        core.write_report(report_file, reversed_file_dict, reversed_dir_dict, directory_likeness_dict)
+
+        report_str = core.report(reversed_file_dict, reversed_dir_dict, directory_likeness_dict)
+        self.assertEqual(report_file.getvalue(), report_str)
+        self.assertIn(" DUPLICATED FILES ***\n", report_str)
+
+        # Lines are generated one by one
+        line_iterator = core.iter_report({}, {}, {})
+        self.assertEqual(next(line_iterator), "*** NO DUPLICATED DIRECTORY ***\n")
+
+    # Check write_records() ###################################################
+
+    def test_write_records(self):
+        """Check the records written in each machine-readable format."""
+
+        root_path = os.path.abspath(os.path.join(DATA_DIRNAME, "test3"))
+
+        file_dict, dir_dict = core.build_path_dictionary([root_path])
+        reversed_file_dict = core.group_duplicates(file_dict)
+        reversed_dir_dict = core.group_duplicates(dir_dict)
+        core.remove_redundant_entries(reversed_file_dict, dir_dict)
+        directory_likeness_dict = core.compute_directory_likeness(reversed_file_dict, file_dict, dir_dict)
+
+        record_list = list(core.iter_records(reversed_file_dict, reversed_dir_dict, directory_likeness_dict))
+
+        self.assertEqual([record["type"] for record in record_list].count("directory"), len(reversed_dir_dict))
+        for record in record_list:
+            if record["type"] == "file":
+                self.assertEqual(record["size"], os.path.getsize(record["paths"][0]))
+                self.assertEqual(file_dict[record["paths"][0]], record["digest"])
+
+        # Sizes are read from the index filled by the scan
+        for processes in (None, 2):
+            index = core.ScanResult()
+            core.build_path_dictionary([root_path], processes=processes, index=index)
+            with unittest.mock.patch.object(core, "scan_tree") as scan_tree:
+                self.assertEqual(list(core.iter_records(reversed_file_dict, reversed_dir_dict, directory_likeness_dict, index)),
+                                 record_list)
+                self.assertEqual(scan_tree.call_count, 0)
+
+        # JSON Lines
+        jsonl_file = io.StringIO()
+        core.write_records(jsonl_file, record_list, "jsonl")
+        self.assertEqual([json.loads(line) for line in jsonl_file.getvalue().splitlines()], record_list)
+
+        # CSV
+        csv_file = io.StringIO(newline="")
+        core.write_records(csv_file, record_list, "csv")
+        row_list = list(csv.reader(io.StringIO(csv_file.getvalue(), newline="")))
+        self.assertEqual([row[0] for row in row_list], [record["type"] for record in record_list])
+        self.assertEqual([row[4:] for row in row_list], [record["paths"] for record in record_list])
+
+        # NUL-separated fields
+        null_file = io.BytesIO()
+        core.write_records(null_file, record_list, "null")
+        field_list = null_file.getvalue().split(b"\0")
+        self.assertEqual(field_list[-1], b"")
+        null_path_list = []
+        index = 0
+        while index < len(field_list) - 1:
+            # 4 fixed fields, the paths, then an empty field
+            end = field_list.index(b"", index + 4)
+            null_path_list.append(field_list[index + 4:end])
+            index = end + 1
+        self.assertEqual(null_path_list, [[os.fsencode(path) for path in record["paths"]] for record in record_list])
+
+    # Check scan_tree() #######################################################
+
+    def test_scan_tree(self):
+        """Check that scan_tree() finds the same files than os.walk() and
+        yields directories bottom-up."""
+
+        root_path = os.path.join(DATA_DIRNAME, "test1")
+
+        expected_file_set = set()
+        for current_dir_path, dir_names, file_names in os.walk(root_path):
+            expected_file_set.update(os.path.abspath(os.path.join(current_dir_path, name)) for name in file_names)
+
+        file_set = set()
+        yielded_dir_set = set()
+        for current_dir_path, dir_path_list, file_list in core.scan_tree(root_path):
+            self.assertTrue(yielded_dir_set.issuperset(dir_path_list))
+            yielded_dir_set.add(current_dir_path)
+            for file_path, file_stat in file_list:
+                self.assertEqual(file_stat.st_size, os.path.getsize(file_path))
+                file_set.add(file_path)
+
+        self.assertEqual(file_set, expected_file_set)
+        self.assertIn(os.path.abspath(root_path), yielded_dir_set)
+
+    # Check walk() ############################################################
+
+    def test_walk_max_pending_files(self):
+        """Check that walk() returns the same dictionaries when it has to wait
+        for pending files."""
+
+        root_path = os.path.join(DATA_DIRNAME, "test1")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(core.walk(root_path, None),
+                             core.walk(root_path, None, executor=executor, max_pending_files=1))
+
+    def test_walk_max_pending_files_bound(self):
+        """Check that walk() never submits more than max_pending_files files
+        to the executor, even within a single flat directory."""
+
+        root_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root_path)
+
+        for index in range(20):
+            with open(os.path.join(root_path, "file{0}".format(index)), "w") as fd:
+                fd.write("content {0}\n".format(index))
+
+        hash_file = core._hash_file
+
+        def slow_hash_file(*args):
+            time.sleep(0.01)
+            return hash_file(*args)
+
+        with BoundCheckingExecutor(max_workers=2) as executor:
+            with unittest.mock.patch.object(core, "_hash_file", slow_hash_file):
+                file_dict, dir_dict = core.walk(root_path, None, executor=executor, max_pending_files=3)
+
+        self.assertEqual((file_dict, dir_dict), core.walk(root_path, None))
+        self.assertEqual(executor.num_submitted, 20)
+        self.assertLessEqual(executor.max_num_pending, 3)
+
+    def test_prefilter_files_max_pending_files_bound(self):
+        """Check that prefilter_files() never submits more than
+        MAX_PENDING_FILES partial hashes to the executor."""
+
+        size_dict = core.file_sizes(ROOT_PATHS)
+
+        with BoundCheckingExecutor(max_workers=2) as executor:
+            with unittest.mock.patch.object(core, "MAX_PENDING_FILES", 2):
+                placeholder_dict = core.prefilter_files(size_dict, partial_block_size=1, executor=executor)
+
+        self.assertEqual(placeholder_dict, core.prefilter_files(size_dict, partial_block_size=1))
+        self.assertGreater(executor.num_submitted, 2)
+        self.assertLessEqual(executor.max_num_pending, 2)
+
+if __name__ == '__main__':
+    unittest.main()
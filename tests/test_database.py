@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains some unit tests for the "database" module.
+"""
+
+from pydfm import database
+
+import concurrent.futures
+import dbm.dumb
+import os.path
+import shutil
+import tempfile
+import threading
+import unittest
+
+class TestDatabase(unittest.TestCase):
+    """
+    Contains some unit tests for the "database" module.
+    """
+
+    def setUp(self):
+        self.tmp_dirname = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dirname, "db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dirname)
+
+    # Check HashDatabase ######################################################
+
+    def test_concurrent_creation(self):
+        """Check that several connections can create the schema of a new
+        database at the same time."""
+
+        num_connections = 4
+
+        for index in range(10):
+            db_path = os.path.join(self.tmp_dirname, "db{0}".format(index))
+            barrier = threading.Barrier(num_connections)
+
+            def open_database():
+                barrier.wait()
+                database.HashDatabase(db_path).close()
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=num_connections) as executor:
+                future_list = [executor.submit(open_database) for connection_index in range(num_connections)]
+                for future in future_list:
+                    future.result()
+
+    def test_get_put(self):
+        """Check that a recorded hash is returned only if the file hasn't
+        changed."""
+
+        file_path = os.path.join(self.tmp_dirname, "foo")
+        with open(file_path, "w") as fd:
+            fd.write("foo")
+        file_stat = os.stat(file_path)
+
+        with database.HashDatabase(self.db_path, batch_size=2) as db:
+            db.put(file_path, file_stat, "md5")
+            self.assertEqual(len(db), 1)
+
+        with database.HashDatabase(self.db_path) as db:
+            self.assertEqual(db.get(file_path, file_stat), "md5")
+
+            with open(file_path, "a") as fd:
+                fd.write("bar")
+            self.assertIsNone(db.get(file_path, os.stat(file_path)))
+
+            db.clear()
+            self.assertEqual(len(db), 0)
+
+    def test_hash_algorithms(self):
+        """Check that hashes computed with different algorithms never mix."""
+
+        file_path = os.path.join(self.tmp_dirname, "foo")
+        with open(file_path, "w") as fd:
+            fd.write("foo")
+        file_stat = os.stat(file_path)
+
+        with database.HashDatabase(self.db_path) as db:
+            db.put(file_path, file_stat, "md5")
+
+        with database.HashDatabase(self.db_path, hash_algorithm="sha256") as db:
+            self.assertIsNone(db.get(file_path, file_stat))
+            db.put(file_path, file_stat, "sha256")
+
+        with database.HashDatabase(self.db_path) as db:
+            self.assertEqual(db.get(file_path, file_stat), "md5")
+            self.assertEqual([item[3:] for item in db.items()], [("md5", "md5"), ("sha256", "sha256")])
+
+    def test_get_moved_file(self):
+        """Check that the hash of a file is still returned after its parent
+        directory has been renamed."""
+
+        dir_path = os.path.join(self.tmp_dirname, "foo")
+        os.mkdir(dir_path)
+        file_path = os.path.join(dir_path, "bar")
+        with open(file_path, "w") as fd:
+            fd.write("bar")
+
+        with database.HashDatabase(self.db_path) as db:
+            db.put(file_path, os.stat(file_path), "md5")
+
+        new_dir_path = os.path.join(self.tmp_dirname, "baz")
+        os.rename(dir_path, new_dir_path)
+        new_file_path = os.path.join(new_dir_path, "bar")
+
+        with database.HashDatabase(self.db_path) as db:
+            self.assertEqual(db.get(new_file_path, os.stat(new_file_path)), "md5")
+            self.assertEqual(len(db), 2)
+
+    def test_get_renamed_file(self):
+        """Check that the hash of a file is still returned after the file
+        itself has been renamed (which changes its ctime)."""
+
+        file_path = os.path.join(self.tmp_dirname, "foo")
+        with open(file_path, "w") as fd:
+            fd.write("foo")
+
+        with database.HashDatabase(self.db_path) as db:
+            db.put(file_path, os.stat(file_path), "md5")
+
+        new_file_path = os.path.join(self.tmp_dirname, "bar")
+        os.rename(file_path, new_file_path)
+
+        # Make sure the ctime differs whatever the timestamps granularity
+        new_file_stat = os.stat(new_file_path)
+        new_file_stat = os.stat_result(new_file_stat[:9] + (new_file_stat.st_ctime + 1,),
+                                       {"st_atime_ns": new_file_stat.st_atime_ns,
+                                        "st_mtime_ns": new_file_stat.st_mtime_ns,
+                                        "st_ctime_ns": new_file_stat.st_ctime_ns + 10**9})
+
+        with database.HashDatabase(self.db_path) as db:
+            self.assertEqual(db.get(new_file_path, new_file_stat), "md5")
+            self.assertEqual(len(db), 2)
+
+    def test_prune_evict(self):
+        """Check that entries of deleted files are pruned and that the least
+        recently seen entries are evicted."""
+
+        file_path_list = [os.path.join(self.tmp_dirname, str(index)) for index in range(4)]
+        for file_path in file_path_list:
+            with open(file_path, "w") as fd:
+                fd.write(file_path)
+
+        with database.HashDatabase(self.db_path) as db:
+            for file_path in file_path_list:
+                db.put(file_path, os.stat(file_path), "md5")
+                db.commit()
+
+            os.remove(file_path_list[3])
+            self.assertEqual(db.prune(batch_size=2), 1)
+
+            # Use the first entry: the second one is now the least recently seen
+            db.get(file_path_list[0], os.stat(file_path_list[0]))
+            self.assertEqual(db.evict(max_entries=2), 1)
+            db.compact()
+
+            self.assertEqual([item[0] for item in db.items()], [file_path_list[0], file_path_list[2]])
+
+    def test_prune_evict_directories(self):
+        """Check that the snapshots of deleted or changed directories are
+        pruned and that the least recently seen ones are evicted."""
+
+        dir_path_list = [os.path.join(self.tmp_dirname, "dir{0}".format(index)) for index in range(4)]
+        for dir_path in dir_path_list:
+            os.mkdir(dir_path)
+
+        with database.HashDatabase(self.db_path) as db:
+            for dir_path in dir_path_list:
+                db.put_directory(dir_path, os.stat(dir_path), "md5", [], [])
+                db.commit()
+
+            os.rmdir(dir_path_list[3])
+            with open(os.path.join(dir_path_list[2], "new_file"), "w") as fd:
+                fd.write("new content")
+            dir_stat = os.stat(dir_path_list[2])
+            os.utime(dir_path_list[2], ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns + 10**9))
+            self.assertEqual(db.prune(batch_size=1), 0)
+            self.assertEqual(db.connection.execute("SELECT COUNT(*) FROM dirs").fetchone()[0], 2)
+
+            # Use the first snapshot: the second one is now the least recently seen
+            self.assertEqual(db.get_directory(dir_path_list[0], os.stat(dir_path_list[0])), ("md5", [], []))
+            self.assertEqual(db.evict(max_entries=1), 1)
+
+            self.assertIsNotNone(db.get_directory(dir_path_list[0], os.stat(dir_path_list[0])))
+            self.assertIsNone(db.get_directory(dir_path_list[1], os.stat(dir_path_list[1])))
+
+    def test_import_dbm_db(self):
+        """Check that a legacy dbm.dumb database is imported."""
+
+        dbm_db = dbm.dumb.open(self.db_path, 'c')
+        dbm_db["/foo/bar"] = "1234.5 10 md5"
+        dbm_db.close()
+
+        with database.HashDatabase(self.db_path) as db:
+            self.assertEqual(list(db.items()), [("/foo/bar", 1234.5, 10, "md5", "md5")])
+            self.assertEqual(db.get("/foo/bar", os.stat_result((0, 0, 0, 0, 0, 0, 10, 0, 1234.5, 0))), "md5")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -32,8 +32,12 @@ implemented in the "file_hash" module.
 
 from pydfm import file_hash
 
+import hashlib
 import os.path
+import shutil
+import tempfile
 import unittest
+import unittest.mock
 
 TESTS_DIRNAME = os.path.dirname(__file__)
 DATA_DIRNAME = os.path.join(TESTS_DIRNAME, "data")
@@ -176,5 +180,159 @@ class TestFileHash(unittest.TestCase):
 
         self.assertEqual(hex_str, expected_str)
 
+    # Check compute_files_hash() ##############################################
+
+    def test_read_methods(self):
+        """Check that all the read methods give the same hash."""
+
+        for file_name in ("test_file.txt", "test_file.bin", "test_file.empty"):
+            file_path = os.path.join(DATA_DIRNAME, file_name)
+
+            with open(file_path, 'rb') as fd:
+                expected_str = hashlib.md5(fd.read()).hexdigest()
+
+            for method in file_hash.READ_METHODS + (None,):
+                for chunk_size in (7, file_hash.DEFAULT_CHUNK_SIZE):
+                    hex_str = file_hash.compute_files_hash(hashlib.md5(), file_path, chunk_size, method)
+                    self.assertEqual(hex_str, expected_str)
+
+        with self.assertRaises(ValueError):
+            file_hash.compute_files_hash(hashlib.md5(), file_path, method="foo")
+
+        # Files are only memory mapped on request (see DEFAULT_READ_METHOD)
+        file_path = os.path.join(DATA_DIRNAME, "test_file.bin")
+        with unittest.mock.patch.object(file_hash.mmap, "mmap", side_effect=AssertionError("mmap used")):
+            self.assertEqual(file_hash.hashsum(file_path), file_hash.hashsum(file_path, read_method="read"))
+            with self.assertRaises(AssertionError):
+                file_hash.hashsum(file_path, read_method="mmap")
+
+    def test_compute_files_hash_errors(self):
+        """Check that file_hash.compute_files_hash raises OSError for missing
+        files and files which are not regular files (without blocking on
+        FIFOs)."""
+
+        for method in file_hash.READ_METHODS:
+            with self.assertRaises(OSError):
+                file_hash.compute_files_hash(hashlib.md5(), os.path.join(DATA_DIRNAME, "missing_file"), method=method)
+
+            with self.assertRaises(OSError):
+                file_hash.compute_files_hash(hashlib.md5(), DATA_DIRNAME, method=method)
+
+        if hasattr(os, "mkfifo"):
+            tmp_dirname = tempfile.mkdtemp()
+            try:
+                fifo_path = os.path.join(tmp_dirname, "fifo")
+                os.mkfifo(fifo_path)
+                with self.assertRaises(OSError):
+                    file_hash.hashsum(fifo_path)
+            finally:
+                shutil.rmtree(tmp_dirname)
+
+    # Check hashsum() #########################################################
+
+    def test_hashsum(self):
+        """Check that the file_hash.hashsum function returns the digest of
+        the given algorithm."""
+
+        file_path = os.path.join(DATA_DIRNAME, "test_file.bin")
+
+        with open(file_path, 'rb') as fd:
+            data = fd.read()
+
+        self.assertEqual(file_hash.hashsum(file_path), file_hash.md5sum(file_path))
+        self.assertEqual(file_hash.hashsum(file_path, "sha256"), file_hash.sha256sum(file_path))
+        self.assertEqual(file_hash.hashsum(file_path, "blake2b-64"), hashlib.blake2b(data, digest_size=8).hexdigest())
+        self.assertEqual(file_hash.hash_digest_size("blake2b-64"), 8)
+
+        with self.assertRaises(ValueError):
+            file_hash.hashsum(file_path, "crc32")
+
+    # Check partial_md5sum() #################################################
+
+    def test_partial_md5sum(self):
+        """Check that the file_hash.partial_md5sum function only hashes the
+        first and the last blocks of the file."""
+
+        file_path = os.path.join(DATA_DIRNAME, "test_file.bin")
+
+        with open(file_path, 'rb') as fd:
+            data = fd.read()
+
+        # Blocks smaller than half the file
+        expected_str = hashlib.md5(data[:10] + data[-10:]).hexdigest()
+        hex_str = file_hash.partial_md5sum(file_path, block_size=10)
+
+        self.assertEqual(hex_str, expected_str)
+
+        # Overlapping blocks
+        expected_str = hashlib.md5(data).hexdigest()
+        hex_str = file_hash.partial_md5sum(file_path, block_size=60)
+
+        self.assertEqual(hex_str, expected_str)
+
+        # Blocks larger than the file
+        hex_str = file_hash.partial_md5sum(file_path, block_size=1000)
+
+        self.assertEqual(hex_str, expected_str)
+
+    def test_partial_md5sum_errors(self):
+        """Check that file_hash.partial_md5sum raises OSError for missing
+        files and files which are not regular files (without blocking on
+        FIFOs)."""
+
+        with self.assertRaises(OSError):
+            file_hash.partial_md5sum(os.path.join(DATA_DIRNAME, "missing_file"))
+
+        with self.assertRaises(OSError):
+            file_hash.partial_md5sum(DATA_DIRNAME)
+
+        if hasattr(os, "mkfifo"):
+            tmp_dirname = tempfile.mkdtemp()
+            try:
+                fifo_path = os.path.join(tmp_dirname, "fifo")
+                os.mkfifo(fifo_path)
+                with self.assertRaises(OSError):
+                    file_hash.partial_md5sum(fifo_path)
+            finally:
+                shutil.rmtree(tmp_dirname)
+
+    # Check compare_files() #################################################
+
+    def test_compare_files(self):
+        """Check that file_hash.compare_files splits files according to their
+        content and stops reading files left alone."""
+
+        file_path = os.path.join(DATA_DIRNAME, "test_file.bin")
+        with open(file_path, 'rb') as fd:
+            data = fd.read()
+
+        tmp_dirname = tempfile.mkdtemp()
+        try:
+            copy_path = os.path.join(tmp_dirname, "copy")
+            shutil.copyfile(file_path, copy_path)
+
+            # Same size, different first byte
+            other_path = os.path.join(tmp_dirname, "other")
+            with open(other_path, 'wb') as fd:
+                fd.write(bytes([data[0] ^ 1]) + data[1:])
+
+            class_list, digest_list, num_bytes_read = file_hash.compare_files([other_path, file_path, copy_path], chunk_size=10)
+            self.assertEqual(class_list, [[other_path], [file_path, copy_path]])
+            self.assertEqual(digest_list, [None, None])
+            self.assertEqual(num_bytes_read, 2 * len(data) + 10)
+
+            # The hash of identical files is computed while they are compared
+            for chunk_size in (7, file_hash.DEFAULT_COMPARE_CHUNK_SIZE):
+                class_list, digest_list, num_bytes_read = file_hash.compare_files([other_path, file_path, copy_path],
+                                                                                   chunk_size=chunk_size,
+                                                                                   hash_algorithm="sha256")
+                self.assertEqual(digest_list, [None, hashlib.sha256(data).hexdigest()])
+
+            empty_path = os.path.join(DATA_DIRNAME, "test_file.empty")
+            self.assertEqual(file_hash.compare_files([empty_path, empty_path], hash_algorithm="md5"),
+                             ([[empty_path, empty_path]], [hashlib.md5().hexdigest()], 0))
+        finally:
+            shutil.rmtree(tmp_dirname)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains some unit tests for the "index" module.
+"""
+
+from pydfm import core
+from pydfm.index import TreeIndex, ScanResult
+
+import os.path
+import unittest
+
+TESTS_DIRNAME = os.path.dirname(__file__)
+DATA_DIRNAME = os.path.join(TESTS_DIRNAME, "data")
+
+class TestTreeIndex(unittest.TestCase):
+    """
+    Contains some unit tests for the "index" module.
+    """
+
+    def test_add_directory(self):
+        """Check the index of a small tree built bottom-up."""
+
+        index = TreeIndex()
+        index.add_directory("/r/a", ["/r/a/1", "/r/a/2"], [])
+        index.add_directory("/r", ["/r/3"], ["/r/a", "/r/unreadable"])
+
+        self.assertEqual(len(index), 5)
+        self.assertEqual(sorted(index.children("/r")), ["/r/3", "/r/a"])
+        self.assertEqual(index.children("/r/a"), ["/r/a/1", "/r/a/2"])
+        self.assertEqual(index.path(index.node_id("/r/a")), "/r/a")
+        self.assertTrue(index.is_dir(index.node_id("/r/a")))
+        self.assertIn("/r", index)
+        self.assertNotIn("/r/unreadable", index)
+
+        with self.assertRaises(ValueError):
+            index.add_directory("/r/a", ["/r/a/1"], [])
+
+    def test_size(self):
+        """Check that directories sizes are the total size of their files."""
+
+        index = TreeIndex()
+        index.add_directory("/r/a", ["/r/a/2", "/r/a/1"], [], file_size_list=[2, 1])
+        index.add_directory("/r/b", ["/r/b/1"], [])
+        index.add_directory("/r", ["/r/3"], ["/r/a"], file_size_list=[3])
+        index.add_directory("/s", [], ["/r/b"], file_size_list=[])
+
+        self.assertEqual(index.size(index.node_id("/r/a/1")), 1)
+        self.assertEqual(index.size(index.node_id("/r/a/2")), 2)
+        self.assertEqual(index.size(index.node_id("/r/a")), 3)
+        self.assertEqual(index.size(index.node_id("/r")), 6)
+
+        # Unknown sizes
+        self.assertIsNone(index.size(index.node_id("/r/b/1")))
+        self.assertIsNone(index.size(index.node_id("/s")))
+
+    def test_merge(self):
+        """Check that merged indexes keep their relations."""
+
+        index = TreeIndex()
+        index.add_directory("/r/a", ["/r/a/1"], [])
+
+        other_index = TreeIndex()
+        other_index.add_directory("/r/b", ["/r/b/1", "/r/b/2"], [])
+
+        index.merge(other_index)
+        index.add_directory("/r", [], ["/r/a", "/r/b"])
+
+        self.assertEqual(index.children("/r/b"), ["/r/b/1", "/r/b/2"])
+        self.assertEqual(sorted(index.children("/r")), ["/r/a", "/r/b"])
+        self.assertEqual(index.path(index.child_ids(index.node_id("/r/b"))[1]), "/r/b/2")
+
+    def test_build_path_dictionary(self):
+        """Check that the index built during the walk contains every scanned
+        path."""
+
+        root_path = os.path.join(DATA_DIRNAME, "test1")
+
+        index = TreeIndex()
+        file_dict, dir_dict = core.build_path_dictionary([root_path], index=index)
+
+        self.assertEqual(len(index), len(file_dict) + len(dir_dict))
+        self.assertEqual({index.path(node_id) for node_id in range(len(index))}, set(file_dict) | set(dir_dict))
+
+    def test_scan_result(self):
+        """Check that the views of a ScanResult give the same digests than
+        the dictionaries returned by build_path_dictionary()."""
+
+        root_path_list = [os.path.join(DATA_DIRNAME, "test1"),
+                          os.path.join(DATA_DIRNAME, "test2")]
+
+        file_dict, dir_dict = core.build_path_dictionary(root_path_list)
+
+        for processes in (None, 2):
+            scan_result = ScanResult()
+            file_view, dir_view = core.build_path_dictionary(root_path_list,
+                                                             processes=processes,
+                                                             index=scan_result)
+
+            self.assertEqual(dict(file_view.items()), file_dict)
+            self.assertEqual(dict(dir_view.items()), dir_dict)
+            self.assertEqual(len(file_view), len(file_dict))
+            self.assertNotIn(root_path_list[0], file_view)
+            self.assertEqual({md5: set(path_list) for md5, path_list in core.reverse_dictionary(file_view).items()},
+                             {md5: set(path_list) for md5, path_list in core.reverse_dictionary(file_dict).items()})
+
+    def test_scan_result_repeated_roots(self):
+        """Check that repeated and nested root paths are indexed once."""
+
+        root_path = os.path.join(DATA_DIRNAME, "test1")
+        nested_root_path = os.path.join(root_path, "a")
+
+        file_dict, dir_dict = core.build_path_dictionary([root_path])
+
+        for processes in (None, 2):
+            scan_result = ScanResult()
+            file_view, dir_view = core.build_path_dictionary([root_path, nested_root_path, root_path + os.sep, root_path],
+                                                             processes=processes,
+                                                             index=scan_result)
+
+            self.assertEqual(len(scan_result), len(file_dict) + len(dir_dict))
+            self.assertEqual(len(file_view), len(list(file_view)))
+            self.assertEqual(len(dir_view), len(list(dir_view)))
+            self.assertEqual(dict(file_view.items()), file_dict)
+            self.assertEqual(dict(dir_view.items()), dir_dict)
+
+if __name__ == '__main__':
+    unittest.main()
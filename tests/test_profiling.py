@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains some unit tests for the "profiling" module.
+"""
+
+from pydfm import core
+from pydfm.profiling import Profiler
+
+import os.path
+import pstats
+import shutil
+import tempfile
+import unittest
+
+TESTS_DIRNAME = os.path.dirname(__file__)
+DATA_DIRNAME = os.path.join(TESTS_DIRNAME, "data")
+
+class TestProfiling(unittest.TestCase):
+    """
+    Contains some unit tests for the "profiling" module.
+    """
+
+    def setUp(self):
+        self.tmp_dirname = tempfile.mkdtemp()
+        self.profile_path = os.path.join(self.tmp_dirname, "scan.prof")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dirname)
+
+    def test_profiler(self):
+        """Check that the profile of build_path_dictionary() is dumped."""
+
+        root_path = os.path.join(DATA_DIRNAME, "test1")
+
+        with Profiler(self.profile_path):
+            core.build_path_dictionary([root_path])
+
+        function_name_set = {function[2] for function in pstats.Stats(self.profile_path).stats}
+        self.assertIn("build_path_dictionary", function_name_set)
+
+    def test_profiler_stage(self):
+        """Check that only the given stage is profiled."""
+
+        root_path = os.path.join(DATA_DIRNAME, "test1")
+
+        with Profiler(self.profile_path, stage="reverse") as profiler:
+            with profiler.stage("walk"):
+                file_dict, dir_dict = core.build_path_dictionary([root_path])
+            with profiler.stage("reverse"):
+                core.reverse_dictionary(file_dict)
+
+        function_name_set = {function[2] for function in profiler.stats().stats}
+        self.assertIn("reverse_dictionary", function_name_set)
+        self.assertNotIn("build_path_dictionary", function_name_set)
+
+    def test_profiler_disabled(self):
+        """Check that a disabled profiler doesn't write anything."""
+
+        with Profiler(self.profile_path, enabled=False) as profiler:
+            with profiler.stage("walk"):
+                pass
+
+        self.assertFalse(os.path.exists(self.profile_path))
+
+if __name__ == '__main__':
+    unittest.main()
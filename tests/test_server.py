@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains some unit tests for the "server" module.
+"""
+
+from pydfm import core
+from pydfm import server
+from pydfm import watch
+
+import os.path
+import shutil
+import tempfile
+import threading
+import unittest
+
+TESTS_DIRNAME = os.path.dirname(__file__)
+DATA_DIRNAME = os.path.join(TESTS_DIRNAME, "data")
+
+ROOT_PATHS = [os.path.join(DATA_DIRNAME, "test{0}".format(index)) for index in range(1, 7)]
+
+
+@unittest.skipUnless(hasattr(server.socket, "AF_UNIX"), "Unix sockets are not available")
+class TestServer(unittest.TestCase):
+    """
+    Contains some unit tests for the "server" module.
+    """
+
+    def setUp(self):
+        self.file_dict, self.dir_dict = core.build_path_dictionary(ROOT_PATHS)
+        live_index = watch.LiveIndex()
+        live_index.add_scan(ROOT_PATHS, self.file_dict, self.dir_dict)
+
+        self.tmp_dirname = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmp_dirname, "socket")
+        self.server = server.QueryServer(self.socket_path, live_index)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dirname)
+
+    # Check QueryClient #######################################################
+
+    def test_lookups(self):
+        """Check the lookups by digest, by path and by file content."""
+
+        reversed_file_dict = core.reverse_dictionary(self.file_dict)
+        file_path = max(self.file_dict, key=lambda path: len(reversed_file_dict[self.file_dict[path]]))
+        expected_path_list = sorted(reversed_file_dict[self.file_dict[file_path]])
+
+        with server.QueryClient(self.socket_path) as client:
+            self.assertEqual(client.hash_algorithm, "md5")
+            self.assertEqual(client.lookup_digest(self.file_dict[file_path]), expected_path_list)
+            self.assertEqual(client.lookup_path(file_path), expected_path_list)
+            self.assertEqual(client.lookup_file(file_path), expected_path_list)
+            self.assertEqual(client.lookup_path(os.path.join(self.tmp_dirname, "unknown")), [])
+
+            dir_path = os.path.abspath(ROOT_PATHS[0])
+            answer = client.query({"op": "path", "path": dir_path})
+            self.assertEqual(answer["type"], "dir")
+            self.assertEqual(answer["digest"], self.dir_dict[dir_path])
+
+            with self.assertRaises(ValueError):
+                client.query({"op": "unknown"})
+
+    def test_batch(self):
+        """Check that batched queries are answered in order."""
+
+        digest_list = list(set(self.file_dict.values())) + ["0" * 32]
+        reversed_file_dict = core.reverse_dictionary(self.file_dict)
+
+        with server.QueryClient(self.socket_path) as client:
+            self.assertEqual(client.lookup_digests(digest_list),
+                             [sorted(reversed_file_dict.get(digest, [])) for digest in digest_list])
+
+if __name__ == '__main__':
+    unittest.main()
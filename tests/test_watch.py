@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# PyDuplicateFileManager
+
+# The MIT License
+#
+# Copyright (c) 2010,2011,2012,2013,2015 Jeremie DECOCK (http://www.jdhp.org)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""
+This module contains some unit tests for the "watch" module.
+"""
+
+from pydfm import core
+from pydfm import watch
+
+import os.path
+import select
+import shutil
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+TESTS_DIRNAME = os.path.dirname(__file__)
+DATA_DIRNAME = os.path.join(TESTS_DIRNAME, "data")
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is only available on Linux")
+class TestWatch(unittest.TestCase):
+    """
+    Contains some unit tests for the "watch" module.
+    """
+
+    def setUp(self):
+        self.tmp_dirname = tempfile.mkdtemp()
+        self.root_path = os.path.join(self.tmp_dirname, "test1")
+        shutil.copytree(os.path.join(DATA_DIRNAME, "test1"), self.root_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dirname)
+
+    def process_pending_events(self, watcher):
+        """Apply inotify events until the queue stays empty."""
+
+        while len(select.select([watcher], [], [], 0.2)[0]) > 0:
+            watcher.process_events(watcher.inotify.read_events())
+
+    def check_live_index(self, live_index):
+        """Check that live_index matches a full scan of the tree."""
+
+        file_dict, dir_dict = core.build_path_dictionary([self.root_path])
+        self.assertEqual(live_index.file_dict, file_dict)
+        self.assertEqual(live_index.dir_dict, dir_dict)
+
+        reversed_file_dict = core.reverse_dictionary(file_dict)
+        self.assertEqual(live_index.reversed_file_dict,
+                         {digest: set(paths) for digest, paths in reversed_file_dict.items()})
+        duplicated_file_dict = core.remove_unique_items(reversed_file_dict)
+        core.remove_redundant_entries(duplicated_file_dict, dir_dict)
+        self.assertEqual(live_index.duplicates()[0].keys(), duplicated_file_dict.keys())
+
+    # Check Watcher ###########################################################
+
+    def test_watcher(self):
+        """Check that the live index follows the changes of the tree."""
+
+        db_path = os.path.join(self.tmp_dirname, "db")
+
+        with watch.Watcher([self.root_path], db_path) as watcher:
+            self.check_live_index(watcher.live_index)
+
+            # Create and modify files
+            with open(os.path.join(self.root_path, "new_file"), "w") as new_file:
+                new_file.write("new content")
+            with open(os.path.join(self.root_path, "1"), "a") as modified_file:
+                modified_file.write("appended content")
+            self.process_pending_events(watcher)
+            self.check_live_index(watcher.live_index)
+
+            # Create, move and delete directories
+            shutil.copytree(self.root_path, os.path.join(self.root_path, "copy"))
+            self.process_pending_events(watcher)
+            self.check_live_index(watcher.live_index)
+
+            os.rename(os.path.join(self.root_path, "copy"), os.path.join(self.root_path, "moved"))
+            self.process_pending_events(watcher)
+            self.check_live_index(watcher.live_index)
+
+            with open(os.path.join(self.root_path, "moved", "new_file"), "w") as new_file:
+                new_file.write("other content")
+            os.remove(os.path.join(self.root_path, "1"))
+            self.process_pending_events(watcher)
+            self.check_live_index(watcher.live_index)
+
+            shutil.rmtree(os.path.join(self.root_path, "moved"))
+            self.process_pending_events(watcher)
+            self.check_live_index(watcher.live_index)
+
+    def test_watcher_removed_file(self):
+        """Check that a file removed before it is hashed is not indexed (as
+        an empty file)."""
+
+        with watch.Watcher([self.root_path], None) as watcher:
+            file_path = os.path.join(self.root_path, "new_file")
+            with open(file_path, "w") as new_file:
+                new_file.write("new content")
+            self.process_pending_events(watcher)
+            self.assertIn(file_path, watcher.live_index.file_dict)
+
+            hashsum = watch.hashsum
+
+            def removing_hashsum(path, *args):
+                if path == file_path:
+                    os.remove(file_path)
+                return hashsum(path, *args)
+
+            # The file is removed while it is updated (before its deletion
+            # event is read)
+            with unittest.mock.patch.object(watch, "hashsum", removing_hashsum):
+                watcher._update_file(file_path)
+            self.assertNotIn(file_path, watcher.live_index.file_dict)
+
+            self.process_pending_events(watcher)
+            self.check_live_index(watcher.live_index)
+
+    # Check LiveIndex #########################################################
+
+    def test_live_index(self):
+        """Check that only the ancestors of a changed file are updated."""
+
+        file_dict, dir_dict = core.build_path_dictionary([self.root_path])
+        live_index = watch.LiveIndex()
+        live_index.add_tree(os.path.abspath(self.root_path), file_dict, dir_dict)
+        self.assertEqual(live_index.update_directories(), 0)
+
+        file_path = max(file_dict, key=lambda path: path.count(os.sep))
+        live_index.set_file(file_path, "0" * 32)
+        self.assertEqual(live_index.update_directories(),
+                         file_path.count(os.sep) - os.path.abspath(self.root_path).count(os.sep))
+
+        live_index.set_file(file_path, file_dict[file_path])
+        live_index.update_directories()
+        self.assertEqual(live_index.dir_dict, dir_dict)
+
+if __name__ == '__main__':
+    unittest.main()